@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Amplify Deploy Benchmark - Frontend deploy time versus file count
+
+Runs the Amplify deployment Lambda's extract_and_deploy_s3_zip against a local,
+in-memory S3 stand-in that adds a fixed latency per request and a transfer time
+per byte, so request counts and concurrency show up the way they do against S3.
+
+Each full run starts from a bucket holding build.zip and a previous deploy of the
+same size under build/, so cleanup is measured too. The serial baseline reproduces
+the earlier implementation: download the zip to disk, extract everything, delete
+the old files batch by batch and upload files one at a time. The incremental
+columns redeploy after the manifest is saved, first with one file changed in the
+zip and then with an identical zip.
+
+Usage:
+    python benchmark_amplify_deploy.py
+    python benchmark_amplify_deploy.py --files 100 1000 5000 --latency-ms 20
+    python benchmark_amplify_deploy.py --spool-threshold 0    # Force ranged reads
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+from lambda_env import setup_amplify_lambda_env
+
+setup_amplify_lambda_env()
+
+import utilities  # noqa: E402
+import zip_stream  # noqa: E402
+
+BUCKET = "local"
+ZIP_KEY = "build.zip"
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class LocalS3:
+    """
+    In-memory stand-in for the S3 client calls used by the deployer.
+    Every request sleeps for the configured latency plus transfer time,
+    which releases the GIL just as network I/O would.
+    """
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self, latency, bandwidth):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def _request(self, size=0):
+        with self.lock:
+            self.requests += 1
+        time.sleep(self.latency + size / self.bandwidth)
+
+    def head_object(self, Bucket, Key):
+        self._request()
+        body, content_type = self.objects[Key]
+        return {"ContentLength": len(body), "ETag": etag(body), "ContentType": content_type}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        if Key not in self.objects:
+            self._request()
+            raise NoSuchKey(Key)
+        body, content_type = self.objects[Key]
+        if Range:
+            start, end = Range.removeprefix("bytes=").split("-")
+            body = body[int(start):int(end) + 1]
+        self._request(len(body))
+        return {"Body": io.BytesIO(body), "ContentType": content_type}
+
+    def put_object(self, Bucket, Key, Body, ContentType="binary/octet-stream"):
+        self._request(len(Body))
+        with self.lock:
+            self.objects[Key] = (bytes(Body), ContentType)
+
+    def download_file(self, Bucket, Key, Filename):
+        body, _ = self.objects[Key]
+        self._request(len(body))
+        Path(Filename).write_bytes(body)
+
+    def upload_file(self, Filename, Bucket, Key):
+        body = Path(Filename).read_bytes()
+        self.put_object(Bucket, Key, body)
+
+    def delete_objects(self, Bucket, Delete):
+        self._request()
+        with self.lock:
+            for item in Delete["Objects"]:
+                self.objects.pop(item["Key"], None)
+        return {}
+
+    def get_paginator(self, operation):
+        return LocalPaginator(self)
+
+
+class LocalPaginator:
+    """list_objects_v2 pages of up to 1000 keys"""
+
+    def __init__(self, s3):
+        self.s3 = s3
+
+    def paginate(self, Bucket, Prefix, PaginationConfig=None):
+        keys = sorted(key for key in self.s3.objects if key.startswith(Prefix))
+        page_size = min((PaginationConfig or {}).get("PageSize", 1000), 1000)
+        for start in range(0, max(len(keys), 1), page_size):
+            self.s3._request()
+            page = keys[start:start + page_size]
+            yield {"Contents": [{"Key": key, "ETag": etag(self.s3.objects[key][0])} for key in page]} if page else {}
+
+
+def etag(body):
+    """S3 ETag of a single-part upload"""
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+def build_zip(file_count, seed=0, changed=None):
+    """A frontend-like bundle: a few HTML/JSON files, many hashed JS/CSS chunks and some images"""
+    generator = random.Random(seed)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for position in range(file_count):
+            kind = generator.choice(["js", "js", "js", "css", "png", "svg", "json"])
+            folder = {"js": "static/js", "css": "static/css", "png": "static/media", "svg": "static/media", "json": ""}[kind]
+            name = f"{folder}/chunk.{position:05d}.{kind}".lstrip("/")
+            if kind == "png":
+                content = generator.randbytes(generator.randint(2_000, 60_000))
+            else:
+                content = (f"/* {name} */ " + "export const value = 'x';\n" * generator.randint(50, 1500)).encode()
+            if position == changed:
+                content += b"/* changed */"
+            archive.writestr(name, content)
+        archive.writestr("index.html", "<!doctype html><div id=root></div>")
+    return buffer.getvalue()
+
+
+def seed_bucket(s3, bundle, file_count):
+    """Bucket state before a deploy: the zip plus a previous deploy under build/"""
+    s3.objects = {ZIP_KEY: (bundle, "application/zip")}
+    for position in range(file_count):
+        s3.objects[f"build/old/file.{position:05d}.js"] = (b"old", "application/javascript")
+    s3.requests = 0
+
+
+def serial_deploy(s3, bucket_name, zip_key):
+    """The earlier implementation: disk extraction, serial deletes and serial uploads"""
+    base_folder = os.path.splitext(os.path.basename(zip_key))[0]
+    batch = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket_name, Prefix=f"{base_folder}/"):
+        batch.extend({"Key": item["Key"]} for item in page.get("Contents", []))
+    for start in range(0, len(batch), 1000):
+        s3.delete_objects(Bucket=bucket_name, Delete={"Objects": batch[start:start + 1000]})
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = os.path.join(temp_dir, "downloaded.zip")
+        s3.download_file(bucket_name, zip_key, zip_path)
+        extract_dir = os.path.join(temp_dir, "extracted")
+        with zipfile.ZipFile(zip_path) as archive:
+            archive.extractall(extract_dir)
+        for root, _, files in os.walk(extract_dir):
+            for file in files:
+                local_path = os.path.join(root, file)
+                relative_path = os.path.relpath(local_path, extract_dir)
+                s3.upload_file(local_path, bucket_name, f"{base_folder}/{relative_path}".replace(os.sep, "/"))
+
+
+def streaming_deploy(s3, bucket_name, zip_key):
+    """The current Lambda implementation, saving the manifest as a started deployment would"""
+    response = utilities.extract_and_deploy_s3_zip(bucket_name, zip_key)
+    if not response["success"]:
+        raise RuntimeError(response["message"])
+    utilities.save_deploy_manifest(response["manifest"])
+    return response
+
+
+def timed(s3, deploy):
+    """Seconds and S3 requests of one deploy"""
+    s3.requests = 0
+    start = time.perf_counter()
+    response = deploy(s3, BUCKET, ZIP_KEY)
+    return time.perf_counter() - start, s3.requests, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Amplify frontend deploy against a local S3 stand-in")
+    parser.add_argument("--files", type=int, nargs="+", default=[50, 200, 1000], help="files per bundle")
+    parser.add_argument("--latency-ms", type=float, default=15.0, help="latency added to every S3 request")
+    parser.add_argument("--bandwidth-mbps", type=float, default=400.0, help="transfer rate per request in MB/s")
+    parser.add_argument("--spool-threshold", type=int, help="override ZIP_SPOOL_THRESHOLD in bytes (0 forces ranged reads)")
+    args = parser.parse_args()
+
+    s3 = LocalS3(args.latency_ms / 1000, args.bandwidth_mbps * 1024 * 1024)
+    utilities.s3_client = s3
+    if args.spool_threshold is not None:
+        zip_stream.ZIP_SPOOL_THRESHOLD = args.spool_threshold
+
+    print(f"Local S3: {args.latency_ms:.0f} ms per request, {args.bandwidth_mbps:.0f} MB/s")
+    print(f"{'files':>6} {'zip MB':>7} {'serial s':>9} {'req':>6} {'stream s':>9} {'req':>6} {'speedup':>8} "
+          f"{'1 changed s':>12} {'req':>5} {'unchanged s':>12} {'req':>5}")
+    for file_count in args.files:
+        bundle = build_zip(file_count)
+        timings = {}
+        for name, deploy in (("serial", serial_deploy), ("streaming", streaming_deploy)):
+            seed_bucket(s3, bundle, file_count)
+            timings[name] = timed(s3, deploy)
+            deployed = sum(1 for key in s3.objects if key.startswith("build/"))
+            assert deployed == file_count + 1, f"{name} deployed {deployed} files"
+
+        s3.objects[ZIP_KEY] = (build_zip(file_count, changed=0), "application/zip")
+        timings["one_changed"] = timed(s3, streaming_deploy)
+        assert len(timings["one_changed"][2]["uploaded_files"]) == 1
+        timings["unchanged"] = timed(s3, streaming_deploy)
+        assert not timings["unchanged"][2]["changed"]
+
+        serial, streaming = timings["serial"], timings["streaming"]
+        print(f"{file_count:>6} {len(bundle) / 1_048_576:>7.1f} {serial[0]:>9.2f} {serial[1]:>6} "
+              f"{streaming[0]:>9.2f} {streaming[1]:>6} {serial[0] / streaming[0]:>7.1f}x "
+              f"{timings['one_changed'][0]:>12.2f} {timings['one_changed'][1]:>5} "
+              f"{timings['unchanged'][0]:>12.2f} {timings['unchanged'][1]:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Cold Start Benchmark - Time to first token of a fresh container, with and without warmup
+
+Each scenario runs in a new Python process, as a new Lambda execution
+environment would:
+
+- cold: the first request pays for imports, schema loading, the per-stage
+  schema renderings, canonicalizer and client creation itself
+- warmed: a {"warmup": true} event (the scheduled ping, or init under
+  provisioned concurrency) runs first, then the request
+
+Both then serve a second request, which is the fully warm baseline. AWS calls
+are answered by simulated clients (simulated_aws.py; --scale shortens their
+latency) while the budgeted clients are still created with boto3, so client
+creation is measured. Connection setup (DNS, TCP and TLS) needs the real
+endpoints and is not included; against AWS it adds roughly one handshake per
+service to the cold first request.
+
+Usage:
+    python benchmark_cold_start.py
+    python benchmark_cold_start.py --repeat 5 --scale 0.05
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import subprocess
+import sys
+import time
+
+SCENARIOS = ("cold", "warmed")
+QUESTION = "How many engineering grad students were there in fall 22?"
+
+
+class Context:
+    """Lambda context of a background invocation"""
+    function_name = "local"
+    aws_request_id = "benchmark"
+
+    def get_remaining_time_in_millis(self):
+        return 600_000
+
+
+def first_token_ms(lambda_function, aws, connection_id):
+    """Milliseconds from invocation to the first streamed token of one request"""
+    event = aws.event(QUESTION, connection_id)
+    event["background_processing"] = True
+    start = time.perf_counter()
+    lambda_function.lambda_handler(event, Context())
+    return (aws.gateway.first_token[connection_id] - start) * 1000
+
+
+def run_scenario(scenario, scale):
+    """Body of the child process: one fresh container, timings as a dict"""
+    start = time.perf_counter()
+    from lambda_env import setup_lambda_env
+    setup_lambda_env(logging.ERROR)
+
+    from functools import lru_cache
+    import lambda_function
+    import utilities
+    from simulated_aws import SimulatedAws
+    result = {"import_ms": (time.perf_counter() - start) * 1000}
+
+    create_client = utilities.get_budgeted_client
+    aws = SimulatedAws(scale).install()
+    simulated = {"bedrock-runtime": aws.bedrock, "bedrock-agent-runtime": aws.agent}
+
+    # Real client creation, simulated calls
+    @lru_cache(maxsize=None)
+    def get_budgeted_client(service, read_timeout):
+        create_client(service, read_timeout)
+        return simulated[service]
+
+    utilities.get_budgeted_client = get_budgeted_client
+
+    if scenario == "warmed":
+        start = time.perf_counter()
+        lambda_function.lambda_handler({"warmup": True}, Context())
+        result["warmup_ms"] = (time.perf_counter() - start) * 1000
+
+    result["first_ms"] = first_token_ms(lambda_function, aws, "first")
+    result["second_ms"] = first_token_ms(lambda_function, aws, "second")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark time to first token of a fresh container, cold and warmed")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh processes per scenario (medians are reported)")
+    parser.add_argument("--scale", type=float, default=0.1, help="multiplier for the simulated AWS latencies")
+    parser.add_argument("--scenario", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario, args.scale)))
+        return
+
+    print(f"Simulated AWS latency x{args.scale}; median of {args.repeat} fresh processes, times in ms")
+    print(f"{'scenario':<10} {'imports':>9} {'warmup':>9} {'1st ttft':>9} {'2nd ttft':>9} {'penalty':>9}")
+    for scenario in SCENARIOS:
+        runs = []
+        for _ in range(args.repeat):
+            output = subprocess.run(
+                [sys.executable, __file__, "--scenario", scenario, "--scale", str(args.scale)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+        def median(name):
+            values = [run[name] for run in runs if name in run]
+            return statistics.median(values) if values else 0.0
+
+        print(f"{scenario:<10} {median('import_ms'):>9.1f} {median('warmup_ms'):>9.1f} {median('first_ms'):>9.1f} "
+              f"{median('second_ms'):>9.1f} {median('first_ms') - median('second_ms'):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
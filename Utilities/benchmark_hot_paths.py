@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Hot Path Benchmark - Microbenchmarks of the orchestration Lambda's pure-Python code, with baselines
+
+Times the code every request runs between AWS calls, with no I/O:
+
+- parse_and_send_response over synthetic Bedrock streams, by chunk size and
+  BREAK_TOKEN placement (frames go to a transport that drops them)
+- create_history and fix_chat_history on long conversations
+- get_prompt for each stage with the real schema
+- extract_json_content on large model outputs
+- loading and serializing the schema (template and compiled artifact)
+
+Each case runs in rounds of fresh inputs; the fastest round is reported, in
+microseconds per op (a stream event, or a call). Results are compared with the
+stored baselines and the run fails (exit code 1) when a case is slower than
+its baseline by more than the threshold. Baselines are machine specific:
+record them with --update on the machine that checks them.
+
+Usage:
+    python benchmark_hot_paths.py                     # Compare with the stored baselines
+    python benchmark_hot_paths.py --update            # Store this run as the baselines
+    python benchmark_hot_paths.py --only stream --threshold 1.5
+"""
+
+import argparse
+import gc
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+from lambda_env import setup_lambda_env, SCHEMA_FILE
+
+setup_lambda_env(logging.ERROR)
+
+import chatbot_config  # noqa: E402
+import codec  # noqa: E402
+import orchestration  # noqa: E402
+import utilities  # noqa: E402
+from schema_artifact import SchemaArtifact, compile_artifact, schema_hash  # noqa: E402
+from transport import Transport  # noqa: E402
+
+BASELINE_FILE = Path(__file__).resolve().parent / "fixtures" / "hot_path_baselines.json"
+BREAK_TOKEN = "BREAK_TOKEN"
+CONNECTION = "benchmark"
+CHUNK_SIZES = (4, 32, 256)
+PLACEMENTS = ("none", "aligned", "split")
+DEFAULT_THRESHOLD = 1.5
+
+
+class NullTransport(Transport):
+    """Drops every frame, so only parsing and frame building are timed"""
+
+    name = "null"
+
+    def send(self, connectionId, frame):
+        pass
+
+
+# ============================================================================
+# INPUTS
+# ============================================================================
+
+def answer_text(length, seed=0):
+    """Markdown answer prose of about the given length"""
+    generator = random.Random(seed)
+    words = ["There", "were", "**12,431**", "graduate", "students", "in", "the", "Fulton", "Schools", "of",
+             "Engineering", "in", "Fall", "2022,", "most", "on", "the", "Tempe", "campus.", "| Term | Students |\n"]
+    text = ""
+    while len(text) < length:
+        text += generator.choice(words) + " "
+    return text[:length]
+
+
+def model_stream(chunk_size, placement, length=4000):
+    """
+    Events of a converse_stream answer cut into chunks of chunk_size characters.
+    BREAK_TOKEN goes in the middle of the text: at a chunk boundary ("aligned"),
+    or starting three characters before one, so it is split across chunks ("split").
+    """
+    text = answer_text(length)
+    if placement != "none":
+        boundary = (length // 2 // chunk_size) * chunk_size
+        position = boundary if placement == "aligned" else max(boundary - 3, 0)
+        text = text[:position] + BREAK_TOKEN + text[position:]
+
+    events = [{"messageStart": {"role": "assistant"}}]
+    events += [{"contentBlockDelta": {"delta": {"text": text[start:start + chunk_size]}, "contentBlockIndex": 0}}
+               for start in range(0, len(text), chunk_size)]
+    events += [{"contentBlockStop": {"contentBlockIndex": 0}}, {"messageStop": {"stopReason": "end_turn"}},
+               {"metadata": {"usage": {"inputTokens": 1800, "outputTokens": len(text) // 4, "totalTokens": 1800 + len(text) // 4}}}]
+    return events
+
+
+def conversation(messages, seed=0):
+    """A chat history of alternating user questions and assistant answers"""
+    generator = random.Random(seed)
+    history = []
+    for position in range(messages):
+        if position % 2:
+            history.append({"role": "assistant", "content": [{"text": answer_text(generator.randint(200, 1200), position)}]})
+        else:
+            history.append({"role": "user", "content": [{"text": "How many engineering grad students were there in fall 22?"}]})
+    return history
+
+
+def copy_history(history):
+    """A fresh copy for fix_chat_history, which edits assistant messages in place"""
+    return [{"role": message["role"], "content": [{"text": message["content"][0]["text"]}]} for message in history]
+
+
+def model_output(length):
+    """A text-mode model answer: reasoning prose, then a JSON object, then trailing commentary"""
+    body = json.dumps({"improved_questions": [answer_text(200, seed) for seed in range(5)], "reasoning": answer_text(length // 4)})
+    return answer_text(length // 2) + "\n```json\n" + body + "\n```\n" + answer_text(length // 4, 1)
+
+
+# ============================================================================
+# CASES
+# ============================================================================
+
+def build_cases():
+    """name -> (op label, ops per call, prepare(count) -> argument tuples, function)"""
+    cases = {}
+
+    def respond(response):
+        utilities.parse_and_send_response(response, CONNECTION)
+
+    for chunk_size in CHUNK_SIZES:
+        for placement in PLACEMENTS:
+            events = model_stream(chunk_size, placement)
+            cases[f"stream chunk={chunk_size} break={placement}"] = (
+                "event", len(events), lambda count, events=events: [({"stream": events},)] * count, respond
+            )
+
+    for messages in (50, 400):
+        history = conversation(messages)
+        cases[f"create_history {messages} messages"] = ("call", 1, lambda count, history=history: [(history,)] * count, utilities.create_history)
+        cases[f"fix_chat_history {messages} messages"] = (
+            "call", 1, lambda count, history=history: [(copy_history(history),) for _ in range(count)], orchestration.fix_chat_history
+        )
+
+    template_bytes = SCHEMA_FILE.read_bytes()
+    schema = codec.loads(template_bytes)
+    history = conversation(8)
+    text_history = utilities.create_history(history)
+    for stage in ("classify", "create_question", "final_response"):
+        schema_text, _ = orchestration.schema_for_stage(schema, stage)
+        arguments = {"message": history[-1], "schema": schema_text, "chatHistory": text_history,
+                     "reasoning": "The user asks for a student count.", "results": answer_text(1500),
+                     "unanswered_questions": "None"}
+        cases[f"get_prompt {stage}"] = (
+            "call", 1, lambda count, stage=stage: [(stage,)] * count,
+            lambda stage, arguments=arguments: chatbot_config.get_prompt(stage, **arguments)
+        )
+
+    for length in (10_000, 200_000):
+        output = model_output(length)
+        cases[f"extract_json_content {length // 1000}KB"] = ("call", 1, lambda count, output=output: [(output,)] * count, utilities.extract_json_content)
+
+    artifact_bytes = codec.dumps_bytes(compile_artifact(schema))
+    cases["schema template loads"] = ("call", 1, lambda count: [(template_bytes,)] * count, codec.loads)
+    cases["schema dumps_bytes"] = ("call", 1, lambda count: [(schema,)] * count, codec.dumps_bytes)
+    cases["schema_hash"] = ("call", 1, lambda count: [(schema,)] * count, schema_hash)
+    cases["schema artifact load"] = (
+        "call", 1, lambda count: [(artifact_bytes,)] * count, lambda data: SchemaArtifact(codec.loads(data))
+    )
+    return cases
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def timed_round(prepare, function, calls):
+    """Seconds per call for one round, with garbage collection off as timeit does"""
+    arguments = prepare(calls)
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for argument in arguments:
+            function(*argument)
+        return (time.perf_counter() - start) / calls
+    finally:
+        gc.enable()
+
+
+def measure(ops_per_call, prepare, function, rounds, seconds):
+    """Fastest microseconds per op over the rounds; calls per round are sized to take about seconds / rounds"""
+    calls = 1
+    while True:
+        best = timed_round(prepare, function, calls)
+        if best * calls >= seconds / rounds / 4 or calls >= 1_000_000:
+            break
+        calls *= 4
+
+    for _ in range(rounds - 1):
+        best = min(best, timed_round(prepare, function, calls))
+    return best / ops_per_call * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark the orchestration Lambda's hot paths against stored baselines")
+    parser.add_argument("--only", nargs="+", help="run only cases whose name contains one of these words")
+    parser.add_argument("--rounds", type=int, default=7, help="rounds per case (the fastest is reported)")
+    parser.add_argument("--seconds", type=float, default=0.5, help="approximate time per case")
+    parser.add_argument("--threshold", type=float, help="slowdown over the baseline that fails the run (default: the stored one, or 1.5)")
+    parser.add_argument("--baselines", type=Path, default=BASELINE_FILE, help="baseline file")
+    parser.add_argument("--update", action="store_true", help="store this run's results as the baselines")
+    args = parser.parse_args()
+
+    utilities.register_transport(CONNECTION, NullTransport())
+    cases = build_cases()
+    if args.only:
+        cases = {name: case for name, case in cases.items() if any(word in name for word in args.only)}
+
+    stored = json.loads(args.baselines.read_text()) if args.baselines.exists() else {}
+    baselines = stored.get("cases", {})
+    threshold = args.threshold or stored.get("threshold", DEFAULT_THRESHOLD)
+
+    print(f"{'case':<38} {'us/op':>10} {'op':>6} {'baseline':>10} {'ratio':>7}")
+    results, regressions = {}, []
+    for name, (label, ops_per_call, prepare, function) in cases.items():
+        microseconds = measure(ops_per_call, prepare, function, args.rounds, args.seconds)
+        results[name] = round(microseconds, 4)
+        baseline = baselines.get(name)
+        ratio = microseconds / baseline if baseline else None
+        flag = "  SLOWER" if ratio and ratio > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<38} {microseconds:>10.3f} {label:>6} {baseline if baseline else '-':>10} "
+              f"{f'{ratio:.2f}' if ratio else '-':>7}{flag}")
+
+    if args.update:
+        args.baselines.write_text(json.dumps({
+            "threshold": threshold,
+            "python": sys.version.split()[0],
+            "json_codec": codec.BACKEND,
+            "cases": {**baselines, **results}
+        }, indent=2) + "\n")
+        print(f"Baselines written to {args.baselines}")
+        return
+
+    if regressions:
+        print(f"{len(regressions)} cases slower than {threshold:.2f}x their baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
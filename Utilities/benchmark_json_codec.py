@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+JSON Codec Benchmark - Encode/decode throughput of the orchestration Lambda's codec
+
+Runs the codec module with every installed backend (json, orjson, msgspec) on the
+payloads the Lambda handles per request:
+
+- decode_chat_request on WebSocket bodies with short and long chat histories
+- dumps_bytes on streamed token frames, info frames and result data frames
+- loads on the schema definition file
+
+and reports microseconds per call and MB/s. Install orjson or msgspec locally to
+compare them; the Lambda uses whichever is packaged with it.
+
+Usage:
+    python benchmark_json_codec.py
+    python benchmark_json_codec.py --backends json orjson --seconds 0.5
+"""
+
+import argparse
+import importlib
+import json
+import random
+import time
+
+from lambda_env import setup_lambda_env, SCHEMA_FILE
+
+setup_lambda_env()
+
+import constants  # noqa: E402
+import codec  # noqa: E402
+
+BACKENDS = ("json", "orjson", "msgspec")
+
+QUESTIONS = [
+    "How many engineering grad students were there in fall 22?",
+    "What about nursing?",
+    "Break that down by campus and residency for the last five fall terms.",
+    "Which majors in the W. P. Carey School of Business grew the most since 2019?",
+]
+
+
+def chat_body(turns, seed=0):
+    """A WebSocket body with the given number of user/assistant turns, answers in markdown"""
+    generator = random.Random(seed)
+    messages = []
+    for turn in range(turns):
+        messages.append({"role": "user", "content": [{"text": generator.choice(QUESTIONS)}]})
+        if turn < turns - 1:
+            rows = "\n".join(f"| Fall {2015 + year} | {generator.randint(100, 90000):,} |" for year in range(generator.randint(2, 9)))
+            answer = f"There were **{generator.randint(100, 90000):,}** students.\n\n| Term | Students |\n|---|---|\n{rows}\n\nBREAK_TOKEN"
+            messages.append({"role": "assistant", "content": [{"text": answer}]})
+    return json.dumps({"action": "sendMessage", "messages": messages})
+
+
+def frames():
+    """Frames as sent through send_to_gateway"""
+    generator = random.Random(1)
+    rows = [[f"Fall {2010 + i % 14}", generator.choice(["Tempe", "Downtown Phoenix", "Online"]), generator.randint(1, 5000)] for i in range(400)]
+    return {
+        "token frame": {"type": "contentBlockDelta", "data": {"delta": {"text": " students"}, "contentBlockIndex": 0}},
+        "info frame": {"type": "info", "data": {"message": "Looking up the enrollment data for you..."}},
+        "data frame (400 rows)": {"type": "data", "data": {"columns": ["Term", "Campus", "Students"], "types": ["STRING", "STRING", "LONG"],
+                                                            "totalRows": 400, "truncated": False, "chunk": 0, "chunks": 1, "rows": rows}},
+    }
+
+
+def measure(function, argument, seconds):
+    """Microseconds per call, running the function repeatedly for about the given time"""
+    calls, start = 0, time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(50):
+            function(argument)
+        calls += 50
+        now = time.perf_counter()
+        if now >= deadline:
+            return (now - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the JSON codec backends on chat payloads")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS, help="backends to compare")
+    parser.add_argument("--seconds", type=float, default=0.3, help="time spent per measurement")
+    args = parser.parse_args()
+
+    cases = [(f"decode chat ({turns} turns)", "decode_chat_request", chat_body(turns)) for turns in (1, 10, 50)]
+    cases += [(f"encode {name}", "dumps_bytes", frame) for name, frame in frames().items()]
+    cases.append(("decode schema file", "loads", SCHEMA_FILE.read_bytes()))
+
+    results = {}
+    for backend in args.backends:
+        constants.JSON_CODEC = backend
+        importlib.reload(codec)
+        if codec.BACKEND != backend:
+            print(f"{backend} is not installed, skipping")
+            continue
+        results[backend] = [measure(getattr(codec, function), payload, args.seconds) for _, function, payload in cases]
+
+    if not results:
+        return
+    baseline = results.get("json")
+    print(f"\n{'payload':<28} {'bytes':>8}" + "".join(f" {backend + ' us':>12} {'MB/s':>7}" for backend in results)
+          + (" " + " ".join(f"{backend + ' x':>10}" for backend in results if backend != "json") if baseline else ""))
+    for position, (name, function, payload) in enumerate(cases):
+        size = len(payload) if function != "dumps_bytes" else len(json.dumps(payload))
+        line = f"{name:<28} {size:>8,}"
+        for backend, timings in results.items():
+            line += f" {timings[position]:>12.2f} {size / timings[position]:>7.0f}"
+        if baseline:
+            line += " " + " ".join(f"{baseline[position] / timings[position]:>9.1f}x" for backend, timings in results.items() if backend != "json")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Logging Benchmark - Per-token logging overhead on the streaming hot path
+
+Streams a synthetic model response through the orchestration Lambda's
+parse_and_send_response with a stub API Gateway client, and compares:
+
+- legacy: the earlier send_to_gateway, which formatted every frame into an
+  f-string at INFO before checking the level
+- current: send_to_gateway with lazy, sampled log_event records
+
+at the production level (TIMER), at INFO with text output, and at DEBUG with
+sampled text and JSON output. Records are written to /dev/null so only the
+formatting and handler cost is measured.
+
+A first run with logging disabled (logging.disable) measures parsing and frame
+building alone; the overhead columns are each path's time above it, which is
+the cost of logging itself.
+
+Usage:
+    python benchmark_logging.py
+    python benchmark_logging.py --tokens 2000 --repeat 20
+"""
+
+import argparse
+import logging
+import os
+import time
+
+from lambda_env import setup_lambda_env
+
+setup_lambda_env()
+
+import constants  # noqa: E402
+import structured_log  # noqa: E402
+import utilities  # noqa: E402
+from codec import dumps_bytes  # noqa: E402
+
+
+class Gone(Exception):
+    pass
+
+
+class StubGateway:
+    """post_to_connection that only encodes, so the measured time is parsing and logging"""
+
+    class exceptions:
+        GoneException = Gone
+
+    def post_to_connection(self, ConnectionId, Data):
+        pass
+
+
+def legacy_send_to_gateway(connectionId, json_data):
+    """send_to_gateway as it logged before lazy, sampled logging; delivery is the same as the current one"""
+    utilities.logger.info(f"Sending data to connection: {json_data}")
+    if connectionId in utilities.closed_connections:
+        raise utilities.ClientDisconnected(f"Connection {connectionId} is closed")
+    utilities.transport_for(connectionId).send(connectionId, json_data)
+    utilities.logger.info("Data sent successfully")
+
+
+def token_stream(tokens):
+    """A converse_stream response of the given number of small text deltas"""
+    events = [{"messageStart": {"role": "assistant"}}]
+    words = ["There", " were", " **12,431**", " graduate", " students", " in", " Fall", " 2022", ".", "\n"]
+    events += [{"contentBlockDelta": {"delta": {"text": words[position % len(words)]}, "contentBlockIndex": 0}}
+               for position in range(tokens)]
+    events += [{"contentBlockStop": {"contentBlockIndex": 0}}, {"messageStop": {"stopReason": "end_turn"}}]
+    return events
+
+
+def configure(level, output):
+    """Root level and formatter as setup_logging would, writing to /dev/null"""
+    root = logging.getLogger()
+    root.setLevel(level)
+    structured_log.install(output, constants.LOG_FORMAT, constants.LOG_SAMPLE_RATES)
+    for handler in root.handlers:
+        handler.setStream(open(os.devnull, "w"))
+
+
+def run(events, repeat):
+    """Microseconds per streamed event, best of the repeats"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        utilities.parse_and_send_response({"stream": iter(events)}, "connection")
+        best = min(best, time.perf_counter() - start)
+    return best / len(events) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark logging overhead per streamed token")
+    parser.add_argument("--tokens", type=int, default=1000, help="text deltas per response")
+    parser.add_argument("--repeat", type=int, default=10, help="runs per scenario (best is reported)")
+    args = parser.parse_args()
+
+    utilities.gateway = StubGateway()
+    structured_log.bind_request("benchmark-request", "connection")
+    events = token_stream(args.tokens)
+    current_send_to_gateway = utilities.send_to_gateway
+
+    scenarios = [
+        ("TIMER (production)", constants.TIMER_LEVEL, "text"),
+        ("INFO text", logging.INFO, "text"),
+        ("DEBUG text, sampled", logging.DEBUG, "text"),
+        ("DEBUG json, sampled", logging.DEBUG, "json"),
+    ]
+
+    # Parsing and frame building without any logging, the floor both paths are compared with
+    logging.disable(logging.CRITICAL)
+    baseline = run(events, args.repeat)
+    logging.disable(logging.NOTSET)
+
+    print(f"{args.tokens} tokens per response, best of {args.repeat}")
+    print(f"Logging disabled: {baseline:.2f} us/token (parsing and frames only)\n")
+    print(f"{'level':<22} {'legacy us/token':>16} {'current us/token':>17} {'legacy overhead':>16} {'current overhead':>17}")
+    for name, level, output in scenarios:
+        configure(level, output)
+        utilities.send_to_gateway = legacy_send_to_gateway
+        legacy = run(events, args.repeat)
+        utilities.send_to_gateway = current_send_to_gateway
+        current = run(events, args.repeat)
+        print(f"{name:<22} {legacy:>16.2f} {current:>17.2f} {legacy - baseline:>16.2f} {current - baseline:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Schema Format Benchmark - Prompt cost and classification agreement per schema format
+
+Renders the schema definition in every format supported by the orchestration
+Lambda (json, json_min, ddl, outline, tsv) and reports characters and approximate
+tokens, both with inlined possible_values and in lookup mode (value counts only).
+
+With --live it also classifies every recorded fixture question with each format
+against Bedrock and reports how often the classification agrees with the recorded
+label. Pick the per-stage formats in chatbot_config from these numbers.
+
+Fixtures are JSON lines: {"question": "...", "classification": "SQL_Query"}.
+--record rewrites the labels with the classifications produced by --record-format,
+so a known-good baseline can be captured before comparing formats.
+
+Usage:
+    python benchmark_schema_formats.py                  # Size report only
+    python benchmark_schema_formats.py --live           # Size report and agreement check
+    python benchmark_schema_formats.py --live --formats json json_min ddl
+    python benchmark_schema_formats.py --record --record-format json
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from lambda_env import setup_lambda_env, SCHEMA_FILE
+
+setup_lambda_env()
+
+import chatbot_config  # noqa: E402
+import utilities  # noqa: E402
+from results import CHARS_PER_TOKEN  # noqa: E402
+from schema_index import get_schema_index  # noqa: E402
+from schema_render import render_schema, RENDERERS  # noqa: E402
+
+FIXTURES_FILE = Path(__file__).resolve().parent / "fixtures" / "classification_fixtures.jsonl"
+
+
+def load_fixtures(path):
+    """Read the recorded question/classification pairs"""
+    return [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+
+
+def size_report(schema, formats):
+    """Print characters and approximate tokens for every format, inline and lookup"""
+    compact = get_schema_index(schema).compact_schema()
+    baseline = len(render_schema(schema, "json"))
+
+    print(f"{'format':<10} {'chars':>8} {'~tokens':>8} {'vs json':>8} {'lookup chars':>13} {'~tokens':>8}")
+    for format in formats:
+        inline = len(render_schema(schema, format))
+        lookup = len(render_schema(compact, format))
+        print(f"{format:<10} {inline:>8} {inline // CHARS_PER_TOKEN:>8} {inline / baseline:>8.0%} "
+              f"{lookup:>13} {lookup // CHARS_PER_TOKEN:>8}")
+
+
+def classify(question, schema_text):
+    """Classify one question against Bedrock with the given schema rendering"""
+    message = {"role": "user", "content": [{"text": question}]}
+    start = time.perf_counter()
+    response = utilities.converse_with_route(
+        "classify",
+        [message],
+        config=chatbot_config.get_config("classify"),
+        system=chatbot_config.get_prompt("classify", message=question, chatHistory=f"user: {question}\n\n", schema=schema_text),
+        streaming=False
+    )
+    elapsed = time.perf_counter() - start
+    usage = response.get("usage", {})
+    return utilities.get_structured_output(response).get("classification"), usage.get("inputTokens", 0), elapsed
+
+
+def agreement_report(schema, formats, fixtures):
+    """Classify every fixture with each format and print the agreement with the recorded labels"""
+    print(f"\n{'format':<10} {'agree':>7} {'in tok':>8} {'avg s':>7}  disagreements")
+    for format in formats:
+        schema_text = render_schema(schema, format)
+        agreed, tokens, seconds, misses = 0, 0, 0.0, []
+        for fixture in fixtures:
+            label, input_tokens, elapsed = classify(fixture["question"], schema_text)
+            tokens += input_tokens
+            seconds += elapsed
+            if label == fixture["classification"]:
+                agreed += 1
+            else:
+                misses.append(f"{fixture['question'][:40]!r}: {label}")
+        count = len(fixtures)
+        print(f"{format:<10} {agreed / count:>7.0%} {tokens / count:>8.0f} {seconds / count:>7.2f}  {'; '.join(misses)}")
+
+
+def record_fixtures(schema, format, fixtures, path):
+    """Relabel the fixtures with the classifications produced by one format"""
+    schema_text = render_schema(schema, format)
+    for fixture in fixtures:
+        fixture["classification"], _, _ = classify(fixture["question"], schema_text)
+    path.write_text("".join(json.dumps(fixture) + "\n" for fixture in fixtures))
+    print(f"Recorded {len(fixtures)} classifications with format {format} to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare schema prompt formats by size and classification agreement")
+    parser.add_argument("--schema", type=Path, default=SCHEMA_FILE, help="schema definition JSON")
+    parser.add_argument("--formats", nargs="+", default=list(RENDERERS), choices=list(RENDERERS), help="formats to compare")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_FILE, help="recorded classification fixtures (JSON lines)")
+    parser.add_argument("--live", action="store_true", help="run the classification agreement check against Bedrock")
+    parser.add_argument("--record", action="store_true", help="rewrite the fixture labels from a live run")
+    parser.add_argument("--record-format", default="json", choices=list(RENDERERS), help="format used by --record")
+    args = parser.parse_args()
+
+    schema = json.loads(args.schema.read_text())
+    fixtures = load_fixtures(args.fixtures)
+
+    if args.record:
+        record_fixtures(schema, args.record_format, fixtures, args.fixtures)
+        return
+
+    size_report(schema, args.formats)
+
+    if args.live:
+        agreement_report(schema, args.formats, fixtures)
+    else:
+        print(f"\nClassification agreement skipped ({len(fixtures)} fixtures); run with --live to call Bedrock.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Schema Lookup Benchmark - Inline possible_values vs. the lookup_values tool
+
+Compares the create_question stage with every possible_values list inlined in the
+prompt against the lookup mode, where the prompt carries column names and
+descriptions only and the model calls lookup_values for exact values.
+
+Offline (default) it reports prompt size in characters and approximate tokens.
+With --live it also calls Bedrock for each question in both modes and reports
+input/output tokens, lookup rounds and end-to-end latency. Live runs need AWS
+credentials with Bedrock access in the environment.
+
+Usage:
+    python benchmark_schema_lookup.py                       # Prompt size only
+    python benchmark_schema_lookup.py --live                # Prompt size, tokens and latency
+    python benchmark_schema_lookup.py --live --questions questions.txt --repeat 3
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from lambda_env import setup_lambda_env, SCHEMA_FILE
+
+setup_lambda_env()
+
+import chatbot_config  # noqa: E402
+import utilities  # noqa: E402
+from results import CHARS_PER_TOKEN  # noqa: E402
+from schema_index import get_schema_index  # noqa: E402
+from schema_render import render_schema  # noqa: E402
+
+DEFAULT_QUESTIONS = [
+    "How many engineering grad students were there in fall 22?",
+    "How many online nursing students are there?",
+    "What is the enrollment of out of state computer science majors at Tempe?",
+    "How many first time freshmen enrolled in the business college in 2019?",
+    "How many female students are in STEM programs at the downtown campus?",
+]
+
+MODES = ("inline", "lookup")
+
+
+def build_request(question, schema, mode):
+    """System prompt, message and tool configuration of create_question in the given mode"""
+    chatbot_config.create_question_schema_value_mode = mode
+    index = get_schema_index(schema) if mode == "lookup" else None
+    schema_text = render_schema(index.compact_schema() if index else schema, chatbot_config.get_schema_format("create_question"))
+    message = {"role": "user", "content": [{"text": question}]}
+    system = chatbot_config.get_prompt(
+        "create_question",
+        message=question,
+        chatHistory=f"user: {question}\n\n",
+        schema=schema_text,
+        reasoning="The user asks for a student count."
+    )
+    return message, system, chatbot_config.get_tool_config("create_question"), index
+
+
+def prompt_size(system, tool_config):
+    """Characters and approximate tokens sent with every call (prompt plus tool specs)"""
+    chars = len(system[0]["text"]) + len(json.dumps(tool_config or {}))
+    return chars, chars // CHARS_PER_TOKEN
+
+
+def run_live(question, schema, mode):
+    """Run create_question once against Bedrock, returning latency, token usage, calls and the answer"""
+    message, system, _, index = build_request(question, schema, mode)
+    usage = {"inputTokens": 0, "outputTokens": 0, "calls": 0}
+    converse = utilities.bedrock.converse
+
+    def counting_converse(**request):
+        response = converse(**request)
+        usage["inputTokens"] += response.get("usage", {}).get("inputTokens", 0)
+        usage["outputTokens"] += response.get("usage", {}).get("outputTokens", 0)
+        usage["calls"] += 1
+        return response
+
+    utilities.bedrock.converse = counting_converse
+    try:
+        start = time.perf_counter()
+        config = chatbot_config.get_config("create_question")
+        if index:
+            response = utilities.converse_with_lookup("create_question", [message], index, config=config, system=system)
+        else:
+            response = utilities.converse_with_route("create_question", [message], config=config, system=system)
+        elapsed = time.perf_counter() - start
+    finally:
+        utilities.bedrock.converse = converse
+
+    answer = utilities.get_structured_output(response).get("improved_questions", [])
+    return elapsed, usage, answer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inline schema values against the lookup_values tool")
+    parser.add_argument("--live", action="store_true", help="call Bedrock and measure tokens and latency")
+    parser.add_argument("--questions", type=Path, help="file with one question per line")
+    parser.add_argument("--repeat", type=int, default=1, help="live runs per question and mode")
+    parser.add_argument("--schema", type=Path, default=SCHEMA_FILE, help="schema definition JSON")
+    args = parser.parse_args()
+
+    schema = json.loads(args.schema.read_text())
+    questions = [line.strip() for line in args.questions.read_text().splitlines() if line.strip()] if args.questions else DEFAULT_QUESTIONS
+    original_mode = chatbot_config.create_question_schema_value_mode
+
+    print("Prompt size per create_question call")
+    print(f"{'mode':<8} {'chars':>8} {'~tokens':>8}")
+    for mode in MODES:
+        _, system, tool_config, _ = build_request(questions[0], schema, mode)
+        chars, tokens = prompt_size(system, tool_config)
+        print(f"{mode:<8} {chars:>8} {tokens:>8}")
+
+    if args.live:
+        results = {mode: [] for mode in MODES}
+        for question in questions:
+            print(f"\n{question}")
+            for mode in MODES:
+                for _ in range(args.repeat):
+                    elapsed, usage, answer = run_live(question, schema, mode)
+                    results[mode].append((elapsed, usage))
+                    print(f"  {mode:<7} {elapsed:6.2f}s  in={usage['inputTokens']:<6} out={usage['outputTokens']:<4} calls={usage['calls']}  {answer[:1]}")
+
+        print("\nSummary")
+        print(f"{'mode':<8} {'p50 s':>7} {'max s':>7} {'in tok':>8} {'out tok':>8} {'calls':>6}")
+        for mode in MODES:
+            latencies = [elapsed for elapsed, _ in results[mode]]
+            print(f"{mode:<8} {statistics.median(latencies):>7.2f} {max(latencies):>7.2f} "
+                  f"{statistics.mean(usage['inputTokens'] for _, usage in results[mode]):>8.0f} "
+                  f"{statistics.mean(usage['outputTokens'] for _, usage in results[mode]):>8.0f} "
+                  f"{statistics.mean(usage['calls'] for _, usage in results[mode]):>6.1f}")
+
+    chatbot_config.create_question_schema_value_mode = original_mode
+
+
+if __name__ == "__main__":
+    main()
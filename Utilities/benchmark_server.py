@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Server Benchmark - Conversations per second of server mode versus the Lambda path
+
+Runs complete SQL conversations (classify, create_question, knowledge base,
+streamed answer) against simulated AWS clients with realistic latencies (see
+simulated_aws.py; --scale shortens them) and compares:
+
+- lambda: the background invocation handler, one conversation at a time, as
+  one Lambda execution environment serves them
+- server: server.py with the given worker counts, requests POSTed over HTTP
+  by concurrent clients
+
+and reports throughput per process, time to first token and time to the end
+of the answer. The Lambda path needs one execution environment (and one cold
+start) per concurrent conversation; the last column shows how many processes
+each mode needs for --target concurrent conversations.
+
+Usage:
+    python benchmark_server.py
+    python benchmark_server.py --conversations 400 --concurrency 64 128 256 --scale 0.1
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import statistics
+import time
+
+from lambda_env import setup_lambda_env
+
+setup_lambda_env(logging.ERROR)
+
+import lambda_function  # noqa: E402
+import server  # noqa: E402
+from simulated_aws import SimulatedAws  # noqa: E402
+
+
+class Context:
+    """Lambda context of a background invocation"""
+    function_name = "local"
+    aws_request_id = "benchmark"
+
+    def get_remaining_time_in_millis(self):
+        return 600_000
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def latencies(aws, started):
+    """Seconds to the first token and to messageStop for each finished conversation"""
+    first = [aws.gateway.first_token[connection] - start for connection, start in started.items() if connection in aws.gateway.first_token]
+    done = [aws.gateway.finished[connection] - start for connection, start in started.items() if connection in aws.gateway.finished]
+    return first, done
+
+
+def run_lambda(aws, conversations):
+    """Background invocations back to back in one process"""
+    started = {}
+    begin = time.perf_counter()
+    for position in range(conversations):
+        event = aws.event("How many engineering grad students were there in fall 22?", f"lambda-{position}")
+        event["background_processing"] = True
+        started[event["requestContext"]["connectionId"]] = time.perf_counter()
+        lambda_function.lambda_handler(event, Context())
+    return time.perf_counter() - begin, started
+
+
+async def post_chat(host, port, events, started):
+    """POST events one after another on one keep-alive connection"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for event in events:
+            body = event["body"].encode()
+            connection = event["requestContext"]["connectionId"]
+            writer.write((f"POST /chat HTTP/1.1\r\nHost: {host}\r\nX-Connection-Id: {connection}\r\n"
+                          f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body)
+            started[connection] = time.perf_counter()
+            await writer.drain()
+            status = await reader.readline()
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            if b" 202 " not in status:
+                raise RuntimeError(f"Request rejected: {status!r}")
+    finally:
+        writer.close()
+
+
+async def run_server(aws, conversations, concurrency, clients):
+    """Conversations POSTed by concurrent HTTP clients to a server with the given worker count"""
+    chat_server = server.ChatServer(concurrency, queue_size=conversations)
+    chat_server.start()
+    http = await asyncio.start_server(chat_server.handle_connection, "127.0.0.1", 0)
+    port = http.sockets[0].getsockname()[1]
+
+    events = [aws.event("How many engineering grad students were there in fall 22?", f"server-{concurrency}-{position}")
+              for position in range(conversations)]
+    started = {}
+    begin = time.perf_counter()
+    await asyncio.gather(*(post_chat("127.0.0.1", port, events[client::clients], started) for client in range(clients)))
+    await chat_server.queue.join()
+    elapsed = time.perf_counter() - begin
+
+    http.close()
+    await chat_server.stop(grace=1)
+    if chat_server.counts["failed"]:
+        raise RuntimeError(f"{chat_server.counts['failed']} conversations failed")
+    return elapsed, started
+
+
+def report(name, aws, conversations, elapsed, started, per_process, target):
+    first, done = latencies(aws, started)
+    if len(done) != conversations:
+        raise RuntimeError(f"{name}: {len(done)} of {conversations} conversations finished")
+    throughput = conversations / elapsed
+    print(f"{name:<16} {conversations:>6} {elapsed:>8.2f} {throughput:>8.1f} "
+          f"{statistics.median(first):>8.2f} {percentile(first, 0.95):>8.2f} "
+          f"{statistics.median(done):>8.2f} {percentile(done, 0.95):>8.2f} {math.ceil(target / per_process):>10}")
+    return throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server mode against the Lambda path with simulated AWS latency")
+    parser.add_argument("--conversations", type=int, default=200, help="conversations per server run")
+    parser.add_argument("--lambda-conversations", type=int, default=5, help="conversations for the sequential Lambda run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 128], help="server worker counts")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent HTTP clients")
+    parser.add_argument("--scale", type=float, default=0.1, help="multiplier for the simulated AWS latencies")
+    parser.add_argument("--target", type=int, default=500, help="concurrent conversations to size for")
+    args = parser.parse_args()
+
+    aws = SimulatedAws(scale=args.scale).install()
+    print(f"Simulated AWS latency x{args.scale}; times in seconds")
+    print(f"{'mode':<16} {'convs':>6} {'elapsed':>8} {'conv/s':>8} {'ttft p50':>8} {'ttft p95':>8} "
+          f"{'done p50':>8} {'done p95':>8} {'processes':>10}")
+
+    elapsed, started = run_lambda(aws, args.lambda_conversations)
+    report("lambda", aws, args.lambda_conversations, elapsed, started, 1, args.target)
+
+    for concurrency in args.concurrency:
+        elapsed, started = asyncio.run(run_server(aws, args.conversations, concurrency, args.clients))
+        report(f"server x{concurrency}", aws, args.conversations, elapsed, started, concurrency, args.target)
+
+
+if __name__ == "__main__":
+    main()
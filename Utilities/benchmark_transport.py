@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Transport Benchmark - Cost of pushing a streamed answer to the client
+
+Streams one model answer through parse_and_send_response over each transport:
+
+- websocket: API Gateway post_to_connection, one HTTPS request per frame,
+  simulated with a fixed latency per request (--post-ms)
+- stream: StreamTransport writing SSE chunks to a local socket, as an HTTP
+  streaming response (server mode's /chat/stream) does
+- memory: MemoryTransport, the floor set by parsing and encoding alone
+
+The model stream itself has no latency, so the times are the transport's.
+
+Usage:
+    python benchmark_transport.py
+    python benchmark_transport.py --tokens 600 --post-ms 25
+"""
+
+import argparse
+import logging
+import socket
+import threading
+import time
+
+from lambda_env import setup_lambda_env
+
+setup_lambda_env(logging.ERROR)
+
+import utilities  # noqa: E402
+from simulated_aws import ANSWER, SimulatedAws, SimulatedStream  # noqa: E402
+from transport import MemoryTransport, StreamTransport  # noqa: E402
+
+
+def drain(connection):
+    """Read and discard everything the client side receives"""
+    while connection.recv(65536):
+        pass
+
+
+def stream_transport():
+    """An SSE StreamTransport writing chunked HTTP to a local socket"""
+    server_side, client_side = socket.socketpair()
+    threading.Thread(target=drain, args=(client_side,), daemon=True).start()
+
+    def write(data):
+        server_side.sendall(b"%x\r\n%s\r\n" % (len(data), data))
+
+    return StreamTransport(write, lambda: server_side.sendall(b"0\r\n\r\n"), "sse")
+
+
+def run(aws, text, connection_id, transport=None):
+    """Seconds to stream the answer and the number of frames sent"""
+    if transport is not None:
+        utilities.register_transport(connection_id, transport)
+    start = time.perf_counter()
+    utilities.parse_and_send_response({"stream": SimulatedStream(aws, text)}, connection_id)
+    elapsed = time.perf_counter() - start
+    utilities.release_transport(connection_id)
+    if transport is not None:
+        transport.close(connection_id)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response transports on one streamed answer")
+    parser.add_argument("--tokens", type=int, default=300, help="streamed words in the answer")
+    parser.add_argument("--post-ms", type=float, default=15.0, help="latency of one post_to_connection request")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per transport (best is reported)")
+    args = parser.parse_args()
+
+    aws = SimulatedAws(latency={"first_token": 0, "token": 0, "post": args.post_ms / 1000}).install()
+    words = ANSWER.replace("BREAK_TOKEN", " ").split()
+    text = " ".join(words[position % len(words)] for position in range(args.tokens))
+    frames = args.tokens + 2
+
+    transports = {
+        "websocket": lambda: None,
+        "stream (SSE)": stream_transport,
+        "memory": MemoryTransport,
+    }
+    print(f"{args.tokens} tokens, post_to_connection {args.post_ms:.0f} ms")
+    print(f"{'transport':<14} {'total ms':>10} {'us/frame':>10}")
+    for name, factory in transports.items():
+        best = min(run(aws, text, f"{name}-{attempt}", factory()) for attempt in range(args.repeat))
+        print(f"{name:<14} {best * 1000:>10.1f} {best / frames * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
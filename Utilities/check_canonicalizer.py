@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Canonicalizer Check - Expected canonicalizations of fixture questions on the real schema
+
+Runs every fixture question through the question canonicalizer built from the
+local schema definition and checks whether it is confident (skips the
+create_question model) and, when it is, the canonical question it produces.
+Phrasings that must not be canonicalized (wrong plurals, spell corrections,
+grouping) are fixtures with "confident": false.
+
+Fixtures are JSON lines:
+    {"question": "...", "confident": true, "canonical": "SUM \"Students\" WHERE ..."}
+    {"question": "What about fall 2021?", "history": ["How many ..."], "confident": true, "canonical": "..."}
+    {"periods": ["Spring 2022", "Fall 2022"], "latest": "Fall 2022"}
+The last form checks which time period is picked as the latest.
+
+The run fails (exit code 1) when any fixture does not match.
+
+Usage:
+    python check_canonicalizer.py
+    python check_canonicalizer.py --fixtures my_cases.jsonl
+"""
+
+import argparse
+import copy
+import json
+import logging
+import sys
+from pathlib import Path
+
+from lambda_env import setup_lambda_env, SCHEMA_FILE
+
+setup_lambda_env(logging.ERROR)
+
+from canonicalizer import Canonicalizer  # noqa: E402
+from chatbot_config import canonicalizer_time_column  # noqa: E402
+
+FIXTURES_FILE = Path(__file__).resolve().parent / "fixtures" / "canonicalizer_cases.jsonl"
+
+
+def chat(case):
+    """Chat history of a fixture: earlier user questions with placeholder answers, then the question"""
+    messages = []
+    for text in case.get("history", []):
+        messages.append({"role": "user", "content": [{"text": text}]})
+        messages.append({"role": "assistant", "content": [{"text": "There were 1,234 students."}]})
+    messages.append({"role": "user", "content": [{"text": case["question"]}]})
+    return messages
+
+
+def with_periods(schema, periods):
+    """A copy of the schema whose time column has the given values"""
+    schema = copy.deepcopy(schema)
+    for table in schema["tables"]:
+        for column in table["columns"]:
+            if column["column_name"] == canonicalizer_time_column:
+                column["possible_values"] = periods
+    return schema
+
+
+def check(schema, canonicalizer, case):
+    """A description of how the fixture failed, or None"""
+    if "periods" in case:
+        latest = Canonicalizer(with_periods(schema, case["periods"])).latest_period
+        return None if latest == case["latest"] else f"latest of {case['periods']} is {latest!r}, expected {case['latest']!r}"
+
+    result = canonicalizer.canonicalize(chat(case))
+    if result.confident != case["confident"]:
+        return f"confident={result.confident}, expected {case['confident']} ({result!r})"
+    if result.confident and case.get("canonical") and result.question != case["canonical"]:
+        return f"canonical {result.question!r}, expected {case['canonical']!r}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the question canonicalizer against fixture questions on the real schema")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_FILE, help="JSONL fixture file")
+    args = parser.parse_args()
+
+    schema = json.loads(SCHEMA_FILE.read_text())
+    canonicalizer = Canonicalizer(schema)
+    cases = [json.loads(line) for line in args.fixtures.read_text().splitlines() if line.strip()]
+
+    failures = 0
+    for case in cases:
+        failure = check(schema, canonicalizer, case)
+        label = case.get("question") or f"latest of {case['periods']}"
+        print(f"{'FAIL' if failure else 'ok':<5} {label}" + (f"\n      {failure}" if failure else ""))
+        failures += bool(failure)
+
+    print(f"{len(cases) - failures}/{len(cases)} fixtures passed")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Pipeline Evaluation - Speed, cost and answer agreement of pipeline configurations
+
+Runs a labeled question set through orchestrate() (via batch mode) once per
+named configuration and compares them: classification accuracy against the
+labels, agreement of the refined question and SQL, p50/p95 latency overall,
+to the first answer text and per stage, and tokens per question.
+
+A configuration overrides chatbot_config settings by name, e.g.
+    {"baseline": {},
+     "lite-classify": {"model_routes": {"classify": {"models": ["us.amazon.nova-lite-v1:0"]}}},
+     "no-create-question": {"canonicalizer_enabled": false, "create_question_enabled": false},
+     "pruned-schema": {"schema_file": "pruned_schema.json"}}
+Dictionary settings are merged one level deep (only the classify route above
+changes); "schema_file" replaces the schema with a local schema definition.
+The first configuration is the baseline.
+
+Refined questions and SQL are compared with the item's "refined_question" and
+"sql" labels when it has them, otherwise with the baseline's.
+
+Offline runs replay fixtures: record one cassette per configuration against
+AWS once with --record, then every later run with the same --cassettes
+directory replays them (at recorded speed, or --fast for quality only).
+--simulated runs against the simulated clients instead.
+
+Usage:
+    python evaluate_pipeline.py --cassettes fixtures/evaluation --record
+    python evaluate_pipeline.py --cassettes fixtures/evaluation
+    python evaluate_pipeline.py --simulated --configurations my_configurations.json
+"""
+
+import argparse
+import json
+import logging
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+from lambda_env import setup_lambda_env, LAMBDA_DIR
+
+setup_lambda_env(logging.ERROR)
+
+import batch  # noqa: E402
+import cassette  # noqa: E402
+import chatbot_config  # noqa: E402
+import orchestration  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+QUESTIONS_FILE = FIXTURES_DIR / "classification_fixtures.jsonl"
+CONFIGURATIONS_FILE = FIXTURES_DIR / "pipeline_configurations.json"
+STAGES = ["classify", "create_question", "knowledge_base", "final_response", "response_stream"]
+
+
+# ============================================================================
+# CONFIGURATIONS
+# ============================================================================
+
+def lambda_modules():
+    """The orchestration Lambda's modules loaded in this process"""
+    return [module for module in list(sys.modules.values())
+            if str(getattr(module, "__file__", "") or "").startswith(str(LAMBDA_DIR))]
+
+
+@contextmanager
+def configured(settings):
+    """
+    Apply a configuration's settings to chatbot_config and to every Lambda
+    module that imported them by name; restore them afterwards.
+    """
+    changes = []
+    try:
+        for name, value in settings.items():
+            if name == "schema_file":
+                schema = json.loads(Path(value).read_text())
+                changes.append((orchestration, "load_schema", orchestration.load_schema))
+                orchestration.load_schema = lambda: schema
+                continue
+            if not hasattr(chatbot_config, name):
+                raise ValueError(f"Unknown setting: {name}")
+
+            current = getattr(chatbot_config, name)
+            if isinstance(current, dict) and isinstance(value, dict):
+                value = {**current, **value}
+            for module in lambda_modules():
+                if getattr(module, name, None) is current:
+                    changes.append((module, name, current))
+                    setattr(module, name, value)
+        yield
+    finally:
+        for module, name, original in reversed(changes):
+            setattr(module, name, original)
+
+
+def run_configuration(name, settings, items, args):
+    """Results of the question set under one configuration"""
+    if args.cassettes:
+        path = Path(args.cassettes) / f"{name}.cassette.jsonl"
+        if not args.record and not path.exists():
+            raise SystemExit(f"No recorded fixtures for {name} at {path}; record them with --record")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cassette.install(str(path), "record" if args.record else "replay", "fast" if args.fast else "recorded")
+
+    results = []
+    try:
+        with configured(settings):
+            batch.run_batch(items, args.concurrency, args.rate, on_result=results.append)
+    finally:
+        cassette.uninstall()
+    return results
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+def normalize_text(text):
+    return " ".join(str(text).lower().split()) if text else None
+
+
+def normalize_sql(sql):
+    return normalize_text(sql).rstrip(";").strip() if sql else None
+
+
+def percentile(values, share):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def share(matches):
+    return sum(matches) / len(matches) if matches else None
+
+
+def agreement(results, references, items, field, normalize):
+    """Share of items whose field matches the item's label, or the baseline's value without one"""
+    matches = []
+    for result, reference, item in zip(results, references, items):
+        expected = item.get(field, reference.get(field))
+        if expected is not None:
+            matches.append(normalize(result.get(field)) == normalize(expected))
+    return share(matches)
+
+
+def evaluate(results, references, items):
+    """Metrics of one configuration's results"""
+    finished = [result for result in results if "seconds" in result]
+    labeled = [(result, item) for result, item in zip(results, items) if item.get("classification")]
+    metrics = {
+        "items": len(results),
+        "failed": sum(1 for result in results if result.get("error")),
+        "classification_accuracy": share([result.get("classification") == item["classification"] for result, item in labeled]),
+        "question_agreement": agreement(results, references, items, "refined_question", normalize_text),
+        "sql_agreement": agreement(results, references, items, "sql", normalize_sql),
+        "latency_p50": percentile([result["seconds"] for result in finished], 0.5),
+        "latency_p95": percentile([result["seconds"] for result in finished], 0.95),
+        "first_text_p50": percentile([result["first_text_seconds"] for result in finished if result.get("first_text_seconds")], 0.5),
+        "tokens": sum(result["tokens"]["totalTokens"] for result in finished),
+        "stages": {}
+    }
+    metrics["tokens_per_item"] = metrics["tokens"] / len(finished) if finished else None
+    for stage in STAGES:
+        seconds = [result["stages"][stage]["seconds"] for result in finished if stage in result["stages"]]
+        if seconds:
+            metrics["stages"][stage] = {"p50": percentile(seconds, 0.5), "p95": percentile(seconds, 0.95), "items": len(seconds)}
+    return metrics
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def cell(value, format):
+    return "-" if value is None else format.format(value)
+
+
+def print_report(evaluations):
+    print(f"\n{'configuration':<20} {'items':>5} {'failed':>6} {'class acc':>9} {'question':>9} {'sql':>9} "
+          f"{'p50 s':>7} {'p95 s':>7} {'ttft p50':>8} {'tokens/q':>9}")
+    for name, metrics in evaluations.items():
+        print(f"{name:<20} {metrics['items']:>5} {metrics['failed']:>6} "
+              f"{cell(metrics['classification_accuracy'], '{:.0%}'):>9} {cell(metrics['question_agreement'], '{:.0%}'):>9} "
+              f"{cell(metrics['sql_agreement'], '{:.0%}'):>9} {cell(metrics['latency_p50'], '{:.2f}'):>7} "
+              f"{cell(metrics['latency_p95'], '{:.2f}'):>7} {cell(metrics['first_text_p50'], '{:.2f}'):>8} "
+              f"{cell(metrics['tokens_per_item'], '{:.0f}'):>9}")
+
+    print("\nStage latency p50/p95 in seconds")
+    print(f"{'configuration':<20} " + " ".join(f"{stage:>15}" for stage in STAGES))
+    for name, metrics in evaluations.items():
+        stages = metrics["stages"]
+        print(f"{name:<20} " + " ".join(
+            f"{stages[stage]['p50']:>7.2f}/{stages[stage]['p95']:<7.2f}" if stage in stages else f"{'-':>15}"
+            for stage in STAGES
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pipeline configurations on a labeled question set")
+    parser.add_argument("--questions", type=Path, default=QUESTIONS_FILE, help="JSONL question set (batch items with optional labels)")
+    parser.add_argument("--configurations", type=Path, default=CONFIGURATIONS_FILE, help="JSON object of named configurations")
+    parser.add_argument("--only", nargs="+", help="run only these configurations (the first is the baseline)")
+    parser.add_argument("--cassettes", help="directory of recorded fixtures, one cassette per configuration")
+    parser.add_argument("--record", action="store_true", help="call AWS and record the fixtures into --cassettes")
+    parser.add_argument("--fast", action="store_true", help="replay fixtures without their recorded latencies")
+    parser.add_argument("--simulated", action="store_true", help="use the simulated AWS clients instead of AWS")
+    parser.add_argument("--scale", type=float, default=0.1, help="latency multiplier for --simulated")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions processed at once")
+    parser.add_argument("--rate", type=float, default=0, help="questions started per second (0 is unlimited)")
+    parser.add_argument("--output", type=Path, help="write the metrics and per-question results as JSON")
+    args = parser.parse_args()
+
+    if args.record and not args.cassettes:
+        parser.error("--record needs --cassettes")
+    if args.simulated:
+        from simulated_aws import SimulatedAws
+        SimulatedAws(scale=args.scale).install()
+
+    configurations = json.loads(args.configurations.read_text())
+    if args.only:
+        configurations = {name: configurations[name] for name in args.only}
+    items = batch.parse_items(args.questions.read_text().splitlines())
+
+    evaluations, runs, references = {}, {}, None
+    for name, settings in configurations.items():
+        print(f"Running {name} ({len(items)} questions)")
+        results = run_configuration(name, settings, items, args)
+        references = references or results
+        evaluations[name] = evaluate(results, references, items)
+        runs[name] = results
+
+    print_report(evaluations)
+    if args.output:
+        args.output.write_text(json.dumps({"metrics": evaluations, "results": runs}, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Lambda Environment - Import the orchestration Lambda's modules from local tools
+
+The orchestration modules read their configuration from environment variables at
+import time. Benchmarks and offline tools never reach the database, knowledge base
+or gateway, so placeholders are used for anything not set in the environment.
+
+Usage:
+    from lambda_env import setup_lambda_env, SCHEMA_FILE
+    setup_lambda_env()
+    import chatbot_config
+
+The Amplify deployment Lambda has its own constants and utilities modules, so a
+tool imports one Lambda or the other (setup_amplify_lambda_env), never both.
+"""
+
+import logging
+import os
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+LAMBDA_DIR = ROOT_DIR / "asu-nlq-terraform" / "lambdas" / "orchestration_lambda"
+AMPLIFY_LAMBDA_DIR = ROOT_DIR / "asu-nlq-terraform" / "lambdas" / "amplify_deployment_lambda"
+SCHEMA_FILE = ROOT_DIR / "asu-nlq-terraform" / "S3" / "asu_facts_table_definition_template.json"
+
+PLACEHOLDERS = {
+    "DATABASE_NAME": "local",
+    "TEMPLATE_NAME": "asu_facts_table_definition_template",
+    "API_GATEWAY_URL": "wss://local.invalid",
+    "DATABASE_DESCRIPTIONS_S3_NAME": "local",
+    "KNOWLEDGE_BASE_ID": "local",
+    "AWS_DEFAULT_REGION": "us-west-2",
+}
+
+AMPLIFY_PLACEHOLDERS = {
+    "AMPLIFY_APP_NAME": "local",
+    "FRONTEND_BUCKET_NAME": "local",
+    "FRONTEND_FOLDER_NAME": "/build/",
+    "AWS_DEFAULT_REGION": "us-west-2",
+}
+
+
+def setup_lambda_env(log_level=logging.WARNING):
+    """Fill in missing Lambda environment variables and put the Lambda on the import path."""
+    for name, value in PLACEHOLDERS.items():
+        os.environ.setdefault(name, value)
+    if str(LAMBDA_DIR) not in sys.path:
+        sys.path.insert(0, str(LAMBDA_DIR))
+
+    import constants  # noqa: F401  (configures logging)
+    logging.getLogger().setLevel(log_level)
+
+
+def setup_amplify_lambda_env(log_level=logging.WARNING):
+    """Fill in missing Amplify deployment Lambda environment variables and put it on the import path."""
+    for name, value in AMPLIFY_PLACEHOLDERS.items():
+        os.environ.setdefault(name, value)
+    if str(AMPLIFY_LAMBDA_DIR) not in sys.path:
+        sys.path.insert(0, str(AMPLIFY_LAMBDA_DIR))
+
+    import constants  # noqa: F401  (configures logging)
+    logging.getLogger().setLevel(log_level)
@@ -0,0 +1,347 @@
+"""
+Schema Import - Build table definitions from data files without holding them in memory
+
+Reads CSV/TSV or Parquet data in chunks (or SQL DDL), infers each column's type
+and collects its distinct values. Distinct values are kept exactly up to a cap;
+past the cap a column only keeps a fixed-size HyperLogLog sketch for its
+cardinality and is marked free-form (no possible_values). Memory use is bounded
+by the cap, whatever the file size.
+
+Used by schema_manager.py --import; the result is merged into the existing
+template, keeping hand-written descriptions.
+"""
+
+import csv
+import hashlib
+import math
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Rows read per chunk from data files
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Most distinct values listed as possible_values; columns above it are free-form
+DEFAULT_VALUE_CAP = 500
+
+# Values treated as NULL in data files
+NULL_TEXT = {"", "null", "none", "nan", "n/a", "na"}
+
+INTEGER_PATTERN = re.compile(r"^[+-]?\d+$")
+FLOAT_PATTERN = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+TIMESTAMP_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?")
+BOOLEAN_TEXT = {"true", "false"}
+
+
+class HyperLogLog:
+    """Fixed-size cardinality estimator (2^precision one-byte registers)."""
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    def add(self, value: str):
+        hashed = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        bits = 64 - self.precision
+        register = hashed >> bits
+        # Position of the leftmost 1 in the remaining bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        raw = alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+        empty = self.registers.count(0)
+        if raw <= 2.5 * self.size and empty:
+            return round(self.size * math.log(self.size / empty))
+        return round(raw)
+
+
+class ColumnProfile:
+    """Streaming profile of one column: type evidence, NULLs, longest value and distinct values up to a cap."""
+
+    def __init__(self, name: str, value_cap: int):
+        self.name = name
+        self.value_cap = value_cap
+        self.values = set()
+        self.sketch = None
+        self.rows = 0
+        self.nulls = 0
+        self.max_length = 0
+        self.kinds = {"integer": True, "float": True, "boolean": True, "date": True, "timestamp": True}
+        self.typed = True
+        self.declared_type = None
+        self.description = None
+
+    def add(self, value: Any):
+        self.rows += 1
+        if value is None:
+            self.nulls += 1
+            return
+        text = str(value).strip()
+        if text.lower() in NULL_TEXT:
+            self.nulls += 1
+            return
+
+        if len(text) > self.max_length:
+            self.max_length = len(text)
+        if self.typed:
+            self._update_kinds(value, text)
+
+        if self.sketch is None:
+            self.values.add(text)
+            if len(self.values) > self.value_cap:
+                # Too many distinct values to list: keep only a cardinality estimate from here on
+                self.sketch = HyperLogLog()
+                for seen in self.values:
+                    self.sketch.add(seen)
+                self.values = set()
+        else:
+            self.sketch.add(text)
+
+    def _update_kinds(self, value: Any, text: str):
+        kinds = self.kinds
+        if isinstance(value, bool):
+            kinds.update(integer=False, float=False, date=False, timestamp=False)
+            return
+        if isinstance(value, int):
+            kinds.update(boolean=False, date=False, timestamp=False)
+            return
+        if isinstance(value, float):
+            kinds.update(integer=False, boolean=False, date=False, timestamp=False)
+            return
+        if kinds["integer"] and not INTEGER_PATTERN.match(text):
+            kinds["integer"] = False
+        if kinds["float"] and not FLOAT_PATTERN.match(text):
+            kinds["float"] = False
+        if kinds["boolean"] and text.lower() not in BOOLEAN_TEXT:
+            kinds["boolean"] = False
+        if kinds["date"] and not DATE_PATTERN.match(text):
+            kinds["date"] = False
+        if kinds["timestamp"] and not TIMESTAMP_PATTERN.match(text):
+            kinds["timestamp"] = False
+        self.typed = any(kinds.values())
+
+    @property
+    def free_form(self) -> bool:
+        return self.sketch is not None
+
+    @property
+    def distinct_count(self) -> int:
+        return self.sketch.estimate() if self.sketch else len(self.values)
+
+    @property
+    def is_text(self) -> bool:
+        return self.data_type.startswith("VARCHAR")
+
+    @property
+    def data_type(self) -> str:
+        if self.declared_type:
+            return self.declared_type
+        if self.rows == self.nulls:
+            return "VARCHAR(50)"
+        if self.kinds["boolean"]:
+            return "BOOLEAN"
+        if self.kinds["integer"]:
+            return "INTEGER"
+        if self.kinds["float"]:
+            return "DOUBLE"
+        if self.kinds["date"]:
+            return "DATE"
+        if self.kinds["timestamp"]:
+            return "TIMESTAMP"
+        # Round text widths up to a multiple of 50, like the hand-written template
+        return f"VARCHAR({max(50, math.ceil(self.max_length / 50) * 50)})"
+
+    def possible_values(self) -> Optional[List[str]]:
+        """Sorted distinct values for text columns under the cap, otherwise None"""
+        if not self.is_text or self.free_form or not self.values:
+            return None
+        return sorted(self.values)
+
+
+def profile_file(path: Path, value_cap: int = DEFAULT_VALUE_CAP, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                 progress=None, ragged: Optional[Dict[str, int]] = None) -> List[ColumnProfile]:
+    """
+    Profile every column of a CSV/TSV or Parquet file, or read column definitions from SQL DDL.
+    Rows shorter than the header are padded with NULLs; when a ragged dict is given, the
+    counts of short and long rows are stored in it.
+    """
+    suffix = path.suffix.lower()
+    if suffix in (".sql", ".ddl"):
+        return parse_ddl(path.read_text())
+
+    chunks = read_parquet_chunks(path, chunk_rows) if suffix in (".parquet", ".pq") else read_csv_chunks(path, chunk_rows)
+    profiles = None
+    rows = short_rows = long_rows = 0
+    for columns, chunk in chunks:
+        if profiles is None:
+            profiles = [ColumnProfile(name, value_cap) for name in columns]
+        width = len(profiles)
+        for row in chunk:
+            if len(row) < width:
+                short_rows += 1
+                row = list(row) + [None] * (width - len(row))
+            elif len(row) > width:
+                long_rows += 1
+            for profile, value in zip(profiles, row):
+                profile.add(value)
+        rows += len(chunk)
+        if progress:
+            progress(rows)
+    if ragged is not None:
+        ragged.update(short_rows=short_rows, long_rows=long_rows)
+    return profiles or []
+
+
+def read_csv_chunks(path: Path, chunk_rows: int) -> Iterator:
+    """Yield (header, rows) chunks from a delimited text file"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if path.suffix.lower() == ".tsv":
+            delimiter = "\t"
+        else:
+            try:
+                delimiter = csv.Sniffer().sniff(f.read(65536), delimiters=",;\t|").delimiter
+            except csv.Error:
+                delimiter = ","
+            f.seek(0)
+
+        reader = csv.reader(f, delimiter=delimiter)
+        header = [name.strip() for name in next(reader)]
+        chunk = []
+        for row in reader:
+            if not row:
+                continue  # Blank line
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield header, chunk
+                chunk = []
+        if chunk:
+            yield header, chunk
+
+
+def read_parquet_chunks(path: Path, chunk_rows: int) -> Iterator:
+    """Yield (columns, rows) chunks from a Parquet file, one record batch at a time"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires pyarrow (pip install pyarrow)")
+
+    parquet = pq.ParquetFile(path)
+    columns = parquet.schema_arrow.names
+    for batch in parquet.iter_batches(batch_size=chunk_rows):
+        yield columns, list(zip(*(batch.column(i).to_pylist() for i in range(batch.num_columns))))
+
+
+DDL_TABLE_PATTERN = re.compile(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?[`\"\[]?([\w.]+)[`\"\]]?\s*\((.*?)\)\s*;", re.IGNORECASE | re.DOTALL)
+DDL_COLUMN_PATTERN = re.compile(r"^\s*[`\"\[]?(\w+)[`\"\]]?\s+([A-Za-z]+(?:\s*\([\d,\s]+\))?)(.*)$")
+DDL_COMMENT_PATTERN = re.compile(r"COMMENT\s+'((?:[^']|'')*)'", re.IGNORECASE)
+DDL_CONSTRAINTS = {"PRIMARY", "FOREIGN", "CONSTRAINT", "UNIQUE", "KEY", "INDEX", "CHECK"}
+
+
+def parse_ddl(text: str) -> List[ColumnProfile]:
+    """Column definitions (name, declared type, comment as description) from the first CREATE TABLE"""
+    match = DDL_TABLE_PATTERN.search(text)
+    if not match:
+        raise ValueError("No CREATE TABLE statement found")
+
+    profiles = []
+    for line in split_ddl_columns(match.group(2)):
+        body, _, line_comment = line.partition("--")
+        column = DDL_COLUMN_PATTERN.match(body)
+        if not column or column.group(1).upper() in DDL_CONSTRAINTS:
+            continue
+        profile = ColumnProfile(column.group(1), 0)
+        profile.declared_type = re.sub(r"\s+", "", column.group(2)).upper()
+        comment = DDL_COMMENT_PATTERN.search(column.group(3))
+        profile.description = (comment.group(1).replace("''", "'") if comment else line_comment.strip()) or None
+        profiles.append(profile)
+    return profiles
+
+
+def ddl_table_name(text: str) -> Optional[str]:
+    match = DDL_TABLE_PATTERN.search(text)
+    return match.group(1).split(".")[-1] if match else None
+
+
+def split_ddl_columns(body: str) -> List[str]:
+    """Split a CREATE TABLE body on top-level commas, keeping -- comments with their column"""
+    parts, current, depth, quoted = [], "", 0, False
+    for line in body.splitlines():
+        code, dash, comment = line.partition("--")
+        for char in code:
+            if char == "'":
+                quoted = not quoted
+            if not quoted and char == "(":
+                depth += 1
+            elif not quoted and char == ")":
+                depth -= 1
+            if char == "," and depth == 0 and not quoted:
+                parts.append(current)
+                current = ""
+            else:
+                current += char
+        if dash:
+            # A trailing comment belongs to the column defined on this line
+            if current.strip():
+                current += " --" + comment
+            elif parts:
+                parts[-1] += " --" + comment
+        current += " "
+    if current.strip():
+        parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def merge_into_schema(schema: Dict[str, Any], table_name: str, profiles: List[ColumnProfile]) -> Dict[str, List[str]]:
+    """
+    Merge profiled columns into the schema's table (created if missing).
+    Descriptions and data types already in the template are kept (a differing
+    inferred type is reported); possible_values come from the data.
+    Returns a report of added, differently typed, free-form and missing-description columns.
+    """
+    report = {"added": [], "type_differs": [], "free_form": [], "all_null": [], "needs_description": [], "not_in_data": []}
+    table = next((t for t in schema.setdefault("tables", []) if t.get("table_name") == table_name), None)
+    if table is None:
+        table = {"table_name": table_name, "description": "", "columns": []}
+        schema["tables"].append(table)
+
+    existing = {column["column_name"]: column for column in table.setdefault("columns", [])}
+    for profile in profiles:
+        column = existing.get(profile.name)
+        if column is None:
+            column = {"column_name": profile.name, "data_type": profile.data_type, "description": profile.description or ""}
+            table["columns"].append(column)
+            report["added"].append(profile.name)
+        else:
+            if not column.get("data_type"):
+                column["data_type"] = profile.data_type
+            elif column["data_type"] != profile.data_type:
+                report["type_differs"].append(f"{profile.name}: template {column['data_type']}, data {profile.data_type}")
+            if not column.get("description") and profile.description:
+                column["description"] = profile.description
+
+        # DDL carries no data, so values are only replaced when rows were read; a column
+        # with only NULLs in the file keeps its hand-curated values
+        if profile.rows and profile.rows == profile.nulls:
+            report["all_null"].append(profile.name)
+        elif profile.rows:
+            values = profile.possible_values()
+            if values:
+                column["possible_values"] = values
+            else:
+                column.pop("possible_values", None)
+                if profile.free_form:
+                    report["free_form"].append(f"{profile.name} (~{profile.distinct_count:,} distinct)")
+
+        if not column.get("description"):
+            report["needs_description"].append(profile.name)
+
+    imported = {profile.name for profile in profiles}
+    report["not_in_data"] = [name for name in existing if name not in imported]
+    if not table.get("description"):
+        report["needs_description"].insert(0, f"table {table_name}")
+    return report
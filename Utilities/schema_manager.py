@@ -9,6 +9,10 @@ Usage:
     python schema_manager.py          # Create new schema file
     python schema_manager.py --edit   # Edit existing schema file
     python schema_manager.py --print  # Print current schema state
+    python schema_manager.py --compile                  # Compile a content-addressed artifact and update the pointer
+    python schema_manager.py --compile --bucket NAME    # ...and publish both to the S3 bucket
+    python schema_manager.py --import data.csv --table NAME   # Merge columns and values from CSV/TSV, Parquet or SQL DDL
+    python schema_manager.py --import data.parquet --table NAME --value-cap 500 --chunk-rows 50000
 """
 
 import json
@@ -30,10 +34,20 @@ class SchemaManager:
         try:
             edit_mode = "--edit" in sys.argv
             print_mode = "--print" in sys.argv
+            compile_mode = "--compile" in sys.argv
+            import_file = self._get_argument("--import")
             
+            if import_file:
+                self._handle_import_mode(Path(import_file))
+                return
+
             if print_mode:
                 self._handle_print_mode()
                 return
+
+            if compile_mode:
+                self._handle_compile_mode()
+                return
             
             if edit_mode:
                 self._handle_edit_mode()
@@ -95,6 +109,139 @@ class SchemaManager:
             
             print("\n" + "-"*60)
     
+    def _handle_compile_mode(self):
+        """
+        Validate the schema and compile it into an artifact named by its content hash
+        (minified JSON, prompt renderings, value index, token costs), then update
+        the pointer object the orchestration Lambda checks for new versions.
+        """
+        from lambda_env import setup_lambda_env
+        setup_lambda_env()
+        from schema_artifact import validate_schema, compile_artifact, minified
+
+        if not self.target_file.exists():
+            raise FileNotFoundError("No existing schema file found.")
+
+        with open(self.target_file, 'r') as f:
+            self.schema_data = json.load(f)
+
+        errors = validate_schema(self.schema_data)
+        if errors:
+            print("Schema is not valid:")
+            for error in errors:
+                print(f"  - {error}")
+            sys.exit(1)
+
+        artifact = compile_artifact(self.schema_data)
+        template_name = self.target_file.stem
+        artifact_key = f"compiled/{template_name}.{artifact['hash'][:16]}.json"
+        pointer_key = f"{template_name}.pointer.json"
+        pointer = {"hash": artifact["hash"], "artifact": artifact_key, "compiled_at": artifact["compiled_at"]}
+
+        artifact_file = self.target_file.parent / artifact_key
+        artifact_file.parent.mkdir(parents=True, exist_ok=True)
+        artifact_file.write_text(minified(artifact))
+        pointer_file = self.target_file.parent / pointer_key
+        pointer_file.write_text(json.dumps(pointer, indent=2) + "\n")
+
+        print(f"Artifact written to: {artifact_file} ({artifact_file.stat().st_size:,} bytes)")
+        print(f"Pointer updated:     {pointer_file} -> {artifact['hash'][:16]}")
+        self._print_token_costs(artifact["token_costs"])
+
+        bucket = self._get_argument("--bucket")
+        if bucket:
+            self._publish_artifact(bucket, artifact_file, artifact_key, pointer_file, pointer_key)
+
+    def _handle_import_mode(self, source: Path):
+        """
+        Non-interactive import: stream a CSV/TSV or Parquet file (or read SQL DDL),
+        infer column types and distinct values in bounded memory, and merge them
+        into the existing template. Hand-written descriptions are kept.
+        """
+        from schema_import import profile_file, merge_into_schema, ddl_table_name, DEFAULT_VALUE_CAP, DEFAULT_CHUNK_ROWS
+
+        if not source.exists():
+            raise FileNotFoundError(f"Import file not found: {source}")
+
+        if self.target_file.exists():
+            with open(self.target_file, 'r') as f:
+                self.schema_data = json.load(f)
+
+        value_cap = int(self._get_argument("--value-cap") or DEFAULT_VALUE_CAP)
+        chunk_rows = int(self._get_argument("--chunk-rows") or DEFAULT_CHUNK_ROWS)
+        table_name = self._get_argument("--table")
+        if not table_name and source.suffix.lower() in (".sql", ".ddl"):
+            table_name = ddl_table_name(source.read_text())
+        table_name = table_name or source.stem
+
+        print(f"Importing {source} into table {table_name} (value cap {value_cap:,})...")
+        progress = lambda rows: print(f"  {rows:,} rows read", end="\r", flush=True)
+        ragged = {}
+        profiles = profile_file(source, value_cap=value_cap, chunk_rows=chunk_rows, progress=progress, ragged=ragged)
+        if not profiles:
+            raise ValueError(f"No columns found in {source}")
+        if ragged.get("short_rows") or ragged.get("long_rows"):
+            print(f"\nWarning: {ragged['short_rows']:,} rows shorter than the header (missing cells read as NULL), "
+                  f"{ragged['long_rows']:,} rows longer (extra cells ignored)")
+
+        report = merge_into_schema(self.schema_data, table_name, profiles)
+
+        print(f"\n{'column':<28} {'type':<14} {'nulls':>10} {'distinct':>10}  values")
+        for profile in profiles:
+            values = "free-form" if profile.free_form else ("listed" if profile.possible_values() else "-")
+            distinct = f"~{profile.distinct_count:,}" if profile.free_form else f"{profile.distinct_count:,}"
+            print(f"{profile.name:<28} {profile.data_type:<14} {profile.nulls:>10,} {distinct:>10}  {values}")
+
+        for label, key in (("Added", "added"), ("Free-form (above value cap)", "free_form"),
+                           ("Only NULLs in data (possible_values kept)", "all_null"),
+                           ("Inferred type differs (template type kept)", "type_differs"),
+                           ("In template but not in data (kept)", "not_in_data"), ("Need a description", "needs_description")):
+            if report[key]:
+                print(f"\n{label}:")
+                for name in report[key]:
+                    print(f"  - {name}")
+
+        with open(self.target_file, 'w') as f:
+            json.dump(self.schema_data, f, indent=2)
+        print(f"\nSchema saved to: {self.target_file}")
+
+        pointer_file = self.target_file.parent / f"{self.target_file.stem}.pointer.json"
+        if pointer_file.exists():
+            if report["needs_description"]:
+                print("Not recompiling the artifact until the missing descriptions are written (--edit).")
+            else:
+                print("A compiled artifact exists for this schema, recompiling...")
+                self._handle_compile_mode()
+
+    def _print_token_costs(self, costs: Dict[str, Any]):
+        """Print the approximate prompt token cost per format, table and most expensive columns."""
+        print("\nApproximate prompt tokens per format (inline / lookup):")
+        for format, tokens in costs["formats"]["inline"].items():
+            print(f"  {format:<10} {tokens:>7,} / {costs['formats']['lookup'][format]:>6,}")
+
+        for table_name, table in costs["tables"].items():
+            print(f"\nTable {table_name}: ~{table['total']:,} tokens (description ~{table['description']:,})")
+            ranked = sorted(table["columns"].items(), key=lambda item: item[1]["total"], reverse=True)
+            for column_name, column in ranked[:10]:
+                print(f"  {column_name:<28} ~{column['total']:>6,} tokens ({column['values']:,} in possible_values)")
+
+    def _publish_artifact(self, bucket: str, artifact_file: Path, artifact_key: str, pointer_file: Path, pointer_key: str):
+        """Upload the artifact first, then the pointer, so the Lambda never follows a pointer to a missing artifact."""
+        import boto3
+
+        s3 = boto3.client("s3")
+        s3.upload_file(str(artifact_file), bucket, artifact_key, ExtraArgs={"ContentType": "application/json"})
+        s3.upload_file(str(pointer_file), bucket, pointer_key, ExtraArgs={"ContentType": "application/json"})
+        print(f"\nPublished to s3://{bucket}/{artifact_key} and s3://{bucket}/{pointer_key}")
+
+    def _get_argument(self, flag: str) -> Optional[str]:
+        """Return the value following a command-line flag, if present."""
+        if flag in sys.argv:
+            position = sys.argv.index(flag)
+            if position + 1 < len(sys.argv):
+                return sys.argv[position + 1]
+        return None
+
     def _handle_create_mode(self):
         """Handle creating new schema file."""
         if self.target_file.exists():
@@ -505,6 +652,12 @@ class SchemaManager:
         with open(self.target_file, 'w') as f:
             json.dump(self.schema_data, f, indent=2)
         print(f"\nSchema saved to: {self.target_file}")
+
+        # Keep a published artifact in step with the template it was compiled from
+        pointer_file = self.target_file.parent / f"{self.target_file.stem}.pointer.json"
+        if pointer_file.exists():
+            print("A compiled artifact exists for this schema, recompiling...")
+            self._handle_compile_mode()
     
     def _print_final_summary(self):
         """Print a summary of modified tables for easy copy/paste."""
@@ -0,0 +1,218 @@
+"""
+Simulated AWS - Stand-ins for the orchestration Lambda's AWS clients
+
+Bedrock, the knowledge base, API Gateway and S3 replaced by in-process objects
+that answer like the real services after a configurable latency. Waiting is a
+sleep, which releases the GIL as network I/O does, so concurrency behaves as it
+would against AWS. Used by benchmarks and offline tools that run the whole
+pipeline without credentials.
+
+Usage:
+    from lambda_env import setup_lambda_env
+    setup_lambda_env()
+    from simulated_aws import SimulatedAws
+    aws = SimulatedAws(scale=0.1).install()
+    orchestration.orchestrate(aws.event("How many students are at Tempe?"))
+"""
+
+import io
+import json
+import threading
+import time
+import uuid
+
+import botocore.exceptions
+
+import constants
+import schema_artifact
+import utilities
+from lambda_env import SCHEMA_FILE
+
+# Seconds per call at scale 1.0, roughly what the deployed stack sees
+LATENCY = {
+    "converse": 0.8,         # Non-streaming model call (classify, create_question)
+    "first_token": 0.5,      # converse_stream until the first token
+    "token": 0.02,           # Each further streamed token
+    "retrieve": 2.0,         # Knowledge base text-to-SQL retrieval
+    "post": 0.01,            # API Gateway post_to_connection
+    "s3": 0.02,              # S3 GET
+}
+
+ANSWER = ("There were **12,431** graduate students in the Ira A. Fulton Schools of Engineering in Fall 2022, "
+          "most of them on the Tempe campus.BREAK_TOKENYou could also ask how this compares with Fall 2021.")
+
+
+def input_tokens(request):
+    """Approximate input tokens of a converse request: its messages, system prompt and tools"""
+    prompt = {name: request.get(name) for name in ("messages", "system", "toolConfig")}
+    return schema_artifact.estimate_tokens(json.dumps(prompt, ensure_ascii=False))
+
+
+class Gone(Exception):
+    pass
+
+
+class SimulatedGateway:
+    """post_to_connection that records frames and when each connection's stream started and ended"""
+
+    class exceptions:
+        GoneException = Gone
+
+    def __init__(self, aws):
+        self.aws = aws
+        self.lock = threading.Lock()
+        self.frames = {}
+        self.first_token = {}
+        self.finished = {}
+
+    def post_to_connection(self, ConnectionId, Data):
+        self.aws.wait("post")
+        frame = json.loads(Data)
+        now = time.perf_counter()
+        with self.lock:
+            self.frames.setdefault(ConnectionId, []).append(frame)
+            if frame.get("type") == "contentBlockDelta":
+                self.first_token.setdefault(ConnectionId, now)
+            if frame.get("type") == "messageStop":
+                self.finished[ConnectionId] = now
+
+    def get_connection(self, ConnectionId):
+        return {}
+
+    def delete_connection(self, ConnectionId):
+        pass
+
+
+class SimulatedStream:
+    """A converse_stream event stream that produces tokens at the configured rate"""
+
+    def __init__(self, aws, text, prompt_tokens=0):
+        self.aws = aws
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.closed = False
+
+    def __iter__(self):
+        self.aws.wait("first_token")
+        yield {"messageStart": {"role": "assistant"}}
+        words = self.text.split(" ")
+        for position, word in enumerate(words):
+            if position:
+                self.aws.wait("token")
+            if self.closed:
+                return
+            yield {"contentBlockDelta": {"delta": {"text": word + (" " if position < len(words) - 1 else "")}, "contentBlockIndex": 0}}
+        yield {"contentBlockStop": {"contentBlockIndex": 0}}
+        yield {"messageStop": {"stopReason": "end_turn"}}
+        yield {"metadata": {"usage": {"inputTokens": self.prompt_tokens, "outputTokens": len(words),
+                                      "totalTokens": self.prompt_tokens + len(words)},
+                            "metrics": {"latencyMs": 0}}}
+
+    def close(self):
+        self.closed = True
+
+
+class SimulatedBedrock:
+    """converse answers the structured stages through their tools; converse_stream streams ANSWER"""
+
+    def __init__(self, aws):
+        self.aws = aws
+        self.calls = 0
+
+    def converse(self, **request):
+        self.aws.wait("converse")
+        self.calls += 1
+        # The answer tool follows lookup_values when a stage can look up schema values, so it is answered right away
+        tools = (request.get("toolConfig") or {}).get("tools") or [{}]
+        name = tools[-1].get("toolSpec", {}).get("name")
+        if name == "record_classification":
+            output = {"classification": "SQL_Query", "reasoning": "The user asks for a student count."}
+        else:
+            question = next(block["text"] for message in reversed(request["messages"]) for block in message["content"] if "text" in block)
+            output = {"improved_questions": [f'SUM "Students" for: {question}']}
+        prompt_tokens = input_tokens(request)
+        content = [{"toolUse": {"toolUseId": uuid.uuid4().hex, "name": name, "input": output}}] if name else [{"text": json.dumps(output)}]
+        return {
+            "output": {"message": {"role": "assistant", "content": content}},
+            "stopReason": "tool_use" if name else "end_turn",
+            "usage": {"inputTokens": prompt_tokens, "outputTokens": 60, "totalTokens": prompt_tokens + 60},
+        }
+
+    def converse_stream(self, **request):
+        self.calls += 1
+        return {"stream": SimulatedStream(self.aws, ANSWER, input_tokens(request))}
+
+
+class SimulatedAgent:
+    """
+    Knowledge base retrieve returning students per term and its SQL. There are
+    more rows than deterministic answers cover, so the answer is streamed by the model.
+    """
+
+    def __init__(self, aws):
+        self.aws = aws
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, **kwargs):
+        self.aws.wait("retrieve")
+        location = {"type": "SQL", "sqlLocation": {"query": 'SELECT "Term", SUM("Students") FROM asu_facts GROUP BY "Term"'}}
+        rows = [
+            [{"columnName": "Term", "columnValue": f"Fall {year}", "type": "STRING"},
+             {"columnName": "Students", "columnValue": str(11000 + 240 * (year - 2015)), "type": "LONG"}]
+            for year in range(2015, 2023)
+        ]
+        return {"retrievalResults": [{"content": {"type": "ROW", "row": row}, "location": location} for row in rows]}
+
+
+class SimulatedS3:
+    """The schema template published as a compiled artifact, so schema caches behave as deployed"""
+
+    def __init__(self, aws):
+        self.aws = aws
+        template = json.loads(SCHEMA_FILE.read_text())
+        artifact = schema_artifact.compile_artifact(template)
+        pointer = {"hash": artifact["hash"], "artifact": f"compiled/{artifact['hash']}.json"}
+        self.objects = {
+            constants.TEMPLATE_NAME + ".json": json.dumps(template).encode(),
+            constants.TEMPLATE_NAME + ".pointer.json": json.dumps(pointer).encode(),
+            pointer["artifact"]: json.dumps(artifact).encode(),
+        }
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        self.aws.wait("s3")
+        if Key not in self.objects:
+            raise botocore.exceptions.ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        etag = f'"{hash(self.objects[Key])}"'
+        if IfNoneMatch == etag:
+            raise botocore.exceptions.ClientError({"Error": {"Code": "304"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[Key]), "ETag": etag}
+
+
+class SimulatedAws:
+    """All simulated clients, with latencies multiplied by scale"""
+
+    def __init__(self, scale=1.0, latency=None):
+        self.latency = {name: seconds * scale for name, seconds in {**LATENCY, **(latency or {})}.items()}
+        self.gateway = SimulatedGateway(self)
+        self.bedrock = SimulatedBedrock(self)
+        self.agent = SimulatedAgent(self)
+        self.s3 = SimulatedS3(self)
+
+    def wait(self, call):
+        if self.latency[call]:
+            time.sleep(self.latency[call])
+
+    def install(self):
+        """Point the orchestration Lambda's clients (including budgeted ones) at the simulation"""
+        clients = {"bedrock-runtime": self.bedrock, "bedrock-agent-runtime": self.agent, "s3": self.s3}
+        utilities.gateway, utilities.bedrock, utilities.agent, utilities.s3_client = self.gateway, self.bedrock, self.agent, self.s3
+        utilities.get_budgeted_client = lambda service, read_timeout: clients[service]
+        return self
+
+    @staticmethod
+    def event(question, connection_id=None, history=()):
+        """A WebSocket sendMessage event for the question"""
+        messages = list(history) + [{"role": "user", "content": [{"text": question}]}]
+        return {
+            "requestContext": {"connectionId": connection_id or uuid.uuid4().hex, "routeKey": "sendMessage"},
+            "body": json.dumps({"action": "sendMessage", "messages": messages}),
+        }
@@ -5,6 +5,30 @@ import WelcomeScreen from './WelcomeScreen';
 import ActiveChatView from './ActiveChatView';
 import MessageInput from './MessageInput';
 import webSocketManager from '../Utilities/websocketManager';
+import { TABLE_HISTORY_ROWS } from '../Utilities/constants.jsx';
+
+// Conversation history for the backend: result tables are cut to their first rows and
+// folded into the answer that follows them, so follow-up questions still see the numbers
+const historyForBackend = (chatMessages) => {
+  const history = [];
+  let pendingTable = null;
+  for (const chatMessage of chatMessages) {
+    if (chatMessage.isTable) {
+      pendingTable = chatMessage.historyText;
+      continue;
+    }
+    if (pendingTable && chatMessage.role === 'assistant') {
+      history.push({ role: "assistant", content: [{ text: `${pendingTable}\n\n${chatMessage.content[0].text}` }] });
+    } else {
+      if (pendingTable) {
+        history.push({ role: "assistant", content: [{ text: pendingTable }] });
+      }
+      history.push(chatMessage);
+    }
+    pendingTable = null;
+  }
+  return history;
+};
 
 const ChatContainer = () => {
   const [messages, setMessages] = useState([]);
@@ -109,6 +133,28 @@ const ChatContainer = () => {
         setCurrentInfoMessage(infoMessage);
       };
 
+      // Define callback for result tables, shown above the answer that is still streaming
+      const onDataReceived = (table) => {
+        const header = `| ${table.columns.join(' | ')} |\n|${'---|'.repeat(table.columns.length)}`;
+        const rows = table.rows.map(row => `| ${row.map(value => value === null ? '' : value.toLocaleString()).join(' | ')} |`);
+        const note = table.truncated ? `\n\n_Showing ${table.rows.length} of ${table.totalRows} rows._` : '';
+        const omitted = table.totalRows - Math.min(table.rows.length, TABLE_HISTORY_ROWS);
+        const historyNote = omitted > 0 ? `\n(${omitted} more rows not shown)` : '';
+        // Flagged as a table so the history sent to the backend carries only its first rows
+        const tableMessage = {
+          role: "assistant",
+          isTable: true,
+          historyText: `${header}\n${rows.slice(0, TABLE_HISTORY_ROWS).join('\n')}${historyNote}`,
+          content: [
+            {
+              text: `${header}\n${rows.join('\n')}${note}`
+            }
+          ]
+        };
+
+        setMessages(prevMessages => [...prevMessages.slice(0, -1), tableMessage, prevMessages[prevMessages.length - 1]]);
+      };
+
       // Define callback for when message is complete
       const onMessageComplete = () => {
         console.log('Message fully received, re-enabling input');
@@ -116,12 +162,14 @@ const ChatContainer = () => {
       };
 
       // WebSocket call with all callbacks
+      // Result tables reach the backend shortened, inside the answer they belong to
       await webSocketManager.sendMessageAndWaitForResponse(
         message,
-        newMessages,
+        historyForBackend(newMessages),
         onBotMessageReceived,
         onInfoReceived,
-        onMessageComplete
+        onMessageComplete,
+        onDataReceived
       );
     } catch (error) {
       console.error('Failed to send message:', error);
@@ -141,6 +189,22 @@ const ChatContainer = () => {
     }
   };
 
+  // Stop the answer being generated - the backend stops when the connection closes
+  const handleStop = () => {
+    webSocketManager.cancel();
+    // Remove the placeholder if no answer text arrived yet
+    setMessages(prevMessages => {
+      const lastMessage = prevMessages[prevMessages.length - 1];
+      if (lastMessage?.role === 'assistant' && lastMessage?.content[0]?.text === '') {
+        return prevMessages.slice(0, -1);
+      }
+      return prevMessages;
+    });
+    setIsStreaming(false);
+    setIsInputDisabled(false);
+    setCurrentInfoMessage(null);
+  };
+
   return (
     <Box
       sx={{
@@ -205,6 +269,7 @@ const ChatContainer = () => {
           {/* Input Section - Always visible */}
           <MessageInput 
             onSendMessage={handleSendMessage} 
+            onStop={handleStop}
             disabled={isInputDisabled}
             isResponding={isStreaming}        
           />
@@ -1,8 +1,8 @@
 import React, { useState } from 'react';
 import { Box, TextField, IconButton, InputAdornment } from '@mui/material';
-import { Send, Refresh } from '@mui/icons-material';
+import { Send, Refresh, Stop } from '@mui/icons-material';
 
-const MessageInput = ({ onSendMessage, disabled = false, infoMessage = null, isResponding = false }) => {
+const MessageInput = ({ onSendMessage, onStop = null, disabled = false, infoMessage = null, isResponding = false }) => {
   const [inputText, setInputText] = useState('');
   const [isDisabled, setIsDisabled] = useState(false);
   
@@ -93,25 +93,42 @@ const MessageInput = ({ onSendMessage, disabled = false, infoMessage = null, isR
         InputProps={{
           endAdornment: (
             <InputAdornment position="end">
-              <IconButton
-                onClick={handleSend}
-                disabled={isInputDisabled || !inputText.trim()}
-                sx={{
-                  backgroundColor: 'transparent',
-                  color: 'grey.700', // Changed to dark grey for rest state
-                  '&:hover': {
-                    backgroundColor: 'grey.200',
-                    color: 'grey.800' // Slightly darker on hover
-                  },
-                  '&.Mui-disabled': {
+              {disabled && onStop ? (
+                <IconButton
+                  onClick={onStop}
+                  sx={{
                     backgroundColor: 'transparent',
-                    color: 'grey.700'
-                  }
-                }}
-                aria-label="Send message"
-              >
-                <Send />
-              </IconButton>
+                    color: 'grey.700',
+                    '&:hover': {
+                      backgroundColor: 'grey.200',
+                      color: 'grey.800'
+                    }
+                  }}
+                  aria-label="Stop response"
+                >
+                  <Stop />
+                </IconButton>
+              ) : (
+                <IconButton
+                  onClick={handleSend}
+                  disabled={isInputDisabled || !inputText.trim()}
+                  sx={{
+                    backgroundColor: 'transparent',
+                    color: 'grey.700', // Changed to dark grey for rest state
+                    '&:hover': {
+                      backgroundColor: 'grey.200',
+                      color: 'grey.800' // Slightly darker on hover
+                    },
+                    '&.Mui-disabled': {
+                      backgroundColor: 'transparent',
+                      color: 'grey.700'
+                    }
+                  }}
+                  aria-label="Send message"
+                >
+                  <Send />
+                </IconButton>
+              )}
             </InputAdornment>
           )
         }}
@@ -1,3 +1,4 @@
 
 
 export const WEBSOCKET_API = "REPLACE_TOKEN"; // URL for the WebSocket API endpoint NOTE: this doesn't include the route, eg sendMessage
+export const TABLE_HISTORY_ROWS = 10; // Rows of each result table kept in the conversation history sent to the backend
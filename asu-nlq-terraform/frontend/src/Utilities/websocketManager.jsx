@@ -8,6 +8,8 @@ class WebSocketManager {
     this.messageCallback = null;
     this.infoCallback = null; // For temporary info messages
     this.completionCallback = null; // NEW: For when message is complete
+    this.dataCallback = null; // For result tables sent ahead of the prose answer
+    this.dataChunks = []; // Row chunks of the result table being received
     this.currentMessage = ''; // Track the current streaming message
     this.hasContent = false; // Track if current message has content for break token validation
     this.shouldCreateNewMessage = false; // Track if next delta should create new message
@@ -126,6 +128,25 @@ class WebSocketManager {
       
       this.close();
     }
+    else if (data.type === 'data') {
+      // Result rows arrive in one or more chunks before the prose answer
+      this.dataChunks[data.data.chunk] = data.data.rows;
+      const received = this.dataChunks.filter(Boolean).length;
+
+      if (received === data.data.chunks) {
+        const table = {
+          columns: data.data.columns,
+          types: data.data.types,
+          rows: this.dataChunks.flat(),
+          totalRows: data.data.totalRows,
+          truncated: data.data.truncated
+        };
+        this.dataChunks = [];
+        if (this.dataCallback) {
+          this.dataCallback(table);
+        }
+      }
+    }
     else if (data.type === 'info') {
       // Handle info messages (not streaming, just status updates)
       if (this.infoCallback) {
@@ -172,6 +193,19 @@ class WebSocketManager {
     });
   }
 
+  // Cancel the in-flight answer - the backend closes the connection and stops generating
+  cancel() {
+    if (this.ws && this.isConnected) {
+      try {
+        this.ws.send(JSON.stringify({ action: 'cancel' }));
+        console.log('Cancel request sent');
+      } catch (error) {
+        console.error('Error sending cancel request:', error);
+      }
+    }
+    this.close();
+  }
+
   // Close WebSocket connection
   close() {
     if (this.ws && this.isConnected) {
@@ -184,6 +218,8 @@ class WebSocketManager {
     this.shouldCreateNewMessage = false;
     this.infoCallback = null; // Clear info callback
     this.completionCallback = null; // NEW: Clear completion callback
+    this.dataCallback = null; // Clear data callback
+    this.dataChunks = [];
   }
 
   // Get connection status
@@ -194,11 +230,12 @@ class WebSocketManager {
   }
 
   // Complete send message workflow (connect -> send -> wait for response -> close on messageStop)
-  async sendMessageAndWaitForResponse(message, messages, onMessageReceived, onInfoReceived = null, onMessageComplete = null) {
+  async sendMessageAndWaitForResponse(message, messages, onMessageReceived, onInfoReceived = null, onMessageComplete = null, onDataReceived = null) {
     try {
       this.messageCallback = onMessageReceived;
       this.infoCallback = onInfoReceived;
       this.completionCallback = onMessageComplete; // NEW: Store completion callback
+      this.dataCallback = onDataReceived;
       await this.connect();
       await this.sendMessage(message, messages);
       // Connection will be closed automatically when messageStop is received
@@ -0,0 +1,46 @@
+import json
+import logging
+import constants  # This configures logging
+
+logger = logging.getLogger(__name__)
+
+# Same JSON backend selection as the orchestration Lambda's codec module:
+# orjson or msgspec when packaged with the Lambda, otherwise the standard library.
+
+
+def _load_backend(requested):
+    """Import the requested JSON backend, or the fastest available one for "auto" """
+    candidates = ("orjson", "msgspec", "json") if requested == "auto" else (requested,)
+    for name in candidates:
+        try:
+            if name == "orjson":
+                import orjson
+                return name, orjson
+            if name == "msgspec":
+                import msgspec
+                return name, msgspec
+            if name == "json":
+                return name, json
+        except ImportError:
+            if requested != "auto":
+                logger.warning(f"JSON codec {name} is not installed, using json")
+    return "json", json
+
+
+BACKEND, _module = _load_backend(constants.JSON_CODEC)
+
+
+def dumps_bytes(value):
+    """Compact UTF-8 JSON of a value"""
+    if BACKEND == "orjson":
+        return _module.dumps(value, default=str)
+    if BACKEND == "msgspec":
+        return _module.json.encode(value, enc_hook=str, decimal_format="number")
+    return json.dumps(value, default=str, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data):
+    """Parse JSON from str or bytes"""
+    if BACKEND == "msgspec":
+        return _module.json.decode(data)
+    return _module.loads(data)
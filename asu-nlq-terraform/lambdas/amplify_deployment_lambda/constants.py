@@ -24,6 +24,10 @@ def setup_logging():
 # Call setup when constants is imported
 setup_logging()
 
+# JSON codec: "auto" uses orjson or msgspec when packaged with the Lambda, else the
+# standard library; "orjson", "msgspec" or "json" pins one
+JSON_CODEC = os.environ.get("JSON_CODEC", "auto")
+
 # ============================================================================
 # CLOUDFORMATION RESPONSE CONSTANTS
 # ============================================================================
@@ -42,7 +46,8 @@ RESPONSE_MESSAGES = {
     "ZIP_EXTRACTION_ERROR": "Error extracting zip file from S3 bucket",
     "APP_ID_SAVE_ERROR": "Error saving app ID to S3",
     "APP_ID_RETRIEVE_ERROR": "Error retrieving app ID from S3",
-    "APP_ID_FILE_NOT_FOUND": "App ID file not found in S3"
+    "APP_ID_FILE_NOT_FOUND": "App ID file not found in S3",
+    "BUNDLE_UNCHANGED": "Update completed, frontend bundle unchanged so no deployment was started"
 }
 
 # ============================================================================
@@ -103,6 +108,26 @@ AMPLIFY_DEPLOYMENT_CONFIG = {
     "sourceUrlType": "BUCKET_PREFIX"
 }
 
+# Deployment mode:
+#   "s3_prefix"  - extract build.zip into the bucket and deploy the prefix (one S3 PUT per file)
+#   "zip_upload" - upload build.zip itself to Amplify (create_deployment, PUT to the
+#                  presigned URL, start_deployment with the jobId); nothing is extracted
+AMPLIFY_DEPLOYMENT_MODES = ("s3_prefix", "zip_upload")
+AMPLIFY_DEPLOYMENT_MODE = os.environ.get("AMPLIFY_DEPLOYMENT_MODE", "s3_prefix")
+if AMPLIFY_DEPLOYMENT_MODE not in AMPLIFY_DEPLOYMENT_MODES:
+    raise ValueError(f"AMPLIFY_DEPLOYMENT_MODE must be one of {AMPLIFY_DEPLOYMENT_MODES}")
+
+# Deployment job polling: seconds before the first status check, growth per check and cap
+AMPLIFY_JOB_POLL_INITIAL_DELAY = 2
+AMPLIFY_JOB_POLL_BACKOFF = 1.5
+AMPLIFY_JOB_POLL_MAX_DELAY = 10
+
+# Seconds of Lambda time kept for responding to CloudFormation when polling stops
+AMPLIFY_JOB_POLL_TIME_MARGIN = 5
+
+# Final deployment job statuses
+AMPLIFY_JOB_FINAL_STATUSES = ("SUCCEED", "FAILED", "CANCELLED")
+
 # ============================================================================
 # S3 CONFIGURATION CONSTANTS
 # ============================================================================
@@ -112,6 +137,50 @@ DEFAULT_ZIP_FILE = "build.zip"
 # S3 batch delete limit (AWS maximum)
 S3_DELETE_BATCH_SIZE = 1000
 
+# Zips up to this size are read into memory with one GET; larger ones are read with ranged GETs
+ZIP_SPOOL_THRESHOLD = 32 * 1024 * 1024
+
+# Bytes fetched per ranged GET when reading a zip larger than the spool threshold
+ZIP_RANGE_READ_SIZE = 8 * 1024 * 1024
+
+# Concurrent uploads of extracted files, and extracted files held in memory awaiting upload
+S3_UPLOAD_MAX_WORKERS = 16
+S3_UPLOAD_MAX_IN_FLIGHT = 32
+
+# Concurrent batch delete requests
+S3_DELETE_MAX_WORKERS = 8
+
+# Connection pool size of the S3 client, enough for every upload worker
+S3_MAX_POOL_CONNECTIONS = S3_UPLOAD_MAX_WORKERS + 4
+
+# Content-Type of uploaded frontend files by extension (anything else is guessed by mimetypes)
+CONTENT_TYPES = {
+    ".html": "text/html",
+    ".js": "application/javascript",
+    ".mjs": "application/javascript",
+    ".css": "text/css",
+    ".json": "application/json",
+    ".map": "application/json",
+    ".webmanifest": "application/manifest+json",
+    ".txt": "text/plain",
+    ".svg": "image/svg+xml",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".ico": "image/x-icon",
+    ".woff": "font/woff",
+    ".woff2": "font/woff2",
+    ".ttf": "font/ttf",
+}
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
 # App ID storage configuration
 APP_ID_FILE_NAME = "amplify-app-id.txt"
-APP_ID_FILE_KEY = f"{FRONTEND_FOLDER_NAME.rstrip('/')}/{APP_ID_FILE_NAME}"
\ No newline at end of file
+APP_ID_FILE_KEY = f"{FRONTEND_FOLDER_NAME.rstrip('/')}/{APP_ID_FILE_NAME}"
+
+# Deploy manifest: content hash of every deployed file and of the whole bundle,
+# used to upload only changed files and to skip unchanged deployments
+DEPLOY_MANIFEST_FILE_NAME = "deploy-manifest.json"
+DEPLOY_MANIFEST_FILE_KEY = f"{FRONTEND_FOLDER_NAME.rstrip('/')}/{DEPLOY_MANIFEST_FILE_NAME}"
@@ -1,23 +1,33 @@
-import json
 import urllib3
 import boto3
 import os
-import zipfile
-import tempfile
+import time
+import hashlib
+import mimetypes
+import threading
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from constants import (
     CFN_SUCCESS, CFN_FAILED, RESPONSE_MESSAGES, AMPLIFY_APP_NAME,
     FRONTEND_BUCKET_NAME, FRONTEND_FOLDER_NAME, AMPLIFY_APP_CONFIG,
     AMPLIFY_CUSTOM_RULES, AMPLIFY_BRANCH_CONFIG, AMPLIFY_DEPLOYMENT_CONFIG,
-    DEFAULT_ZIP_FILE, S3_DELETE_BATCH_SIZE, APP_ID_FILE_NAME, APP_ID_FILE_KEY
+    DEFAULT_ZIP_FILE, S3_DELETE_BATCH_SIZE, APP_ID_FILE_NAME, APP_ID_FILE_KEY,
+    S3_UPLOAD_MAX_WORKERS, S3_UPLOAD_MAX_IN_FLIGHT, S3_DELETE_MAX_WORKERS,
+    S3_MAX_POOL_CONNECTIONS, CONTENT_TYPES, DEFAULT_CONTENT_TYPE,
+    DEPLOY_MANIFEST_FILE_KEY, AMPLIFY_DEPLOYMENT_MODE, AMPLIFY_JOB_POLL_INITIAL_DELAY,
+    AMPLIFY_JOB_POLL_BACKOFF, AMPLIFY_JOB_POLL_MAX_DELAY, AMPLIFY_JOB_POLL_TIME_MARGIN,
+    AMPLIFY_JOB_FINAL_STATUSES
 )
+from zip_stream import open_s3_zip, member_key
+from codec import dumps_bytes, loads
 
 logger = logging.getLogger(__name__)
 
 # Initialize AWS clients and HTTP pool manager
 http = urllib3.PoolManager()
 amplify = boto3.client('amplify')
-s3_client = boto3.client('s3')
+s3_client = boto3.client('s3', config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS))
 
 
 def handle_create_request(event, context):
@@ -25,7 +35,7 @@ def handle_create_request(event, context):
     Handle CloudFormation Create request for Amplify app deployment.
     
     Orchestrates the complete create workflow:
-    1. Extract and deploy frontend files from S3
+    1. Prepare the frontend bundle (extract files to S3 in s3_prefix mode)
     2. Create Amplify app and production branch
     3. Start initial deployment
     
@@ -39,11 +49,11 @@ def handle_create_request(event, context):
     logger.info("Starting Create request handling")
     
     try:
-        # Stage 1: Extract and deploy frontend files
-        logger.info("Extracting frontend files from S3")
-        extract_response = extract_and_deploy_s3_zip(FRONTEND_BUCKET_NAME, DEFAULT_ZIP_FILE)
+        # Stage 1: Prepare the frontend bundle
+        logger.info(f"Preparing frontend bundle from S3 ({AMPLIFY_DEPLOYMENT_MODE} mode)")
+        extract_response = prepare_frontend_bundle(FRONTEND_BUCKET_NAME, DEFAULT_ZIP_FILE)
         if extract_response['success']:
-            logger.info(f"Successfully extracted {len(extract_response['uploaded_files'])} files")
+            logger.info(extract_response['message'])
         else:
             logger.error("Failed to extract S3 zip file")
             send_cfn_response(event, context, CFN_SUCCESS, 
@@ -73,8 +83,10 @@ def handle_create_request(event, context):
         
         # Stage 3: Start deployment
         logger.info("Starting Amplify deployment")
-        deployment_response = deploy_to_amplify(app_id, branch_name)
-        if not deployment_response['success']:
+        deployment_response = start_frontend_deployment(app_id, branch_name, context)
+        if deployment_response['success']:
+            save_deploy_manifest(extract_response['manifest'])
+        else:
             logger.warning(f"Deployment start failed: {deployment_response['message']}")
         
         logger.info("Create request completed successfully")
@@ -91,8 +103,8 @@ def handle_update_request(event, context):
     Handle CloudFormation Update request for Amplify app deployment.
     
     Updates existing deployment:
-    1. Extract and deploy new frontend files
-    2. Start deployment to existing Amplify app
+    1. Prepare the bundle (in s3_prefix mode, upload new or changed files and delete stale ones)
+    2. Start deployment to existing Amplify app, unless the bundle is unchanged
     
     Args:
         event: CloudFormation event data
@@ -104,15 +116,21 @@ def handle_update_request(event, context):
     logger.info("Starting Update request handling")
     
     try:
-        # Stage 1: Extract and deploy new frontend files
-        logger.info("Extracting updated frontend files from S3")
-        extract_response = extract_and_deploy_s3_zip(FRONTEND_BUCKET_NAME, DEFAULT_ZIP_FILE)
+        # Stage 1: Prepare the updated frontend bundle
+        logger.info(f"Preparing updated frontend bundle from S3 ({AMPLIFY_DEPLOYMENT_MODE} mode)")
+        extract_response = prepare_frontend_bundle(FRONTEND_BUCKET_NAME, DEFAULT_ZIP_FILE)
         if not extract_response['success']:
             logger.error("Failed to extract S3 zip file")
             send_cfn_response(event, context, CFN_SUCCESS, 
                             {"Message": RESPONSE_MESSAGES["ZIP_EXTRACTION_ERROR"]})
             return
         
+        if not extract_response['changed']:
+            logger.info(f"Frontend bundle {extract_response['bundle_hash'][:12]} unchanged, skipping deployment")
+            send_cfn_response(event, context, CFN_SUCCESS, 
+                            {"Message": RESPONSE_MESSAGES["BUNDLE_UNCHANGED"]})
+            return
+        
         # Stage 2: Get existing app ID from S3
         logger.info("Retrieving existing Amplify app ID from S3")
         app_id = retrieve_app_id_from_s3()
@@ -124,8 +142,10 @@ def handle_update_request(event, context):
         
         # Stage 3: Start deployment to existing app
         logger.info("Starting deployment to existing Amplify app")
-        deployment_response = deploy_to_amplify(app_id, AMPLIFY_BRANCH_CONFIG['branchName'])
-        if not deployment_response['success']:
+        deployment_response = start_frontend_deployment(app_id, AMPLIFY_BRANCH_CONFIG['branchName'], context)
+        if deployment_response['success']:
+            save_deploy_manifest(extract_response['manifest'])
+        else:
             logger.warning(f"Deployment update failed: {deployment_response['message']}")
         
         logger.info("Update request completed successfully")
@@ -239,6 +259,43 @@ def create_amplify_app_and_branch():
         return {"success": False, "message": error_msg}
 
 
+def prepare_frontend_bundle(bucket_name, zip_key):
+    """
+    Prepare the frontend bundle for deployment in the configured mode.
+    
+    In s3_prefix mode the zip is extracted into the bucket; in zip_upload
+    mode the zip is deployed as-is, so only its hash is checked here.
+    
+    Args:
+        bucket_name (str): S3 bucket name
+        zip_key (str): S3 key of the zip file
+        
+    Returns:
+        dict: Response with success status, whether the bundle changed, its
+              hash and the manifest to save once the deployment has started
+    """
+    if AMPLIFY_DEPLOYMENT_MODE == "zip_upload":
+        return check_zip_bundle(bucket_name, zip_key)
+    return extract_and_deploy_s3_zip(bucket_name, zip_key)
+
+
+def start_frontend_deployment(app_id, branch_name, context):
+    """
+    Start the Amplify deployment in the configured mode.
+    
+    Args:
+        app_id (str): Amplify application ID
+        branch_name (str): Target branch name
+        context: Lambda context object, used to bound job polling
+        
+    Returns:
+        dict: Response with success status and message
+    """
+    if AMPLIFY_DEPLOYMENT_MODE == "zip_upload":
+        return deploy_zip_to_amplify(app_id, branch_name, FRONTEND_BUCKET_NAME, DEFAULT_ZIP_FILE, context)
+    return deploy_to_amplify(app_id, branch_name)
+
+
 def deploy_to_amplify(app_id, branch_name):
     """
     Start deployment to Amplify app from S3 source.
@@ -276,6 +333,164 @@ def deploy_to_amplify(app_id, branch_name):
         return {"success": False, "message": error_msg}
 
 
+def check_zip_bundle(bucket_name, zip_key):
+    """
+    Compare the zip with the last deployed one, for zip_upload mode.
+    
+    The bundle hash is the zip's ETag, so any rebuilt zip counts as changed.
+    
+    Args:
+        bucket_name (str): S3 bucket name
+        zip_key (str): S3 key of the zip file
+        
+    Returns:
+        dict: Response in the shape of extract_and_deploy_s3_zip
+    """
+    logger.info(f"Checking zip file {zip_key} in bucket {bucket_name}")
+    
+    try:
+        head = s3_client.head_object(Bucket=bucket_name, Key=zip_key)
+        bundle_hash = head['ETag'].strip('"')
+        manifest = load_deploy_manifest()
+        changed = not manifest or manifest.get('mode') != "zip_upload" or manifest.get('bundle_hash') != bundle_hash
+        
+        return {
+            'success': True,
+            'message': f"Zip file {zip_key} ({head['ContentLength']:,} bytes) {'changed' if changed else 'unchanged'}",
+            'uploaded_files': [],
+            'deleted_files': [],
+            'bundle_hash': bundle_hash,
+            'changed': changed,
+            'manifest': {
+                'mode': "zip_upload",
+                'bundle_hash': bundle_hash,
+                'zip_etag': head['ETag']
+            }
+        }
+        
+    except Exception as e:
+        error_msg = f"Error checking zip file: {str(e)}"
+        logger.error(error_msg)
+        return {'success': False, 'message': error_msg}
+
+
+def deploy_zip_to_amplify(app_id, branch_name, bucket_name, zip_key, context):
+    """
+    Deploy the zip straight to Amplify without extracting it.
+    
+    Creates a manual deployment, streams the zip from S3 to the presigned
+    upload URL, starts the deployment with its jobId and polls the job with
+    backoff until it finishes or the Lambda is about to run out of time.
+    
+    Args:
+        app_id (str): Amplify application ID
+        branch_name (str): Target branch name
+        bucket_name (str): S3 bucket name
+        zip_key (str): S3 key of the zip file
+        context: Lambda context object, used to bound job polling
+        
+    Returns:
+        dict: Response with success status, message, job ID, final or last
+              seen job status and durations in seconds
+    """
+    logger.info(f"Starting zip deployment for app {app_id}, branch {branch_name}")
+    start = time.monotonic()
+    
+    try:
+        deployment = amplify.create_deployment(appId=app_id, branchName=branch_name)
+        job_id = deployment['jobId']
+        
+        upload_zip_to_url(bucket_name, zip_key, deployment['zipUploadUrl'])
+        upload_seconds = time.monotonic() - start
+        
+        amplify.start_deployment(appId=app_id, branchName=branch_name, jobId=job_id)
+        logger.info(f"Deployment job {job_id} started after {upload_seconds:.1f}s upload")
+        
+        status = wait_for_amplify_job(app_id, branch_name, job_id, context)
+        total_seconds = time.monotonic() - start
+        
+        if status in ("FAILED", "CANCELLED"):
+            error_msg = f"Deployment job {job_id} {status} after {total_seconds:.1f}s"
+            logger.error(error_msg)
+            return {"success": False, "message": error_msg, "job_id": job_id, "status": status}
+        
+        logger.info(f"Deployment job {job_id} {status} after {total_seconds:.1f}s (upload {upload_seconds:.1f}s)")
+        return {
+            "success": True,
+            "message": f"Deployment job {job_id} {status} after {total_seconds:.1f}s",
+            "job_id": job_id,
+            "status": status,
+            "upload_seconds": upload_seconds,
+            "total_seconds": total_seconds
+        }
+        
+    except Exception as e:
+        error_msg = f"Error deploying zip to Amplify: {str(e)}"
+        logger.error(error_msg)
+        return {"success": False, "message": error_msg}
+
+
+def upload_zip_to_url(bucket_name, zip_key, upload_url):
+    """
+    Stream a zip from S3 to a presigned upload URL.
+    
+    The S3 response body is passed to urllib3 as a file object, so the zip is
+    sent in blocks as it is read and never held whole in memory or on disk.
+    
+    Args:
+        bucket_name (str): S3 bucket name
+        zip_key (str): S3 key of the zip file
+        upload_url (str): Presigned URL returned by create_deployment
+    """
+    source = s3_client.get_object(Bucket=bucket_name, Key=zip_key)
+    size = source['ContentLength']
+    logger.info(f"Uploading {zip_key} ({size:,} bytes) to Amplify")
+    
+    # A partly read body cannot be sent again, so failures are not retried here
+    response = http.request(
+        'PUT',
+        upload_url,
+        body=source['Body'],
+        headers={'Content-Type': 'application/zip', 'Content-Length': str(size)},
+        retries=False
+    )
+    if response.status >= 300:
+        raise RuntimeError(f"Zip upload failed with HTTP {response.status}: {response.data[:200]!r}")
+
+
+def wait_for_amplify_job(app_id, branch_name, job_id, context):
+    """
+    Poll a deployment job with exponential backoff.
+    
+    Stops at a final status, or while the job is still running when the next
+    wait would leave less than AMPLIFY_JOB_POLL_TIME_MARGIN seconds of Lambda
+    time for the CloudFormation response.
+    
+    Args:
+        app_id (str): Amplify application ID
+        branch_name (str): Branch name
+        job_id (str): Deployment job ID
+        context: Lambda context object (None polls until a final status)
+        
+    Returns:
+        str: Final or last seen job status
+    """
+    delay = AMPLIFY_JOB_POLL_INITIAL_DELAY
+    while True:
+        job = amplify.get_job(appId=app_id, branchName=branch_name, jobId=job_id)
+        status = job['job']['summary']['status']
+        if status in AMPLIFY_JOB_FINAL_STATUSES:
+            return status
+        
+        if context and context.get_remaining_time_in_millis() / 1000 - AMPLIFY_JOB_POLL_TIME_MARGIN < delay:
+            logger.info(f"Deployment job {job_id} still {status}, not waiting any longer")
+            return status
+        
+        logger.debug(f"Deployment job {job_id} {status}, checking again in {delay:.1f}s")
+        time.sleep(delay)
+        delay = min(delay * AMPLIFY_JOB_POLL_BACKOFF, AMPLIFY_JOB_POLL_MAX_DELAY)
+
+
 def delete_amplify_app(app_id):
     """
     Delete Amplify app and all associated resources.
@@ -388,19 +603,72 @@ def delete_app_id_file_from_s3():
         return {"success": False, "message": error_msg}
 
 
+def load_deploy_manifest():
+    """
+    Retrieve the manifest of the last deployed frontend bundle from S3.
+    
+    Returns:
+        dict: The manifest if found, None otherwise
+    """
+    try:
+        response = s3_client.get_object(Bucket=FRONTEND_BUCKET_NAME, Key=DEPLOY_MANIFEST_FILE_KEY)
+        return loads(response['Body'].read())
+        
+    except s3_client.exceptions.NoSuchKey:
+        logger.info("No deploy manifest found, comparing against S3 ETags")
+        return None
+    except Exception as e:
+        logger.warning(f"Error retrieving deploy manifest, comparing against S3 ETags: {str(e)}")
+        return None
+
+
+def save_deploy_manifest(manifest):
+    """
+    Save the manifest of the deployed frontend bundle to S3.
+    
+    Saved only after the Amplify deployment has started, so a failed
+    deployment is retried on the next update even if no file changed.
+    
+    Args:
+        manifest (dict): Manifest returned by extract_and_deploy_s3_zip
+        
+    Returns:
+        dict: Response with success status and message
+    """
+    try:
+        s3_client.put_object(
+            Bucket=FRONTEND_BUCKET_NAME,
+            Key=DEPLOY_MANIFEST_FILE_KEY,
+            Body=dumps_bytes(manifest),
+            ContentType='application/json'
+        )
+        logger.info(f"Deploy manifest saved for bundle {manifest['bundle_hash'][:12]}")
+        return {"success": True, "message": "Deploy manifest saved to S3 successfully"}
+        
+    except Exception as e:
+        error_msg = f"Error saving deploy manifest to S3: {str(e)}"
+        logger.error(error_msg)
+        return {"success": False, "message": error_msg}
+
+
 def extract_and_deploy_s3_zip(bucket_name, zip_key):
     """
-    Extract zip file from S3 and upload contents back to S3.
+    Extract zip file from S3 and upload changed contents back to S3.
     
-    Downloads zip file, extracts contents, cleans up old files,
-    and uploads new files to the same S3 bucket.
+    Streams the zip straight from S3 (see zip_stream.open_s3_zip) and hashes
+    every member. Only files whose MD5 differs from the deploy manifest (or,
+    without a manifest, from the S3 ETag) are uploaded, from a bounded thread
+    pool while the next members are being read; files no longer in the zip
+    are deleted. When the zip's ETag matches the manifest nothing is read.
     
     Args:
         bucket_name (str): S3 bucket name
         zip_key (str): S3 key of the zip file to extract
         
     Returns:
-        dict: Response with success status, file count, and details
+        dict: Response with success status, uploaded and deleted files, the
+              bundle hash, whether it changed since the last deployment, and
+              the manifest to save once the deployment has started
     """
     logger.info(f"Extracting zip file {zip_key} from bucket {bucket_name}")
     
@@ -408,49 +676,82 @@ def extract_and_deploy_s3_zip(bucket_name, zip_key):
         # Determine the base folder name from the zip key
         base_folder = os.path.splitext(os.path.basename(zip_key))[0]
         
-        # Clean up existing files
-        cleanup_response = cleanup_existing_files(bucket_name, base_folder)
-        if cleanup_response['files_deleted'] > 0:
-            logger.info(f"Cleaned up {cleanup_response['files_deleted']} existing files")
-        
-        # Create temporary directory for processing
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Download the zip file from S3
-            zip_file_path = os.path.join(temp_dir, 'downloaded.zip')
-            logger.info(f"Downloading {zip_key} from bucket {bucket_name}")
-            s3_client.download_file(bucket_name, zip_key, zip_file_path)
-            
-            # Extract the zip file
-            extract_dir = os.path.join(temp_dir, 'extracted')
-            os.makedirs(extract_dir, exist_ok=True)
-            
-            with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-                logger.info(f"Extracted {len(zip_ref.namelist())} files")
-            
-            # Upload extracted files to S3
-            uploaded_files = []
-            for root, dirs, files in os.walk(extract_dir):
-                for file in files:
-                    local_file_path = os.path.join(root, file)
-                    # Calculate relative path from extraction directory
-                    relative_path = os.path.relpath(local_file_path, extract_dir)
-                    # Create S3 key: base_folder + relative path
-                    s3_key = f"{base_folder}/{relative_path}".replace(os.sep, '/')
-                    
-                    # Upload file to S3
-                    logger.debug(f"Uploading {relative_path} to {s3_key}")
-                    s3_client.upload_file(local_file_path, bucket_name, s3_key)
-                    uploaded_files.append(s3_key)
-            
-            logger.info(f"Successfully uploaded {len(uploaded_files)} files")
-            
+        manifest = load_deploy_manifest()
+        head = s3_client.head_object(Bucket=bucket_name, Key=zip_key)
+        if manifest and manifest.get('zip_etag') == head['ETag'] and manifest.get('base_folder') == base_folder:
+            logger.info(f"{zip_key} is unchanged since the last deployment")
             return {
                 'success': True,
-                'message': f"Successfully extracted and uploaded {len(uploaded_files)} files",
-                'uploaded_files': uploaded_files,
-                'base_folder': base_folder
+                'message': "Zip file unchanged, nothing uploaded",
+                'uploaded_files': [],
+                'deleted_files': [],
+                'base_folder': base_folder,
+                'bundle_hash': manifest['bundle_hash'],
+                'changed': False,
+                'manifest': manifest
             }
+        
+        # Content hashes of the files currently deployed
+        if manifest and manifest.get('base_folder') == base_folder:
+            deployed_files = manifest['files']
+        else:
+            deployed_files = list_deployed_etags(bucket_name, base_folder)
+        
+        bundle_files = {}
+        with open_s3_zip(s3_client, bucket_name, zip_key, head) as zip_ref, \
+                ThreadPoolExecutor(max_workers=S3_UPLOAD_MAX_WORKERS) as executor:
+            # Read members in archive order so ranged reads stay sequential
+            members = sorted(zip_ref.infolist(), key=lambda member: member.header_offset)
+            logger.info(f"Found {len(members)} entries in zip file")
+            
+            # Bound the extracted files held in memory while they wait for an upload worker
+            in_flight = threading.BoundedSemaphore(S3_UPLOAD_MAX_IN_FLIGHT)
+            futures = []
+            for member in members:
+                s3_key = member_key(base_folder, member.filename)
+                if not s3_key:
+                    continue
+                
+                in_flight.acquire()
+                try:
+                    body = zip_ref.read(member)
+                    bundle_files[s3_key] = hashlib.md5(body).hexdigest()
+                    if deployed_files.get(s3_key) == bundle_files[s3_key]:
+                        in_flight.release()
+                        continue
+                    future = executor.submit(upload_file_content, bucket_name, s3_key, body)
+                except Exception:
+                    in_flight.release()
+                    raise
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+            
+            uploaded_files = [future.result() for future in futures]
+        
+        # Delete only after the new files are in place
+        stale_files = sorted(set(deployed_files) - set(bundle_files))
+        delete_files(bucket_name, stale_files)
+        
+        bundle_hash = compute_bundle_hash(bundle_files)
+        changed = not manifest or manifest.get('bundle_hash') != bundle_hash or bool(uploaded_files or stale_files)
+        logger.info(f"Uploaded {len(uploaded_files)} changed files, deleted {len(stale_files)} stale files, "
+                    f"{len(bundle_files) - len(uploaded_files)} unchanged (bundle {bundle_hash[:12]})")
+        
+        return {
+            'success': True,
+            'message': f"Uploaded {len(uploaded_files)} and deleted {len(stale_files)} files",
+            'uploaded_files': uploaded_files,
+            'deleted_files': stale_files,
+            'base_folder': base_folder,
+            'bundle_hash': bundle_hash,
+            'changed': changed,
+            'manifest': {
+                'bundle_hash': bundle_hash,
+                'zip_etag': head['ETag'],
+                'base_folder': base_folder,
+                'files': bundle_files
+            }
+        }
             
     except Exception as e:
         error_msg = f"Error extracting zip file: {str(e)}"
@@ -458,55 +759,110 @@ def extract_and_deploy_s3_zip(bucket_name, zip_key):
         return {'success': False, 'message': error_msg}
 
 
-def cleanup_existing_files(bucket_name, base_folder):
+def compute_bundle_hash(bundle_files):
+    """SHA-256 over every deployed key and its content hash, in key order"""
+    digest = hashlib.sha256()
+    for s3_key in sorted(bundle_files):
+        digest.update(f"{s3_key}\0{bundle_files[s3_key]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def upload_file_content(bucket_name, s3_key, body):
     """
-    Remove existing files from S3 folder before deploying new ones.
+    Upload one extracted file to S3 with the Content-Type of its extension.
     
-    Lists and deletes all objects with the specified prefix,
-    handling pagination and batch deletion limits.
+    Args:
+        bucket_name (str): S3 bucket name
+        s3_key (str): Destination key
+        body (bytes): File content
+        
+    Returns:
+        str: The uploaded key
+    """
+    logger.debug(f"Uploading {len(body)} bytes to {s3_key}")
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=s3_key,
+        Body=body,
+        ContentType=content_type_for(s3_key)
+    )
+    return s3_key
+
+
+def content_type_for(s3_key):
+    """Content-Type for a frontend file, from its extension"""
+    extension = os.path.splitext(s3_key)[1].lower()
+    return CONTENT_TYPES.get(extension) or mimetypes.guess_type(s3_key)[0] or DEFAULT_CONTENT_TYPE
+
+
+def list_deployed_etags(bucket_name, base_folder):
+    """
+    Content hashes of the files under the deploy folder, from their S3 ETags.
+    
+    put_object ETags are the MD5 of the content. Multipart ETags (containing
+    '-') never match an MD5, so those files are simply uploaded again.
     
     Args:
         bucket_name (str): S3 bucket name
-        base_folder (str): Folder prefix to clean up
+        base_folder (str): Folder prefix to list
         
     Returns:
-        dict: Response with cleanup results and file count
+        dict: S3 key to ETag without quotes
+    """
+    logger.info(f"Listing deployed files in folder: {base_folder}")
+    
+    paginator = s3_client.get_paginator('list_objects_v2')
+    etags = {}
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=f"{base_folder}/"):
+        for obj in page.get('Contents', []):
+            etags[obj['Key']] = obj.get('ETag', '').strip('"')
+    return etags
+
+
+def delete_files(bucket_name, s3_keys):
     """
-    logger.info(f"Cleaning up existing files in folder: {base_folder}")
+    Delete objects in batches of S3_DELETE_BATCH_SIZE, sending the batches in parallel.
     
-    try:
-        paginator = s3_client.get_paginator('list_objects_v2')
-        page_iterator = paginator.paginate(Bucket=bucket_name, Prefix=f"{base_folder}/")
+    Args:
+        bucket_name (str): S3 bucket name
+        s3_keys (list): Keys to delete
         
-        objects_to_delete = []
-        for page in page_iterator:
-            if 'Contents' in page:
-                for obj in page['Contents']:
-                    objects_to_delete.append({'Key': obj['Key']})
+    Returns:
+        int: Number of objects deleted
+    """
+    if not s3_keys:
+        return 0
+    
+    batches = [
+        [{'Key': s3_key} for s3_key in s3_keys[i:i + S3_DELETE_BATCH_SIZE]]
+        for i in range(0, len(s3_keys), S3_DELETE_BATCH_SIZE)
+    ]
+    with ThreadPoolExecutor(max_workers=S3_DELETE_MAX_WORKERS) as executor:
+        total_deleted = sum(executor.map(lambda batch: delete_batch(bucket_name, batch), batches))
+    
+    logger.info(f"Deleted {total_deleted} files in {len(batches)} batches")
+    return total_deleted
+
+
+def delete_batch(bucket_name, batch):
+    """
+    Delete up to S3_DELETE_BATCH_SIZE objects in one request.
+    
+    Args:
+        bucket_name (str): S3 bucket name
+        batch (list): Objects to delete, as {'Key': ...} dicts
         
-        if objects_to_delete:
-            logger.info(f"Found {len(objects_to_delete)} existing files to delete")
-            
-            # Delete objects in batches (S3 allows max 1000 objects per delete request)
-            total_deleted = 0
-            for i in range(0, len(objects_to_delete), S3_DELETE_BATCH_SIZE):
-                batch = objects_to_delete[i:i + S3_DELETE_BATCH_SIZE]
-                s3_client.delete_objects(
-                    Bucket=bucket_name,
-                    Delete={'Objects': batch}
-                )
-                total_deleted += len(batch)
-            
-            logger.info(f"Successfully deleted {total_deleted} existing files")
-            return {'success': True, 'files_deleted': total_deleted}
-        else:
-            logger.info("No existing files found to delete")
-            return {'success': True, 'files_deleted': 0}
-            
-    except Exception as e:
-        error_msg = f"Error cleaning up existing files: {str(e)}"
-        logger.error(error_msg)
-        return {'success': False, 'message': error_msg, 'files_deleted': 0}
+    Returns:
+        int: Number of objects deleted
+    """
+    response = s3_client.delete_objects(
+        Bucket=bucket_name,
+        Delete={'Objects': batch, 'Quiet': True}
+    )
+    errors = response.get('Errors', [])
+    for error in errors:
+        logger.warning(f"Failed to delete {error.get('Key')}: {error.get('Message')}")
+    return len(batch) - len(errors)
 
 
 def send_cfn_response(event, context, response_status, response_data, physical_resource_id=None, no_echo=False, reason=None):
@@ -541,7 +897,7 @@ def send_cfn_response(event, context, response_status, response_data, physical_r
             'Data': response_data
         }
         
-        json_response_body = json.dumps(response_body)
+        json_response_body = dumps_bytes(response_body)
         logger.debug(f"Response body: {json_response_body}")
         
         headers = {
@@ -0,0 +1,109 @@
+import io
+import zipfile
+import logging
+from constants import ZIP_SPOOL_THRESHOLD, ZIP_RANGE_READ_SIZE
+
+import constants  # This configures logging
+
+logger = logging.getLogger(__name__)
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable, read-only view of an S3 object backed by ranged GETs.
+
+    Wrapped in an io.BufferedReader so zipfile's small reads and seeks are
+    served from one large range at a time. Every range is requested with
+    IfMatch on the object's ETag, so a zip replaced mid-read fails instead of
+    mixing two versions.
+    """
+
+    def __init__(self, client, bucket_name, key, size, etag):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.position = 0
+        self.requests = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        self.position = max(0, self.position)
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.size or not len(buffer):
+            return 0
+
+        end = min(self.position + len(buffer), self.size) - 1
+        response = self.client.get_object(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            Range=f"bytes={self.position}-{end}",
+            IfMatch=self.etag
+        )
+        data = response['Body'].read()
+        self.requests += 1
+
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def open_s3_zip(client, bucket_name, zip_key, head=None):
+    """
+    Open a zip stored in S3 without writing it to disk.
+
+    Zips up to ZIP_SPOOL_THRESHOLD are fetched with one GET into memory;
+    larger ones are read through ranged GETs, so memory stays bounded by
+    ZIP_RANGE_READ_SIZE plus the members being uploaded.
+
+    Args:
+        client: boto3 S3 client
+        bucket_name (str): S3 bucket name
+        zip_key (str): S3 key of the zip file
+        head (dict, optional): head_object response for the zip, if already fetched
+
+    Returns:
+        zipfile.ZipFile: Open zip file (close it, or use it as a context manager)
+    """
+    head = head or client.head_object(Bucket=bucket_name, Key=zip_key)
+    size = head['ContentLength']
+
+    if size <= ZIP_SPOOL_THRESHOLD:
+        logger.info(f"Reading {zip_key} ({size:,} bytes) into memory")
+        body = client.get_object(Bucket=bucket_name, Key=zip_key, IfMatch=head['ETag'])['Body'].read()
+        return zipfile.ZipFile(io.BytesIO(body))
+
+    logger.info(f"Reading {zip_key} ({size:,} bytes) with ranged GETs of {ZIP_RANGE_READ_SIZE:,} bytes")
+    reader = S3RangeReader(client, bucket_name, zip_key, size, head['ETag'])
+    return zipfile.ZipFile(io.BufferedReader(reader, buffer_size=ZIP_RANGE_READ_SIZE))
+
+
+def member_key(base_folder, member_name):
+    """
+    S3 key for a zip member below the base folder, or None for entries
+    that are not plain files inside the archive (directories, absolute or
+    parent-relative paths).
+    """
+    parts = [part for part in member_name.replace('\\', '/').split('/') if part not in ('', '.')]
+    if not parts or member_name.endswith('/') or '..' in parts:
+        return None
+    return f"{base_folder}/{'/'.join(parts)}"
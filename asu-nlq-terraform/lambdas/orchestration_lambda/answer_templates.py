@@ -0,0 +1,127 @@
+import re
+import logging
+import constants  # This configures logging
+from chatbot_config import (
+    deterministic_max_columns,
+    deterministic_max_rows,
+    scalar_answer_template,
+    scalar_answer_filters_template,
+    table_answer_template,
+    table_sent_answer_template,
+    canonicalizer_count_expression
+)
+from results import ResultTable, to_number
+
+logger = logging.getLogger(__name__)
+
+# Matches "column" = "value" filters in a SQL-eeze question
+FILTER_PATTERN = re.compile(r'"([^"]+)"\s*=\s*"([^"]+)"')
+
+# Matches quoted names/values, removed before looking for arithmetic
+QUOTED_PATTERN = re.compile(r'"[^"]*"')
+
+# Arithmetic outside quotes means a computed value (percentages, growth) the model should explain
+ARITHMETIC_PATTERN = re.compile(r'[-+*/]')
+
+# Quoted identifiers and string literals in SQL, removed before looking at its expressions
+SQL_QUOTED_PATTERN = re.compile(r'"[^"]*"|\'[^\']*\'')
+
+# COUNT and SUM aggregates, the only results plain enough for a template
+COUNT_PATTERN = re.compile(r'\b(COUNT|SUM)\s*\(', re.IGNORECASE)
+
+# Other aggregates, window functions and arithmetic produce derived values (averages, ratios, percentages)
+DERIVED_SQL_PATTERN = re.compile(
+    r'\b(AVG|MIN|MAX|MEDIAN|STDDEV\w*|VAR\w*|ROUND|PERCENT\w*|RANK|CAST)\s*\(|\bOVER\s*\(|[-+*/%]',
+    re.IGNORECASE
+)
+
+
+# Render a templated answer for trivial results, or None to fall back to the model.
+def render_deterministic_answer(question, table, unanswered_questions="None", table_sent=False):
+    """
+    Render a reply from templates when the knowledge base returned a scalar
+    or a small table for a single question. Anything non-trivial returns
+    None so the final response model handles it. When the client already
+    received the table in data frames it is referred to, not rendered again.
+    """
+    if unanswered_questions != "None":
+        logger.info("Deterministic answer skipped: question had several parts")
+        return None
+
+    if ARITHMETIC_PATTERN.search(QUOTED_PATTERN.sub("", question or "")):
+        logger.info("Deterministic answer skipped: question computes a derived value")
+        return None
+
+    if not is_count_result(question, table):
+        logger.info("Deterministic answer skipped: result is not a plain count or total")
+        return None
+
+    if not is_simple_table(table):
+        logger.info("Deterministic answer skipped: result is not a small, complete table")
+        return None
+
+    numeric = table.numeric_columns()
+    if not numeric:
+        logger.info("Deterministic answer skipped: result has no numeric value")
+        return None
+
+    if table.row_count == 1 and len(table.columns) == 1:
+        return render_scalar(question, table.values[0][0])
+
+    if table_sent:
+        return table_sent_answer_template
+
+    rows = [
+        [format_number(value) if i in numeric else str(value) for i, value in enumerate(row)]
+        for row in table.rows()
+    ]
+    markdown = ResultTable([humanize(name) for name in table.columns]).render(rows, "markdown")
+    return table_answer_template.format(table=markdown)
+
+
+# Render a single number as a sentence naming the question's filters.
+def render_scalar(question, value):
+    """Render a single numeric value with the filters taken from the question"""
+    filters = FILTER_PATTERN.findall(question or "")
+    formatted = format_number(value)
+
+    if filters:
+        described = ", ".join(f"{humanize(column)} {value}" for column, value in filters)
+        return scalar_answer_filters_template.format(value=formatted, filters=described)
+    return scalar_answer_template.format(value=formatted)
+
+
+def is_count_result(question, table):
+    """
+    True when the result's SQL only counts or sums, so its numbers need no
+    explanation. Without SQL the question must be the canonical count.
+    """
+    sql = getattr(table, "sql", None)
+    if not sql:
+        return (question or "").startswith(canonicalizer_count_expression)
+
+    expressions = SQL_QUOTED_PATTERN.sub("", sql).replace("(*)", "()")
+    return bool(COUNT_PATTERN.search(expressions)) and not DERIVED_SQL_PATTERN.search(expressions)
+
+
+def is_simple_table(table):
+    """True for a non-empty result table within the template size limits and without NULLs"""
+    return (
+        isinstance(table, ResultTable)
+        and 0 < table.row_count <= deterministic_max_rows
+        and len(table.columns) <= deterministic_max_columns
+        and not table.has_nulls()
+    )
+
+
+def format_number(value):
+    """Format a number with thousands separators and at most two decimals"""
+    number = to_number(value)
+    if number.is_integer():
+        return f"{int(number):,}"
+    return f"{number:,.2f}"
+
+
+def humanize(name):
+    """Turn a column name like Undergraduate_or_Graduate into readable text"""
+    return name.replace("_", " ").strip()
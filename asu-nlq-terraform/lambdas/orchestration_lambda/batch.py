@@ -0,0 +1,277 @@
+"""
+Batch mode: run a JSONL file of questions or conversations through orchestrate()
+with bounded concurrency and a rate limit, without API Gateway. Frames go to an
+in-memory transport; the answer, classification, refined question, SQL, stage
+timings and token usage of every item are written to a JSONL output file.
+
+Each input line is one item:
+    {"id": "q1", "question": "How many students were at Tempe in fall 2023?"}
+    {"id": "q2", "messages": [{"role": "user", "content": [{"text": "..."}]}, ...]}
+
+Usage:
+    python batch.py questions.jsonl answers.jsonl --concurrency 8 --rate 2
+    python batch.py s3://bucket/questions.jsonl s3://bucket/answers.jsonl
+    python batch.py questions.jsonl answers.jsonl --record run.cassette.jsonl
+    python batch.py questions.jsonl answers.jsonl --replay run.cassette.jsonl --fast
+
+The Lambda runs a batch for an event like
+    {"batch": {"input": "s3://bucket/questions.jsonl", "output": "s3://bucket/answers.jsonl", "concurrency": 4}}
+or, for a few items, {"batch": {"items": [...]}} with the results in the response.
+Items are only started while the invocation has a full request budget left; the
+rest are listed under "not_run" in the summary so they can be submitted again.
+"""
+
+import time
+import uuid
+import argparse
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import constants  # This configures logging
+from constants import BATCH_CONCURRENCY, BATCH_RATE
+from chatbot_config import request_budget
+from codec import dumps, loads, DECODE_ERRORS
+from deadline import Deadline
+from orchestration import orchestrate
+from request_trace import start_trace
+from structured_log import bind_request
+from transport import MemoryTransport
+import utilities
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Spaces calls to acquire() at least 1/rate seconds apart across threads (0 is unlimited)"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.lock = threading.Lock()
+        self.next_start = time.monotonic()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class BatchTransport(MemoryTransport):
+    """MemoryTransport that also notes when each connection received its first answer text"""
+
+    def __init__(self):
+        super().__init__()
+        self.first_text = {}
+
+    def send(self, connectionId, frame):
+        super().send(connectionId, frame)
+        if frame.get("type") == "contentBlockDelta" and connectionId not in self.first_text:
+            self.first_text[connectionId] = time.perf_counter()
+
+
+# ============================================================================
+# ITEMS
+# ============================================================================
+
+def parse_items(lines):
+    """Items from JSONL lines; blank lines are skipped and malformed ones become failed items"""
+    items = []
+    for number, line in enumerate(lines, 1):
+        item = None
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = loads(line)
+            if not isinstance(item, dict) or not (item.get("question") or item.get("messages")):
+                raise ValueError("an item needs a question or messages")
+        except (*DECODE_ERRORS, ValueError) as e:
+            item = {"id": item.get("id") if isinstance(item, dict) else None, "error": f"Line {number}: {e}"}
+        item["id"] = item.get("id") or str(number)
+        items.append(item)
+    return items
+
+
+def item_event(item, connectionId):
+    """The WebSocket sendMessage event for an item"""
+    messages = item.get("messages") or [{"role": "user", "content": [{"text": item["question"]}]}]
+    return {
+        "requestContext": {"connectionId": connectionId, "routeKey": "sendMessage"},
+        "body": dumps({"action": "sendMessage", "messages": messages}),
+        "request_id": str(item["id"])
+    }
+
+
+def last_question(item):
+    if item.get("question"):
+        return item["question"]
+    user_messages = [message for message in item.get("messages", []) if message.get("role") == "user"]
+    return user_messages[-1]["content"][0].get("text") if user_messages else None
+
+
+# ============================================================================
+# RUNNING
+# ============================================================================
+
+# Runs one item through the pipeline on a worker thread
+def run_item(item, transport, limiter, deadline=None):
+    """
+    Orchestrate one item and return its result record. With a batch deadline
+    the item is not started (the record has "not_run") once less than a
+    request budget is left, and its own deadline never outlives the batch's.
+    """
+    result = {"id": item["id"], "question": last_question(item)}
+    if "error" in item:
+        return {**result, "error": item["error"]}
+
+    limiter.acquire()
+    if deadline is not None and deadline.remaining() < request_budget:
+        return {**result, "not_run": True}
+    connectionId = f"batch-{uuid.uuid4().hex}"
+    bind_request(str(item["id"]), connectionId)
+    trace = start_trace()
+    utilities.register_transport(connectionId, transport)
+    try:
+        orchestrate(item_event(item, connectionId), deadline=Deadline(request_budget, parent=deadline))
+    except Exception as e:
+        logger.error(f"Batch item {item['id']} failed: {e}")
+        trace.set("error", str(e))
+    finally:
+        utilities.release_transport(connectionId)
+
+    record = trace.to_dict()
+    first_text = transport.first_text.pop(connectionId, None)
+    record["first_text_seconds"] = round(first_text - trace.started, 4) if first_text else None
+    record["answer"] = transport.text(connectionId).replace("BREAK_TOKEN", "\n\n").strip()
+    transport.frames.pop(connectionId, None)
+    return {**result, **record}
+
+
+def run_batch(items, concurrency=BATCH_CONCURRENCY, rate=BATCH_RATE, on_result=None, deadline=None):
+    """
+    Run the items with at most concurrency in flight and at most rate started
+    per second. on_result is called with each result in input order; items
+    not started before the deadline are only listed in the summary.
+    Returns a summary of the run.
+    """
+    logger.custom(f" Batch of {len(items)} items, concurrency {concurrency}, rate {rate or 'unlimited'}/s")
+    transport = BatchTransport()
+    limiter = RateLimiter(rate)
+    seconds, tokens, failed, not_run = [], {"inputTokens": 0, "outputTokens": 0, "totalTokens": 0}, 0, []
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch") as executor:
+        for result in executor.map(lambda item: run_item(item, transport, limiter, deadline), items):
+            if result.get("not_run"):
+                not_run.append(result["id"])
+                continue
+            if result.get("error"):
+                failed += 1
+            if "seconds" in result:
+                seconds.append(result["seconds"])
+                for name in tokens:
+                    tokens[name] += result["tokens"][name]
+            if on_result:
+                on_result(result)
+    elapsed = time.perf_counter() - start
+
+    if not_run:
+        logger.warning(f"Batch deadline reached: {len(not_run)} of {len(items)} items not run")
+
+    seconds.sort()
+    summary = {
+        "items": len(items),
+        "failed": failed,
+        "not_run": not_run,
+        "seconds": round(elapsed, 3),
+        "items_per_second": round((len(items) - len(not_run)) / elapsed, 3) if elapsed else None,
+        "latency_p50": seconds[len(seconds) // 2] if seconds else None,
+        "latency_p95": seconds[min(len(seconds) - 1, int(0.95 * len(seconds)))] if seconds else None,
+        "tokens": tokens
+    }
+    logger.timer(f"Batch finished: {summary}")
+    return summary
+
+
+# ============================================================================
+# FILES
+# ============================================================================
+
+def split_s3_uri(uri):
+    bucket_name, _, key = uri[len("s3://"):].partition("/")
+    return bucket_name, key
+
+
+def read_lines(location):
+    """Lines of a local file or s3:// object"""
+    if location.startswith("s3://"):
+        bucket_name, key = split_s3_uri(location)
+        body = utilities.s3_client.get_object(Bucket=bucket_name, Key=key)["Body"].read()
+        return body.decode("utf-8").splitlines()
+    with open(location, encoding="utf-8") as file:
+        return file.read().splitlines()
+
+
+def write_lines(location, lines):
+    """Write JSONL lines to a local file or s3:// object"""
+    body = "".join(line + "\n" for line in lines)
+    if location.startswith("s3://"):
+        bucket_name, key = split_s3_uri(location)
+        utilities.s3_client.put_object(Bucket=bucket_name, Key=key, Body=body.encode("utf-8"), ContentType="application/x-ndjson")
+    else:
+        with open(location, "w", encoding="utf-8") as file:
+            file.write(body)
+
+
+# Runs a batch described by a Lambda event
+def run_batch_event(request, deadline=None):
+    """
+    Run the batch of a {"batch": ...} event: items inline or from "input",
+    results to "output" when given, otherwise returned with the summary.
+    deadline is the invocation's; items that would not finish before it are
+    not started, and the results of the others are still written.
+    """
+    items = request.get("items")
+    items = parse_items(dumps(item) for item in items) if items is not None else parse_items(read_lines(request["input"]))
+    results = []
+    summary = run_batch(
+        items,
+        concurrency=int(request.get("concurrency", BATCH_CONCURRENCY)),
+        rate=float(request.get("rate", BATCH_RATE)),
+        on_result=results.append,
+        deadline=deadline
+    )
+
+    if request.get("output"):
+        write_lines(request["output"], [dumps(result) for result in results] + [dumps({"summary": summary})])
+        return {**summary, "output": request["output"]}
+    return {**summary, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of questions or conversations through the pipeline")
+    parser.add_argument("input", help="JSONL file or s3:// object of items")
+    parser.add_argument("output", help="JSONL file or s3:// object for the results")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="conversations processed at once")
+    parser.add_argument("--rate", type=float, default=BATCH_RATE, help="conversations started per second (0 is unlimited)")
+    parser.add_argument("--record", metavar="CASSETTE", help="record the model, knowledge base and S3 calls to a cassette")
+    parser.add_argument("--replay", metavar="CASSETTE", help="serve the model, knowledge base and S3 calls from a cassette")
+    parser.add_argument("--fast", action="store_true", help="replay without the recorded latencies")
+    args = parser.parse_args()
+
+    if args.record or args.replay:
+        import cassette
+        cassette.install(args.record or args.replay, "record" if args.record else "replay", "fast" if args.fast else "recorded")
+
+    results = []
+    summary = run_batch(parse_items(read_lines(args.input)), args.concurrency, args.rate, on_result=results.append)
+    write_lines(args.output, [dumps(result) for result in results] + [dumps({"summary": summary})])
+    print(dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
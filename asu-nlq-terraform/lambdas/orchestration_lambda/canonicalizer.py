@@ -0,0 +1,330 @@
+import re
+import time
+import logging
+from collections import deque
+from difflib import get_close_matches
+import constants  # This configures logging
+from chatbot_config import (
+    canonicalizer_min_coverage,
+    canonicalizer_history_messages,
+    canonicalizer_count_expression,
+    canonicalizer_time_column,
+    canonicalizer_column_priority,
+    canonicalizer_synonyms,
+    canonicalizer_no_plural_words,
+    canonicalizer_season_order,
+    canonicalizer_blocking_words,
+    canonicalizer_count_words,
+    canonicalizer_stop_words,
+    canonicalizer_follow_up_phrases
+)
+from normalize import tokenize
+from schema_artifact import schema_key
+
+logger = logging.getLogger(__name__)
+
+# Values like "Fall 2022", which users also write as "fall 22" or just "2022"
+PERIOD_PATTERN = re.compile(r"^([A-Za-z]+) (\d{4})$")
+
+# Shortest unknown word that is spell-corrected against the schema vocabulary
+FUZZY_MIN_LENGTH = 5
+
+# Similarity a misspelled word needs to a schema word to be corrected
+FUZZY_CUTOFF = 0.85
+
+# Rank given to columns missing from the priority list
+UNRANKED = len(canonicalizer_column_priority)
+
+
+class TokenAutomaton:
+    """
+    Aho-Corasick automaton over word tokens.
+    Finds every phrase occurrence in a question in one pass, however many phrases are indexed.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+    def add(self, tokens, payload):
+        """Index a phrase (tuple of tokens) with the payload reported when it matches"""
+        node = 0
+        for token in tokens:
+            child = self.goto[node].get(token)
+            if child is None:
+                child = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[node][token] = child
+            node = child
+        self.output[node].append((len(tokens), payload))
+
+    def build(self):
+        """Compute failure links once every phrase has been added"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(token, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, tokens):
+        """Return (start, end, payload) for every indexed phrase found in the tokens"""
+        matches = []
+        node = 0
+        for index, token in enumerate(tokens):
+            while node and token not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(token, 0)
+            for length, payload in self.output[node]:
+                matches.append((index - length + 1, index + 1, payload))
+        return matches
+
+
+class Canonicalization:
+    """Slots found in a question, the canonical SQL-eeze question built from them and how sure we are"""
+
+    def __init__(self, slots, question, coverage, confident, reason):
+        self.slots = slots
+        self.question = question
+        self.coverage = coverage
+        self.confident = confident
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Canonicalization(confident={self.confident}, coverage={self.coverage:.2f}, reason={self.reason!r}, question={self.question!r})"
+
+
+class Canonicalizer:
+    """
+    Maps user phrasing onto schema values ("fall 22 engineering grads" ->
+    Term "Fall 2022", College "Engineering", Undergraduate_or_Graduate "Graduate").
+    Built once per schema from its possible_values plus the configured synonyms.
+    """
+
+    def __init__(self, schema):
+        self.columns = []
+        self.automaton = TokenAutomaton()
+        self.vocabulary = set()
+        self.latest_period = None
+        phrases = 0
+
+        for table in schema.get("tables", []):
+            for column in table.get("columns", []):
+                name = column["column_name"]
+                values = column.get("possible_values") or []
+                if not values:
+                    continue
+                self.columns.append(name)
+
+                for value in values:
+                    for phrase in surface_forms(name, value):
+                        self.automaton.add(phrase, (name, value))
+                        self.vocabulary.update(phrase)
+                        phrases += 1
+
+                if name == canonicalizer_time_column:
+                    self.latest_period = max(values, key=period_key)
+
+        self.automaton.build()
+        logger.info("Canonicalizer built: %s phrases over %s columns", phrases, len(self.columns))
+
+    def canonicalize(self, chatHistory):
+        """
+        Canonicalize the latest user message. Follow-up questions ("what about
+        fall 2021?") inherit the filters of the previous user question.
+        """
+        user_messages = [message["content"][0]["text"] for message in chatHistory if message["role"] == "user"]
+        if not user_messages:
+            return Canonicalization({}, None, 0.0, False, "no user message")
+
+        current = self.analyze(user_messages[-1])
+        if not current["follow_up"]:
+            return self.decide(current["slots"], current)
+
+        # Reuse the filters and intent of the question being followed up, the new message overrides them
+        for text in reversed(user_messages[-1 - canonicalizer_history_messages:-1]):
+            previous = self.analyze(text)
+            if previous["follow_up"]:
+                continue
+            if previous["reason"]:
+                return Canonicalization({}, None, current["coverage"], False, f"follow-up of: {previous['reason']}")
+
+            # A new column next to earlier filters may narrow or replace them ("what about nursing?"), leave that to the model
+            added = set(current["slots"]) - set(previous["slots"])
+            if added and set(previous["slots"]) - {canonicalizer_time_column}:
+                return Canonicalization(current["slots"], None, current["coverage"], False, f"follow-up adds {sorted(added)[0]}")
+            slots = {**previous["slots"], **current["slots"]}
+            current["count"] = previous["count"]
+            return self.decide(slots, current)
+
+        return Canonicalization(current["slots"], None, current["coverage"], False, "follow-up without an earlier question")
+
+    def analyze(self, text):
+        """Find the slots, intent and coverage of a single message"""
+        normalized = " ".join(tokenize(text))
+        tokens, corrected = self.correct(tokenize(text))
+
+        follow_up = any(normalized.startswith(phrase) for phrase in canonicalizer_follow_up_phrases)
+        count = any(f" {word} " in f" {normalized} " for word in canonicalizer_count_words)
+
+        slots, matched, reason = self.match_slots(tokens)
+        blocking = [token for token in tokens if token in BLOCKING_WORDS]
+        if blocking and not reason:
+            reason = f"needs more than a filtered count ({blocking[0]})"
+
+        content = [i for i, token in enumerate(tokens) if token not in STOP_WORDS and token not in FOLLOW_UP_WORDS]
+        # A spell-corrected word is a guess, it never counts as covered
+        covered = [i for i in content if i in matched and i not in corrected]
+        coverage = len(covered) / len(content) if content else 1.0
+
+        return {"slots": slots, "coverage": coverage, "count": count, "follow_up": follow_up, "reason": reason}
+
+    def match_slots(self, tokens):
+        """
+        Pick the longest non-overlapping phrase matches and resolve each to one column.
+        Returns the slots, the indexes of matched tokens and a reason when the match is unusable.
+        """
+        spans = {}
+        for start, end, payload in self.automaton.search(tokens):
+            spans.setdefault((start, end), set()).add(payload)
+
+        slots, matched, reason = {}, set(), None
+        for (start, end), candidates in sorted(spans.items(), key=lambda span: (span[0][0] - span[0][1], span[0][0])):
+            if matched.intersection(range(start, end)):
+                continue
+            matched.update(range(start, end))
+
+            ranked = sorted(candidates, key=lambda candidate: column_rank(candidate[0]))
+            column, value = ranked[0]
+            if len(ranked) > 1 and column_rank(ranked[1][0]) == column_rank(column):
+                reason = reason or f"'{' '.join(tokens[start:end])}' matches several columns"
+                continue
+            if slots.get(column, value) != value:
+                reason = reason or f"several values for {column}"
+                continue
+            slots[column] = value
+
+        return slots, matched, reason
+
+    def decide(self, slots, analysis):
+        """Build the canonical question and decide whether it can replace the create_question stage"""
+        slots = dict(slots)
+        if canonicalizer_time_column not in slots and self.latest_period:
+            slots[canonicalizer_time_column] = self.latest_period
+
+        question = canonical_question(slots, self.columns)
+        reason = analysis["reason"]
+        if not reason and not analysis["count"]:
+            reason = "not a count question"
+        if not reason and analysis["coverage"] < canonicalizer_min_coverage:
+            reason = f"coverage {analysis['coverage']:.2f} below {canonicalizer_min_coverage}"
+
+        return Canonicalization(slots, question, analysis["coverage"], reason is None, reason)
+
+    def correct(self, tokens):
+        """Spell-correct unknown words against the schema vocabulary; returns the tokens and the indexes changed"""
+        result, corrected = [], set()
+        for index, token in enumerate(tokens):
+            if len(token) >= FUZZY_MIN_LENGTH and token not in self.vocabulary and token not in STOP_WORDS and token not in BLOCKING_WORDS:
+                close = get_close_matches(token, self.vocabulary, n=1, cutoff=FUZZY_CUTOFF)
+                if close:
+                    logger.info("Canonicalizer corrected '%s' to '%s'", token, close[0])
+                    token = close[0]
+                    corrected.add(index)
+            result.append(token)
+        return result, corrected
+
+
+STOP_WORDS = set(canonicalizer_stop_words)
+NO_PLURAL_WORDS = set(canonicalizer_no_plural_words)
+BLOCKING_WORDS = set(canonicalizer_blocking_words)
+FOLLOW_UP_WORDS = {word for phrase in canonicalizer_follow_up_phrases for word in phrase.split()}
+
+
+# Canonicalize the latest question of a chat against the schema.
+def canonicalize_question(chatHistory, schema):
+    """
+    Map the latest user question onto schema values and log how it went.
+    Returns a Canonicalization; only confident ones may skip the create_question model.
+    """
+    start = time.perf_counter()
+    try:
+        result = get_canonicalizer(schema).canonicalize(chatHistory)
+    except Exception as e:
+        logger.error(f"Canonicalizer failed, falling back to the model: {e}")
+        return Canonicalization({}, None, 0.0, False, "canonicalizer error")
+
+    elapsed = time.perf_counter() - start
+    logger.timer(f"Canonicalizer took {elapsed * 1000:.1f}ms: coverage {result.coverage:.2f}, "
+                 f"{len(result.slots)} slots, confident={result.confident}"
+                 + (f" ({result.reason})" if result.reason else ""))
+    return result
+
+
+# Canonicalizers built so far, by schema content hash
+canonicalizers = {}
+
+
+def get_canonicalizer(schema):
+    """Build (or reuse) the canonicalizer for a schema"""
+    key = schema_key(schema)
+    if key not in canonicalizers:
+        canonicalizers[key] = Canonicalizer(schema)
+    return canonicalizers[key]
+
+
+def surface_forms(column, value):
+    """Phrases (token tuples) that refer to a schema value"""
+    forms = {tuple(tokenize(value))}
+
+    # Plural of the last word: "Senior" -> "seniors"
+    base = tuple(tokenize(value))
+    if base and not base[-1].endswith("s") and not base[-1].isdigit() and base[-1] not in NO_PLURAL_WORDS:
+        forms.add(base[:-1] + (base[-1] + "s",))
+
+    # "Fall 2022" -> "fall 22", "2022"
+    period = PERIOD_PATTERN.match(value)
+    if period:
+        season, year = period.group(1).lower(), period.group(2)
+        forms.add((season, year[2:]))
+        forms.add((year,))
+
+    for synonym in canonicalizer_synonyms.get(column, {}).get(value, []):
+        forms.add(tuple(tokenize(synonym)))
+
+    return [form for form in forms if form]
+
+
+def period_key(value):
+    """
+    Sort key of a time period value: year, then season ("Spring 2022" before
+    "Fall 2022"). Values without a season sort by their numbers alone.
+    """
+    period = PERIOD_PATTERN.match(value)
+    if period and period.group(1).lower() in canonicalizer_season_order:
+        return [int(period.group(2)), canonicalizer_season_order.index(period.group(1).lower())]
+    return [int(number) for number in re.findall(r"\d+", value)]
+
+
+def column_rank(column):
+    """Position of a column in the priority list (unlisted columns share the lowest rank)"""
+    try:
+        return canonicalizer_column_priority.index(column)
+    except ValueError:
+        return UNRANKED
+
+
+def canonical_question(slots, columns):
+    """SQL-eeze count question for the slots, filters in schema column order"""
+    filters = [f'"{column}" = "{slots[column]}"' for column in columns if column in slots]
+    question = canonicalizer_count_expression
+    if filters:
+        question += " WHERE " + " AND ".join(filters)
+    return question
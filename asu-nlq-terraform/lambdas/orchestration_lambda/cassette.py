@@ -0,0 +1,312 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from botocore.exceptions import ClientError
+import constants  # This configures logging
+from codec import dumps, loads
+from deadline import StageTimeout
+from results import ResultTable
+from schema_artifact import SchemaArtifact, register_artifact
+import orchestration
+import schema_store
+import utilities
+
+logger = logging.getLogger(__name__)
+
+# Record/replay of the pipeline's AWS-facing calls. In record mode every call of
+# the wrapped functions is made for real and its response (with stream events
+# and their timing) appended to a JSONL cassette; in replay mode the responses
+# are served from the cassette, at recorded speed or as fast as possible, so
+# orchestrate() runs without AWS.
+#
+#     cassette.install("run.cassette.jsonl", "record")
+#     cassette.install("run.cassette.jsonl", "replay", speed="fast")
+#
+# Calls are matched on a hash of their request; identical requests are served
+# in the order they were recorded. A response already on the cassette (the
+# schema, fetched by every request) is stored once and referenced by its hash.
+
+MODES = ("record", "replay")
+SPEEDS = ("recorded", "fast")
+
+_installed = {}
+
+
+class CassetteMiss(LookupError):
+    """A call in replay mode that the cassette has no recording of"""
+    pass
+
+
+class Cassette:
+    """The recordings of one cassette file"""
+
+    def __init__(self, path, mode, speed="recorded"):
+        if mode not in MODES:
+            raise ValueError(f"Cassette mode must be one of {MODES}")
+        if speed not in SPEEDS:
+            raise ValueError(f"Cassette speed must be one of {SPEEDS}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.entries = defaultdict(list)
+        self.served = defaultdict(int)
+        self.responses = {}
+        self.artifacts = {}
+
+        if mode == "record":
+            open(path, "w").close()
+        else:
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        entry = loads(line)
+                        if "response_id" in entry:
+                            self.responses[entry["response_id"]] = entry["response"]
+                        self.entries[entry["key"]].append(entry)
+            logger.info("Loaded %s recorded calls from %s", sum(len(entries) for entries in self.entries.values()), path)
+
+    @staticmethod
+    def key(function, request):
+        """Hash of a call; computed when the call is made, before its arguments can change"""
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(f"{function}:{canonical}".encode("utf-8")).hexdigest()
+
+    def record(self, function, key, label, seconds, **fields):
+        entry = {"function": function, "key": key, "label": label, "seconds": round(seconds, 6), **fields}
+        with self.lock:
+            if "response" in fields:
+                response_id = hashlib.sha256(dumps(fields["response"]).encode("utf-8")).hexdigest()
+                if response_id in self.responses:
+                    del entry["response"]
+                    entry["response_ref"] = response_id
+                else:
+                    self.responses[response_id] = True
+                    entry["response_id"] = response_id
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(dumps(entry) + "\n")
+
+    def lookup(self, function, key, label):
+        """The next recording of a call; the last one is repeated once they run out"""
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                logger.error(f"No recording of {function} call: {label}")
+                raise CassetteMiss(f"{function}: {label}")
+            entry = entries[min(self.served[key], len(entries) - 1)]
+            self.served[key] += 1
+        if "response_ref" in entry:
+            return {**entry, "response": self.responses[entry["response_ref"]]}
+        return entry
+
+    def wait(self, seconds):
+        if self.speed == "recorded" and seconds > 0:
+            time.sleep(seconds)
+
+
+# ============================================================================
+# STREAMS
+# ============================================================================
+
+class RecordingStream:
+    """Passes a model stream through, recording each event's offset from the call's start"""
+
+    def __init__(self, stream, started, on_finish):
+        self.stream = stream
+        self.started = started
+        self.on_finish = on_finish
+        self.events = []
+        self.finished = False
+
+    def __iter__(self):
+        for event in self.stream:
+            self.events.append([round(time.perf_counter() - self.started, 6), event])
+            yield event
+        self.finish()
+
+    def close(self):
+        self.stream.close()
+        self.finish()
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            self.on_finish(self.events)
+
+
+class ReplayStream:
+    """Serves recorded stream events, at their recorded offsets unless the cassette is fast"""
+
+    def __init__(self, events, cassette, started):
+        self.events = events
+        self.cassette = cassette
+        self.started = started
+        self.closed = False
+
+    def __iter__(self):
+        for offset, event in self.events:
+            self.cassette.wait(self.started + offset - time.perf_counter())
+            if self.closed:
+                return
+            yield event
+
+    def close(self):
+        self.closed = True
+
+
+# ============================================================================
+# WRAPPERS
+# ============================================================================
+
+def record_error(error):
+    """The recordable form of an error the pipeline handles, or None"""
+    if isinstance(error, ClientError):
+        return {"type": "ClientError", "response": error.response, "operation": error.operation_name}
+    if isinstance(error, StageTimeout):
+        return {"type": "StageTimeout", "message": str(error)}
+    return None
+
+
+def raise_error(error):
+    if error["type"] == "ClientError":
+        raise ClientError(error["response"], error["operation"])
+    raise StageTimeout(error["message"])
+
+
+# Wraps a function so its calls are recorded or replayed
+def wrap(cassette, function, original, describe, encode, decode):
+    """
+    describe(*args, **kwargs) returns the call's (request, label, streaming),
+    encode turns a result into JSON, decode turns it back.
+    """
+    def recorded(*args, **kwargs):
+        request, label, streaming = describe(*args, **kwargs)
+        key = cassette.key(function, request)
+        started = time.perf_counter()
+
+        if cassette.mode == "replay":
+            entry = cassette.lookup(function, key, label)
+            cassette.wait(entry["seconds"])
+            if "error" in entry:
+                raise_error(entry["error"])
+            if "events" in entry:
+                return {"stream": ReplayStream(entry["events"], cassette, started)}
+            return decode(entry["response"])
+
+        try:
+            result = original(*args, **kwargs)
+        except Exception as e:
+            error = record_error(e)
+            if error:
+                cassette.record(function, key, label, time.perf_counter() - started, error=error)
+            raise
+        seconds = time.perf_counter() - started
+
+        if streaming:
+            def on_finish(events):
+                cassette.record(function, key, label, seconds, events=events)
+            return {**result, "stream": RecordingStream(result["stream"], started, on_finish)}
+        cassette.record(function, key, label, seconds, response=encode(result))
+        return result
+
+    recorded.__wrapped__ = original
+    return recorded
+
+
+def describe_converse(modelId, chatHistory, config=None, system=None, streaming=False, deadline=None, tool_config=None):
+    request = {"modelId": modelId, "messages": chatHistory, "inferenceConfig": config, "system": system,
+               "toolConfig": tool_config, "streaming": streaming}
+    return request, f"{modelId} ({len(chatHistory)} messages)", streaming
+
+
+def encode_converse(response):
+    return {name: value for name, value in response.items() if name != "ResponseMetadata"}
+
+
+def describe_knowledge_base(question, deadline=None):
+    return {"question": question}, question, False
+
+
+def encode_results(results):
+    if isinstance(results, ResultTable):
+        return {"table": {"columns": results.columns, "types": results.types, "values": results.values, "sql": results.sql}}
+    return {"text": results}
+
+
+def decode_results(data):
+    return ResultTable(**data["table"]) if "table" in data else data["text"]
+
+
+def describe_s3_json(bucket_name=None, file_key=None):
+    return {"bucket_name": bucket_name, "file_key": file_key}, f"{bucket_name or 'default bucket'}/{file_key or 'template'}", False
+
+
+def describe_schema_artifact():
+    return {}, "schema artifact", False
+
+
+def encode_artifact(artifact):
+    if artifact is None:
+        return None
+    return {
+        "hash": artifact.hash,
+        "version": artifact.version,
+        "schema": artifact.schema,
+        "renderings": artifact.renderings,
+        "value_index": artifact.value_index,
+        "token_costs": artifact.token_costs,
+        "compiled_at": artifact.compiled_at
+    }
+
+
+def identity(value):
+    return value
+
+
+# ============================================================================
+# INSTALLATION
+# ============================================================================
+
+def install(path, mode, speed="recorded"):
+    """Record or replay the pipeline's model, knowledge base and S3 calls through a cassette file"""
+    uninstall()
+    cassette = Cassette(path, mode, speed)
+
+    def decode_artifact(data):
+        # The same artifact object every time, so caches keyed on it stay warm
+        if data is None:
+            return None
+        if data["hash"] not in cassette.artifacts:
+            cassette.artifacts[data["hash"]] = register_artifact(SchemaArtifact(data))
+        return cassette.artifacts[data["hash"]]
+
+    converse = wrap(cassette, "converse_with_model", utilities.converse_with_model, describe_converse, encode_converse, identity)
+    knowledge_base = wrap(cassette, "execute_knowledge_base_query", utilities.execute_knowledge_base_query,
+                          describe_knowledge_base, encode_results, decode_results)
+    s3_json = wrap(cassette, "download_s3_json", utilities.download_s3_json, describe_s3_json, identity, identity)
+    artifact = wrap(cassette, "get_schema_artifact", schema_store.get_schema_artifact, describe_schema_artifact,
+                    encode_artifact, decode_artifact)
+
+    patches = [
+        (utilities, "converse_with_model", converse),
+        (utilities, "execute_knowledge_base_query", knowledge_base),
+        (orchestration, "execute_knowledge_base_query", knowledge_base),
+        (utilities, "download_s3_json", s3_json),
+        (schema_store, "get_schema_artifact", artifact),
+    ]
+    for module, name, function in patches:
+        _installed[(module, name)] = getattr(module, name)
+        setattr(module, name, function)
+
+    logger.custom(f" Cassette {path} installed in {mode} mode" + (f" ({speed})" if mode == "replay" else ""))
+    return cassette
+
+
+def uninstall():
+    """Restore the real calls"""
+    for (module, name), original in _installed.items():
+        setattr(module, name, original)
+    _installed.clear()
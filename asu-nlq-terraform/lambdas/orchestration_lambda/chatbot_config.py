@@ -1,10 +1,12 @@
+import json
 import logging
 from prompts import (
     final_response, 
     classify, 
     no_sql, 
     create_question, 
-    error
+    error,
+    schema_lookup
 ) 
 import constants  # This configures logging
 from TestingTimer import timer
@@ -32,6 +34,51 @@ create_question_id = "us.amazon.nova-pro-v1:0"
 # Model ID for error handling (default case)
 error_id = "us.amazon.nova-pro-v1:0"
 
+# Smaller, faster model used when a stage's primary model is slow or unavailable
+fallback_id = "us.amazon.nova-lite-v1:0"
+
+
+# ============================================================================
+# MODEL ROUTING TABLE
+# ============================================================================
+
+# Ordered models per stage (primary first, then fallbacks) and whether
+# non-streaming calls to the stage may be hedged against the first fallback.
+# Hedging sends a second paid request when the primary is slow, so it is off
+# unless the MODEL_ROUTES environment variable turns it on for a stage, e.g.
+# {"classify": {"models": ["us.amazon.nova-pro-v1:0", "us.amazon.nova-lite-v1:0"], "hedge": true}}
+model_routes = {
+    "final_response": {"models": [final_response_id, fallback_id], "hedge": False},
+    "classify": {"models": [classify_id, fallback_id], "hedge": False},
+    "no_sql": {"models": [no_sql_id, fallback_id], "hedge": False},
+    "create_question": {"models": [create_question_id, fallback_id], "hedge": False},
+}
+
+# Percentile of the primary route's latency after which a hedged request is sent
+hedge_percentile = 95
+
+# Samples a route needs before its own percentile is trusted for hedging
+hedge_min_samples = 20
+
+# Hedge delay (seconds) used until a route has enough samples
+hedge_default_delay = 4.0
+
+if constants.MODEL_ROUTES:
+    try:
+        route_overrides = json.loads(constants.MODEL_ROUTES)
+        if not isinstance(route_overrides, dict):
+            raise ValueError("MODEL_ROUTES must be an object of stage routes")
+        for stage, route in route_overrides.items():
+            models = route.get("models") if isinstance(route, dict) else None
+            if not isinstance(models, list) or not models or not all(isinstance(model, str) and model for model in models):
+                raise ValueError(f"route for {stage} needs a non-empty list of model IDs in 'models'")
+            if not isinstance(route.get("hedge", False), bool):
+                raise ValueError(f"'hedge' of the {stage} route must be true or false")
+        model_routes.update(route_overrides)
+        logger.info("Model routes overridden for: %s", list(route_overrides))
+    except (json.JSONDecodeError, TypeError, ValueError) as e:
+        logger.error(f"Invalid MODEL_ROUTES configuration, using defaults: {e}")
+
 
 # ============================================================================
 # TEMPERATURE DEFINITIONS
@@ -52,6 +99,384 @@ create_question_temperature = 0.1
 # Default temperature for unknown types
 default_temperature = 0.3
 
+
+# ============================================================================
+# OUTPUT LENGTH DEFINITIONS
+# ============================================================================
+
+# Maximum output tokens for final response generation
+final_response_max_tokens = 2048
+
+# Maximum output tokens for classification tasks (label plus one short sentence)
+classify_max_tokens = 150
+
+# Maximum output tokens for NoSQL query handling
+no_sql_max_tokens = 1500
+
+# Maximum output tokens for creating specific questions for SQL generation
+create_question_max_tokens = 400
+
+# Default maximum output tokens for unknown types
+default_max_tokens = 1000
+
+# Stop sequences for stages answering with JSON text - ends output at the closing code fence
+json_text_stop_sequences = ["\n```"]
+
+
+# ============================================================================
+# STRUCTURED OUTPUT DEFINITIONS
+# ============================================================================
+
+# Output mode per non-streaming stage:
+# "tool" forces an answer through a tool call whose input follows a JSON schema,
+# "text" / "text_compact" ask for a JSON object in plain text
+classify_output_mode = "tool"
+create_question_output_mode = "tool"
+
+# Tool used to record the classification (label first, reasoning optional and short)
+classify_tool = {
+    "toolSpec": {
+        "name": "record_classification",
+        "description": "Record the classification of the user question.",
+        "inputSchema": {
+            "json": {
+                "type": "object",
+                "properties": {
+                    "classification": {
+                        "type": "string",
+                        "enum": ["SQL_Query", "NoSQL_Query", "Dangerous"]
+                    },
+                    "reasoning": {
+                        "type": "string",
+                        "description": "One short sentence explaining the classification."
+                    }
+                },
+                "required": ["classification"]
+            }
+        }
+    }
+}
+
+# Tool used to record the SQL-eeze questions
+create_question_tool = {
+    "toolSpec": {
+        "name": "record_improved_questions",
+        "description": "Record the SQL-eeze statements for the user question.",
+        "inputSchema": {
+            "json": {
+                "type": "object",
+                "properties": {
+                    "improved_questions": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "minItems": 1
+                    }
+                },
+                "required": ["improved_questions"]
+            }
+        }
+    }
+}
+
+
+# ============================================================================
+# SCHEMA VALUE LOOKUP DEFINITIONS
+# ============================================================================
+
+# How the schema's possible_values reach each non-streaming stage:
+# "inline" puts every list in the prompt, "lookup" sends column names and descriptions only
+# and lets the model call the lookup_values tool for exact values.
+# Streaming stages always use "inline". "lookup" can add up to schema_lookup_max_rounds
+# model calls per request, so it stays opt-in until a live latency comparison
+# (Utilities/benchmark_schema_lookup.py --live) shows it is a net win.
+classify_schema_value_mode = "inline"
+create_question_schema_value_mode = "inline"
+
+# Most values returned by one lookup
+schema_lookup_max_results = 15
+
+# Most lookup rounds before the model must answer
+schema_lookup_max_rounds = 3
+
+# Tool the model calls to look up exact schema values
+schema_lookup_tool = {
+    "toolSpec": {
+        "name": "lookup_values",
+        "description": "Find the exact possible values of a schema column that match the user's wording.",
+        "inputSchema": {
+            "json": {
+                "type": "object",
+                "properties": {
+                    "column": {
+                        "type": "string",
+                        "description": "Exact column_name from the schema."
+                    },
+                    "query": {
+                        "type": "string",
+                        "description": "The user's wording for the value, e.g. 'fall 22' or 'engineering'. Empty lists the first values."
+                    }
+                },
+                "required": ["column"]
+            }
+        }
+    }
+}
+
+
+# ============================================================================
+# SCHEMA FORMAT DEFINITIONS
+# ============================================================================
+
+# Text format of the schema in each stage's prompt (see schema_render.py):
+# "json" (indented), "json_min", "ddl" (CREATE TABLE with comments), "outline" (YAML-like) or "tsv".
+# Utilities/benchmark_schema_formats.py compares their size and classification agreement.
+final_response_schema_format = "json_min"
+classify_schema_format = "json_min"
+no_sql_schema_format = "json_min"
+create_question_schema_format = "json_min"
+default_schema_format = "json"
+
+
+# ============================================================================
+# SCHEMA ARTIFACT DEFINITIONS
+# ============================================================================
+
+# Compiled schema artifacts (Utilities/schema_manager.py --compile) are found through a small
+# pointer object next to the template: "<TEMPLATE_NAME>.pointer.json" -> {"hash", "artifact"}.
+# Without a pointer the raw template is downloaded on every request.
+schema_pointer_suffix = ".pointer.json"
+
+# Seconds between checks of the pointer object for a newly published artifact
+schema_pointer_check_interval = 30
+
+
+# ============================================================================
+# TIME BUDGET DEFINITIONS
+# ============================================================================
+
+# Maximum time (seconds) a single chat request may take, capped further by the Lambda's remaining time
+request_budget = 180
+
+# Time (seconds) kept back from the Lambda's remaining time to report a timeout to the client
+deadline_safety_margin = 10
+
+# Time budget (seconds) for final response generation (streaming)
+final_response_budget = 90
+
+# Time budget (seconds) for classification tasks
+classify_budget = 15
+
+# Time budget (seconds) for NoSQL query handling (streaming)
+no_sql_budget = 90
+
+# Time budget (seconds) for creating specific questions for SQL generation
+create_question_budget = 15
+
+# Time budget (seconds) for knowledge base retrieval
+knowledge_base_budget = 30
+
+# Default time budget (seconds) for unknown types
+default_budget = 30
+
+# Minimum time (seconds) worth starting a model or knowledge base call with
+minimum_stage_budget = 1
+
+# Appended to a streamed answer that is cut off by its time budget
+truncated_response_notice = "\n\n*This answer was cut short because it took too long. Please try again for a complete answer.*"
+
+# Used in place of knowledge base results when retrieval runs out of time
+knowledge_base_timeout_message = "The data lookup took too long and was cancelled. Please have the user try again or ask a simpler question."
+
+
+# ============================================================================
+# RESULT SET DEFINITIONS
+# ============================================================================
+
+# Most result rows shown to the final response model
+result_max_rows = 50
+
+# Approximate token budget for the rendered result set in the final prompt
+result_max_tokens = 1500
+
+# Rows listed in the top-k summary when a result set is capped
+result_top_k = 10
+
+# Rendering of result sets in prompts: "csv" or "markdown"
+result_format = "csv"
+
+# Send result rows to the client as "data" frames before the prose answer streams
+data_frames_enabled = True
+
+# Most rows sent to the client in data frames (the rest is flagged as truncated)
+data_frame_max_rows = 500
+
+# Largest encoded data frame in bytes (API Gateway WebSocket frames are limited to 32KB)
+data_frame_max_bytes = 28000
+
+# Include the generated SQL in the first data frame
+data_frame_include_sql = False
+
+# ============================================================================
+# DETERMINISTIC ANSWER DEFINITIONS
+# ============================================================================
+
+# Answer simple single-row knowledge base results from templates instead of the final response model
+deterministic_answers_enabled = True
+
+# Widest result (columns) still answered from a template
+deterministic_max_columns = 4
+
+# Longest result (rows) still answered from a template
+deterministic_max_rows = 5
+
+# Template for a single number when the question has no filters
+scalar_answer_template = "The answer to your question is **{value}**."
+
+# Template for a single number, naming the filters it was computed for
+scalar_answer_filters_template = "For {filters}, the answer to your question is **{value}**."
+
+# Template for a small result table (markdown)
+table_answer_template = "Here is what I found:\n\n{table}"
+
+# Answer for a small result table the client already received in data frames
+table_sent_answer_template = "Here is what I found, shown in the table above."
+
+# ============================================================================
+# QUESTION CANONICALIZER DEFINITIONS
+# ============================================================================
+
+# Map simple count questions onto schema values locally, skipping the create_question model call
+canonicalizer_enabled = True
+
+# Refine questions with the create_question model; when off, the user's question goes to the knowledge base as asked
+create_question_enabled = True
+
+# Share of the question's content words that must map to schema values before the model is skipped
+canonicalizer_min_coverage = 1.0
+
+# Earlier user messages searched for slots when the question is a follow-up ("what about ...")
+canonicalizer_history_messages = 2
+
+# Aggregate used for "how many" questions - each row is a group of students with a count
+canonicalizer_count_expression = 'SUM "Students"'
+
+# Column holding the time period, defaulted to its latest value when the question names none
+canonicalizer_time_column = "Term"
+
+# When one phrase matches values of several columns, the earliest column in this list wins.
+# Matches spread only over unlisted columns are ambiguous and left to the model.
+canonicalizer_column_priority = [
+    "Term",
+    "Undergraduate_or_Graduate",
+    "College",
+    "Campus",
+    "Gender",
+    "Residency",
+    "FT_PT",
+    "STEM_Discipline",
+    "Minority_Status",
+    "New_Undergraduate_Status",
+    "Student_Level",
+    "Degree_Level",
+    "Campus_or_Digital",
+    "Major",
+    "STEM_Category",
+    "Academic_Level",
+    "Department"
+]
+
+# Extra phrasings per schema value, by column
+canonicalizer_synonyms = {
+    "Undergraduate_or_Graduate": {
+        "Undergraduate": ["undergrad", "undergrads", "undergraduate students", "undergrad students"],
+        "Graduate": ["grad", "grads", "grad students", "graduate students", "postgrad", "postgrads"]
+    },
+    "Gender": {
+        "Female": ["female students", "females", "women", "woman"],
+        "Male": ["male students", "males", "men", "man"]
+    },
+    "Residency": {
+        "Resident": ["in state", "residents", "arizona residents"],
+        "Non-Resident": ["out of state", "nonresident", "nonresidents", "non residents"]
+    },
+    "FT_PT": {
+        "Full-Time": ["full time", "fulltime"],
+        "Part-Time": ["part time", "parttime"]
+    },
+    "Campus": {
+        "Downtown Phoenix": ["downtown", "dtphx"],
+        "Digital Immersion": ["online", "asu online"],
+        "Polytechnic": ["poly"]
+    },
+    "College": {
+        "Engineering": ["fulton", "fulton engineering"],
+        "Business": ["wp carey", "w p carey"],
+        "Liberal Arts and Sciences": ["clas"],
+        "Journalism": ["cronkite"],
+        "Law": ["law school"]
+    },
+    "STEM_Discipline": {
+        "STEM": ["stem students", "stem majors"],
+        "Non-STEM": ["non stem", "nonstem"]
+    },
+    "Student_Level": {
+        "Freshman": ["freshmen"],
+        "Sophomore": ["sophomores"],
+        "Junior": ["juniors"],
+        "Senior": ["seniors"]
+    },
+    "New_Undergraduate_Status": {
+        "First-Time Freshman": ["first time freshmen", "first year freshmen"],
+        "New Transfer": ["new transfers", "transfer students"]
+    }
+}
+
+# Last words of schema values that get no automatic plural because the plural means something
+# else: "graduates" are people who graduated, not graduate students
+canonicalizer_no_plural_words = ["graduate"]
+
+# Order of the seasons of a year in time period values ("Spring 2022" comes before "Fall 2022")
+canonicalizer_season_order = ["winter", "spring", "summer", "fall"]
+
+# Abbreviations expanded in both schema values and questions before matching
+canonicalizer_abbreviations = {
+    "engr": "engineering",
+    "comm": "community",
+    "dev": "development",
+    "mgmt": "management",
+    "intl": "international",
+    "univ": "university",
+    "sci": "science",
+    "cs": "computer science"
+}
+
+# Words that signal a question needs more than a filtered count (grouping, comparison, relative time)
+canonicalizer_blocking_words = [
+    "by", "per", "each", "compare", "compared", "comparison", "versus", "vs", "between",
+    "change", "changed", "growth", "grew", "increase", "decrease", "trend", "over", "since",
+    "percent", "percentage", "ratio", "share", "proportion", "average", "avg", "mean", "median",
+    "most", "least", "top", "highest", "lowest", "rank", "breakdown", "or", "not", "without",
+    "excluding", "except", "last", "previous", "next", "ago", "list", "which"
+]
+
+# Words that ask for a count
+canonicalizer_count_words = ["how many", "number of", "count", "total", "enrollment", "headcount"]
+
+# Words that carry no filter and are ignored when measuring coverage
+canonicalizer_stop_words = [
+    "a", "an", "the", "of", "in", "at", "for", "on", "to", "from", "and", "with", "during", "as",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "have", "has", "had",
+    "there", "what", "whats", "s", "how", "many", "number", "count", "total", "all", "overall",
+    "enrollment", "enrolled", "enrolling", "headcount", "students", "student", "people",
+    "asu", "arizona", "state", "university", "term", "semester", "year",
+    "please", "tell", "me", "show", "give", "i", "we", "you", "can", "could", "would", "like",
+    "know", "find", "get", "about", "currently", "current", "latest", "recent", "recently",
+    "now", "this", "who", "that", "so", "far", "same", "also", "then", "if"
+]
+
+# Phrases that start a follow-up question reusing the previous question's filters
+canonicalizer_follow_up_phrases = ["what about", "how about", "and for", "and in", "same for", "what if"]
+
 # ============================================================================
 # INFO MESSAGES
 # ============================================================================
@@ -82,6 +507,11 @@ info_messages = {
         "Structuring your request for accurate processing . . ."
     ],
     
+    "timeout": [
+        "This is taking longer than expected. Please try again in a moment.",
+        "Sorry, that took too long to answer. Please try again.",
+    ],
+
     "querying_sql": [
         "We're querying the database for your question (Up to 10 seconds) . . .",
         "Searching our database for relevant information (Up to 10 seconds) . . .",
@@ -111,7 +541,7 @@ def get_prompt(type, message=None, schema=None, chatHistory=None, reasoning=None
     Returns the appropriate prompt based on the specified type.
     Formats prompts with provided parameters for AI model consumption.
     """
-    logger.info(f"Getting prompt for type: {type}")
+    logger.info("Getting prompt for type: %s", type)
     
     try:
         prompt = ""
@@ -119,16 +549,22 @@ def get_prompt(type, message=None, schema=None, chatHistory=None, reasoning=None
             case "final_response":
                 prompt = final_response.final_response_prompt.format(results=results, schema=schema, unanswered_questions=unanswered_questions)
             case "classify":
-                prompt = classify.classify_prompt.format(message=message, schema=schema, chatHistory=chatHistory)
+                output_format = classify.classify_output_formats[get_output_mode("classify")]
+                prompt = classify.classify_prompt.format(message=message, schema=schema, chatHistory=chatHistory, output_format=output_format)
             case "no_sql":
                 prompt = no_sql.no_sql_prompt.format(schema=schema, reasoning=reasoning)
             case "create_question":
-                prompt = create_question.create_question_prompt.format(message=message, chatHistory=chatHistory, schema=schema, reasoning=reasoning)
+                output_format = create_question.create_question_output_formats[get_output_mode("create_question")]
+                prompt = create_question.create_question_prompt.format(message=message, chatHistory=chatHistory, schema=schema, reasoning=reasoning, output_format=output_format)
             case _:
                 logger.warning(f"Unknown prompt type: {type}, using error prompt")
                 prompt = error.error_prompt
+
+        # The schema lists no values in lookup mode, explain how to get them
+        if get_schema_value_mode(type) == "lookup":
+            prompt += "\n\n" + schema_lookup.schema_lookup_instructions
         
-        logger.info(f"Prompt retrieved successfully for type: {type}")
+        logger.info("Prompt retrieved successfully for type: %s", type)
         return [
             {
                 "text": prompt
@@ -152,9 +588,9 @@ def get_prompt(type, message=None, schema=None, chatHistory=None, reasoning=None
 def get_config(type):
     """
     Returns configuration settings based on the specified type.
-    Provides temperature and other model parameters for different use cases.
+    Provides temperature, maxTokens and stop sequences for different use cases.
     """
-    logger.info(f"Getting config for type: {type}")
+    logger.info("Getting config for type: %s", type)
     
     try:
         config = {}
@@ -162,26 +598,35 @@ def get_config(type):
             case "final_response":
                 config = {
                     "temperature": final_response_temperature,
+                    "maxTokens": final_response_max_tokens,
                 }
             case "classify":
                 config = {
                     "temperature": classify_temperature,
+                    "maxTokens": classify_max_tokens,
                 }
             case "no_sql":
                 config = {
                     "temperature": no_sql_temperature,
+                    "maxTokens": no_sql_max_tokens,
                 }
             case "create_question":
                 config = {
                     "temperature": create_question_temperature,
+                    "maxTokens": create_question_max_tokens,
                 }
             case _:
                 logger.warning(f"Unknown config type: {type}, using default")
                 config = {
                     "temperature": default_temperature,
+                    "maxTokens": default_max_tokens,
                 }
+
+        # JSON text answers stop at the closing code fence instead of trailing commentary
+        if get_output_mode(type).startswith("text") and type in ("classify", "create_question"):
+            config["stopSequences"] = json_text_stop_sequences
         
-        logger.info(f"Config retrieved for type: {type}")
+        logger.info("Config retrieved for type: %s", type)
         return config
         
     except Exception as e:
@@ -192,30 +637,145 @@ def get_config(type):
 # This function retrieves the appropriate model ID based on the type of interaction.
 def get_id(type):
     """
-    Returns the appropriate model ID based on the specified type.
-    Maps interaction types to their corresponding AI models.
+    Returns the primary model ID based on the specified type.
+    Maps interaction types to the first model of their route.
     """
-    logger.info(f"Getting model ID for type: {type}")
+    logger.info("Getting model ID for type: %s", type)
     
     try:
-        model_id = ""
-        match type:
-            case "final_response":
-                model_id = final_response_id
-            case "classify":
-                model_id = classify_id
-            case "no_sql":
-                model_id = no_sql_id  
-            case "create_question":
-                model_id = create_question_id
-            case _:
-                logger.warning(f"Unknown model type: {type}, using error model")
-                model_id = error_id
+        model_id = get_route(type)["models"][0]
         
-        logger.info(f"Model ID retrieved for type: {type}")
+        logger.info("Model ID retrieved for type: %s", type)
         return model_id
         
     except Exception as e:
         logger.error(f"Failed to get model ID for type {type}: {e}")
         raise
 
+
+# This function retrieves the model route based on the type of interaction.
+def get_route(type):
+    """
+    Returns the route (ordered models and hedging flag) for the specified type.
+    Unknown types are routed to the error model without fallbacks.
+    """
+    logger.info("Getting model route for type: %s", type)
+
+    route = model_routes.get(type)
+    if route is None:
+        logger.warning(f"Unknown route type: {type}, using error model")
+        return {"models": [error_id], "hedge": False}
+
+    return {"models": list(route["models"]), "hedge": route.get("hedge", False)}
+
+
+# This function retrieves the time budget based on the type of interaction.
+def get_budget(type):
+    """
+    Returns the time budget in seconds for the specified pipeline stage.
+    Used to derive stage deadlines and botocore read timeouts.
+    """
+    logger.info("Getting time budget for type: %s", type)
+
+    match type:
+        case "final_response":
+            return final_response_budget
+        case "classify":
+            return classify_budget
+        case "no_sql":
+            return no_sql_budget
+        case "create_question":
+            return create_question_budget
+        case "knowledge_base":
+            return knowledge_base_budget
+        case _:
+            logger.warning(f"Unknown budget type: {type}, using default")
+            return default_budget
+
+
+# This function retrieves the output mode based on the type of interaction.
+def get_output_mode(type):
+    """
+    Returns the output mode ("tool", "text" or "text_compact") for the specified type.
+    Streaming stages always answer in plain text.
+    """
+    match type:
+        case "classify":
+            return classify_output_mode
+        case "create_question":
+            return create_question_output_mode
+        case _:
+            return "text"
+
+
+# This function retrieves the schema value mode based on the type of interaction.
+def get_schema_value_mode(type):
+    """
+    Returns "inline" or "lookup" for the specified type.
+    Streaming stages always get their schema values inline.
+    """
+    match type:
+        case "classify":
+            return classify_schema_value_mode
+        case "create_question":
+            return create_question_schema_value_mode
+        case _:
+            return "inline"
+
+
+# This function retrieves the schema format based on the type of interaction.
+def get_schema_format(type):
+    """
+    Returns the schema rendering format for the specified type's prompt.
+    """
+    match type:
+        case "final_response":
+            return final_response_schema_format
+        case "classify":
+            return classify_schema_format
+        case "no_sql":
+            return no_sql_schema_format
+        case "create_question":
+            return create_question_schema_format
+        case _:
+            return default_schema_format
+
+
+# This function retrieves the Converse tool configuration based on the type of interaction.
+def get_tool_config(type, force_answer=False):
+    """
+    Returns the toolConfig for the specified type, or None when the stage uses no tools.
+    In tool output mode the answer tool is forced, unless the stage may still look up
+    schema values first; force_answer rules out further lookups.
+    """
+    match type:
+        case "classify":
+            tool = classify_tool
+        case "create_question":
+            tool = create_question_tool
+        case _:
+            tool = None
+
+    if get_output_mode(type) != "tool":
+        tool = None
+    lookup = get_schema_value_mode(type) == "lookup"
+
+    if not tool and not lookup:
+        return None
+
+    if lookup:
+        logger.info("Using schema lookup tool for type: %s", type)
+        tools = [schema_lookup_tool] + ([tool] if tool else [])
+        if not tool:
+            tool_choice = {"auto": {}}
+        elif force_answer:
+            tool_choice = {"tool": {"name": tool["toolSpec"]["name"]}}
+        else:
+            tool_choice = {"any": {}}
+        return {"tools": tools, "toolChoice": tool_choice}
+
+    logger.info("Using structured output tool for type: %s", type)
+    return {
+        "tools": [tool],
+        "toolChoice": {"tool": {"name": tool["toolSpec"]["name"]}}
+    }
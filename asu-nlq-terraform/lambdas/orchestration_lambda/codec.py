@@ -0,0 +1,172 @@
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, TypedDict
+import constants  # This configures logging
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# JSON BACKEND
+# ============================================================================
+# orjson or msgspec when packaged with the Lambda (e.g. in a layer), otherwise
+# the standard library. JSON_CODEC pins one; "auto" takes the fastest available.
+
+def _load_backend(requested):
+    """Import the requested JSON backend, or the fastest available one for "auto" """
+    candidates = ("orjson", "msgspec", "json") if requested == "auto" else (requested,)
+    for name in candidates:
+        try:
+            if name == "orjson":
+                import orjson
+                return name, orjson
+            if name == "msgspec":
+                import msgspec
+                return name, msgspec
+            if name == "json":
+                return name, json
+        except ImportError:
+            if requested != "auto":
+                logger.warning(f"JSON codec {name} is not installed, using json")
+    return "json", json
+
+
+BACKEND, _module = _load_backend(constants.JSON_CODEC)
+
+
+def _default(value):
+    """Encode types the model, database and schema code hand us that JSON has no type for"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if BACKEND == "orjson":
+    DECODE_ERRORS = (_module.JSONDecodeError,)
+
+    def dumps_bytes(value):
+        return _module.dumps(value, default=_default)
+
+    def loads(data):
+        return _module.loads(data)
+
+elif BACKEND == "msgspec":
+    DECODE_ERRORS = (_module.DecodeError,)
+    _encoder = _module.json.Encoder(enc_hook=_default, decimal_format="number")
+    _decoder = _module.json.Decoder()
+
+    def dumps_bytes(value):
+        return _encoder.encode(value)
+
+    def loads(data):
+        return _decoder.decode(data)
+
+else:
+    DECODE_ERRORS = (json.JSONDecodeError,)
+
+    def dumps_bytes(value):
+        return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+
+dumps_bytes.__doc__ = "Compact UTF-8 JSON of a value"
+loads.__doc__ = "Parse JSON from str or bytes"
+
+
+def dumps(value):
+    """Compact JSON of a value as text"""
+    return dumps_bytes(value).decode("utf-8")
+
+
+# ============================================================================
+# CHAT REQUEST DECODING
+# ============================================================================
+# The WebSocket body is decoded and validated once at ingress. Messages stay in
+# the Bedrock converse shape so they are passed on without conversion.
+
+CHAT_ROLES = ("user", "assistant")
+
+
+class ContentBlock(TypedDict):
+    text: str
+
+
+class ChatMessage(TypedDict):
+    role: str
+    content: List[ContentBlock]
+
+
+class InvalidRequest(ValueError):
+    """The request body is not a valid chat request"""
+
+
+if BACKEND == "msgspec":
+    from typing import Literal
+
+    class _ContentBlock(_module.Struct):
+        text: str
+
+    class _ChatMessage(_module.Struct):
+        role: Literal["user", "assistant"]
+        content: List[_ContentBlock]
+
+    class _ChatRequest(_module.Struct):
+        messages: List[_ChatMessage]
+
+    _request_decoder = _module.json.Decoder(_ChatRequest)
+
+    def _decode_messages(body):
+        try:
+            request = _request_decoder.decode(body)
+        except _module.ValidationError as e:
+            raise InvalidRequest(str(e)) from e
+        return [
+            {"role": message.role, "content": [{"text": block.text} for block in message.content]}
+            for message in request.messages
+        ]
+
+else:
+    def _decode_messages(body):
+        request = loads(body)
+        messages = request.get("messages") if isinstance(request, dict) else None
+        if not isinstance(messages, list):
+            raise InvalidRequest("Expected an object with a 'messages' list")
+
+        decoded = []
+        for position, message in enumerate(messages):
+            if not isinstance(message, dict) or message.get("role") not in CHAT_ROLES:
+                raise InvalidRequest(f"Message {position}: role must be one of {CHAT_ROLES}")
+            content = message.get("content")
+            if not isinstance(content, list) or not all(isinstance(block, dict) and isinstance(block.get("text"), str) for block in content):
+                raise InvalidRequest(f"Message {position}: content must be a list of text blocks")
+            decoded.append({"role": message["role"], "content": [{"text": block["text"]} for block in content]})
+        return decoded
+
+
+def decode_chat_request(body) -> List[ChatMessage]:
+    """
+    Decode a WebSocket request body into validated chat messages.
+    Every message keeps only its role and text blocks; the conversation must
+    end with a user message that has text.
+    """
+    try:
+        messages = _decode_messages(body)
+    except DECODE_ERRORS as e:
+        raise InvalidRequest(f"Request body is not valid JSON: {e}") from e
+
+    if not messages:
+        raise InvalidRequest("Request has no messages")
+    for position, message in enumerate(messages):
+        if not message["content"]:
+            raise InvalidRequest(f"Message {position}: content is empty")
+    if messages[-1]["role"] != "user":
+        raise InvalidRequest("The last message must be from the user")
+    return messages
@@ -30,7 +30,17 @@ logging.Logger.custom = custom
 # Logging configuration - change LOG_LEVEL to control all modules
 # Available levels: TIMER_LEVEL, CUSTOM_LEVEL, logging.INFO, logging.WARNING, etc.
 LOG_LEVEL = TIMER_LEVEL  # Change this to control what gets logged
-LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(request_id)s - %(name)s - %(message)s'
+
+# "text" uses LOG_FORMAT; "json" writes one JSON object per record (for Logs Insights)
+LOG_OUTPUT = os.environ.get("LOG_OUTPUT", "text")
+
+# Share of records kept per high-frequency event type (1.0 keeps all, 0 drops all).
+# Kept records carry sample_every so counts can be scaled back up.
+LOG_SAMPLE_RATES = {
+    "frame": 0.01,          # Every frame sent to the client
+    "stream_event": 0.01,   # Every event read from a model stream
+}
 
 def setup_logging():
     """Configure logging for the entire application"""
@@ -40,6 +50,10 @@ def setup_logging():
         force=True  # Override any existing configuration
     )
 
+    # Request correlation, structured output and event sampling
+    from structured_log import install
+    install(LOG_OUTPUT, LOG_FORMAT, LOG_SAMPLE_RATES)
+
 # Call setup when constants is imported
 setup_logging()
 
@@ -65,4 +79,64 @@ if not DATABASE_DESCRIPTIONS_S3_NAME:
 
 KNOWLEDGE_BASE_ID = os.environ.get("KNOWLEDGE_BASE_ID")
 if not KNOWLEDGE_BASE_ID:
-    raise ValueError("KNOWLEDGE_BASE_ID environment variable is required")
\ No newline at end of file
+    raise ValueError("KNOWLEDGE_BASE_ID environment variable is required")
+
+# JSON codec: "auto" uses orjson or msgspec when packaged with the Lambda, else the
+# standard library; "orjson", "msgspec" or "json" pins one
+JSON_CODEC = os.environ.get("JSON_CODEC", "auto")
+
+# Connections each AWS client keeps open; raise it when one process serves many
+# conversations at once (server mode sets it to its concurrency)
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "10"))
+
+# Optional JSON object overriding per-stage model routes in chatbot_config, e.g.
+# {"classify": {"models": ["us.amazon.nova-lite-v1:0", "us.amazon.nova-pro-v1:0"], "hedge": true}}
+MODEL_ROUTES = os.environ.get("MODEL_ROUTES")
+
+# Warm the container during init (schema, caches, clients, connections): "auto" only for
+# provisioned concurrency, where no user waits on init, "true" always, "false" never
+WARM_ON_INIT = os.environ.get("WARM_ON_INIT", "auto")
+
+# ============================================================================
+# PROFILING
+# ============================================================================
+# A request is profiled when its event or WebSocket message body has "profile": true
+# (or a mode name), when its headers carry PROFILE_HEADER (server mode), or by
+# random sampling at PROFILE_SAMPLE_RATE.
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))  # Share of requests profiled (0 disables)
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "sampling")  # "sampling" (collapsed stacks) or "deterministic" (cProfile)
+PROFILE_MODES = ("sampling", "deterministic")
+if PROFILE_MODE not in PROFILE_MODES:
+    raise ValueError(f"PROFILE_MODE must be one of {PROFILE_MODES}")
+
+# Where profiles are written: a local directory or an s3://bucket/prefix
+PROFILE_SINK = os.environ.get("PROFILE_SINK", "/tmp/profiles")
+PROFILE_HEADER = "x-nlq-profile"
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples in sampling mode
+
+# ============================================================================
+# SERVER MODE
+# ============================================================================
+# Used by server.py, which runs the pipeline for many conversations in one
+# long-lived process instead of one Lambda invocation per message.
+
+SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", "8080"))
+SERVER_CONCURRENCY = int(os.environ.get("SERVER_CONCURRENCY", "64"))  # Conversations processed at once
+SERVER_QUEUE_SIZE = int(os.environ.get("SERVER_QUEUE_SIZE", "256"))  # Waiting requests before 503s
+SERVER_QUEUE_URL = os.environ.get("SERVER_QUEUE_URL")  # Optional SQS queue of WebSocket events to consume
+SERVER_SHUTDOWN_GRACE = 30  # Seconds in-flight conversations get to finish on SIGTERM
+# Shared secret callers send as "Authorization: Bearer <token>" to /chat, /chat/stream and
+# /cancel. Without it any caller can post to or close any connection id, so an unset
+# token is only safe on a private network reachable by the gateway alone.
+SERVER_TOKEN = os.environ.get("SERVER_TOKEN")
+
+# ============================================================================
+# BATCH MODE
+# ============================================================================
+# Used by batch.py, which runs a JSONL file of questions or conversations through
+# the pipeline without API Gateway (nightly runs, evaluation, throughput tests).
+
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))  # Conversations processed at once
+BATCH_RATE = float(os.environ.get("BATCH_RATE", "0"))  # Conversations started per second (0 is unlimited)
@@ -0,0 +1,60 @@
+import time
+import logging
+import urllib3
+from botocore.exceptions import ReadTimeoutError, ConnectTimeoutError
+import constants  # This configures logging
+from chatbot_config import get_budget, request_budget, deadline_safety_margin
+
+logger = logging.getLogger(__name__)
+
+# Errors raised by botocore/urllib3 when a budgeted read or connect runs out of time
+TIMEOUT_ERRORS = (ReadTimeoutError, ConnectTimeoutError, urllib3.exceptions.ReadTimeoutError)
+
+
+class StageTimeout(Exception):
+    """Raised when a pipeline stage runs past its time budget"""
+    pass
+
+
+class Deadline:
+    """
+    Absolute point in time by which a request (or a stage of it) must finish.
+    Stage deadlines are derived from the request deadline and never outlive it.
+    """
+
+    def __init__(self, seconds, parent=None):
+        expires_at = time.monotonic() + max(seconds, 0)
+        if parent is not None:
+            expires_at = min(expires_at, parent.expires_at)
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_context(cls, context, budget=request_budget):
+        """
+        Build the request deadline from the Lambda context's remaining time,
+        keeping a safety margin to report a timeout to the client. budget caps
+        it (pass float("inf") for an invocation that runs many requests).
+        """
+        seconds = budget
+        try:
+            remaining = context.get_remaining_time_in_millis() / 1000
+            seconds = min(seconds, remaining - deadline_safety_margin)
+        except AttributeError:
+            logger.warning("No Lambda context available, using the default request budget")
+
+        logger.info("Request deadline set to %.1fs", seconds)
+        return cls(seconds)
+
+    def remaining(self):
+        """Seconds left before the deadline (never negative)"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self):
+        """True once the deadline has passed"""
+        return time.monotonic() >= self.expires_at
+
+    def for_stage(self, stage):
+        """Return a child deadline limited by the stage's configured budget"""
+        stage_deadline = Deadline(get_budget(stage), parent=self)
+        logger.info("Stage '%s' budget: %.1fs", stage, stage_deadline.remaining())
+        return stage_deadline
@@ -1,14 +1,21 @@
 import logging
-import boto3
-import json
-import traceback
 import constants  # This configures logging
+from codec import dumps_bytes, dumps
 from orchestration import orchestrate
+from utilities import close_connection, closed_connections, get_lambda_client
+from deadline import Deadline
 from botocore.exceptions import ClientError
 from TestingTimer import timer
+from structured_log import bind_request
+from profiling import profile_mode, RequestProfile
+from warmup import is_warmup_event, warm_container, init_container
+from batch import run_batch_event
 
 logger = logging.getLogger(__name__)
 
+# Snapshot hooks, and warming during init where no user is waiting on it
+init_container()
+
 
 # the main entry point for the AWS Lambda function
 def lambda_handler(event, context):
@@ -17,14 +24,39 @@ def lambda_handler(event, context):
     Handles both synchronous responses and asynchronous background processing.
     """
     timer.reset()  # Reset the timer for this execution
+    closed_connections.clear()  # Connections closed during earlier invocations of this container
+
+    # Correlate logs of the front invocation and its background invocation under one request id
+    request_id = (event or {}).get('request_id') or getattr(context, 'aws_request_id', None)
+    bind_request(request_id, (event or {}).get('requestContext', {}).get('connectionId'))
     logger.timer(timer.checkpoint("Lambda handler started"))
     logger.info("Lambda handler started")
     
     try:
+        # Handle warmup pings (scheduler or deployment hooks) - prime the container, nothing else
+        if event and is_warmup_event(event):
+            summary = warm_container()
+            logger.timer(timer.checkpoint("Lambda warmup completed"))
+
+            return {"statusCode": 200, "body": dumps(summary)}
+
+        # Handle batch runs (direct or scheduled invocations) - no WebSocket involved
+        if event and event.get('batch'):
+            # The whole invocation is the batch's budget, not one request's
+            summary = run_batch_event(event['batch'], Deadline.from_context(context, budget=float("inf")))
+            logger.timer(timer.checkpoint("Lambda batch completed"))
+
+            return {"statusCode": 200, "body": dumps(summary)}
+
         # Handle background processing mode
         if event.get('background_processing'):
             logger.info("Starting background processing")
-            result = orchestrate(event)
+            mode = profile_mode(event) if event.get('profile') else None
+            if mode:
+                with RequestProfile(request_id, mode):
+                    result = orchestrate(event, deadline=Deadline.from_context(context))
+            else:
+                result = orchestrate(event, deadline=Deadline.from_context(context))
             logger.info("Background processing completed")
             logger.timer(timer.checkpoint("Lambda handler completed"))
 
@@ -34,35 +66,46 @@ def lambda_handler(event, context):
         if not event:
             logger.error("Empty event received")
             return {"statusCode": 400, "body": "Invalid event"}
+
+        # Handle client cancel requests - closing the connection stops the background work
+        if event.get('requestContext', {}).get('routeKey') == 'cancel':
+            logger.info("Cancel request received")
+            close_connection(event['requestContext']['connectionId'])
+            logger.timer(timer.checkpoint("Lambda cancel request handled"))
+
+            return {"statusCode": 200, "body": "Request cancelled"}
         
         # Initiate asynchronous processing
         logger.info("Initiating async processing")
-        lambda_client = boto3.client('lambda')
+        lambda_client = get_lambda_client()
         
         # Create background event
         background_event = event.copy()
         background_event['background_processing'] = True
+        background_event['request_id'] = request_id
+        # Decided once here (flag, header or sample) so the background invocation only reads it
+        background_event['profile'] = profile_mode(event)
         
         # Invoke lambda asynchronously for background processing
         response = lambda_client.invoke(
             FunctionName=context.function_name,
             InvocationType='Event',
-            Payload=json.dumps(background_event)
+            Payload=dumps_bytes(background_event)
         )
         
-        logger.info(f"Async invocation initiated with status: {response['StatusCode']}")
+        logger.info("Async invocation initiated with status: %s", response['StatusCode'])
         logger.timer(timer.checkpoint("Lambda Async processing initiated"))
 
         return {"statusCode": 202, "body": "Processing initiated"}
         
     except ClientError as e:
         logger.error(f"AWS Client Error: {e}")
-        logger.debug(f"ClientError traceback: {traceback.format_exc()}")
+        logger.debug("ClientError traceback", exc_info=True)
         return {"statusCode": 500, "body": "Service error"}
         
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
-        logger.debug(f"Unexpected error traceback: {traceback.format_exc()}")
+        logger.debug("Unexpected error traceback", exc_info=True)
         return {"statusCode": 500, "body": "Internal error"}
     
     
\ No newline at end of file
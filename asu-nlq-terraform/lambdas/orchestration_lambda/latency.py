@@ -0,0 +1,74 @@
+import math
+import logging
+import threading
+from bisect import bisect_left
+import constants  # This configures logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the histogram buckets: 50ms growing by 25% per bucket up to ~5 minutes
+BUCKET_BOUNDS = [0.05 * (1.25 ** i) for i in range(40)]
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram.
+    Cheap to record into and good enough for percentiles used by hedging and logs.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        """Add one latency sample (seconds)"""
+        with self.lock:
+            self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+
+    def percentile(self, p):
+        """Return the bucket upper bound that covers the p-th percentile, or None if empty"""
+        with self.lock:
+            if self.count == 0:
+                return None
+
+            rank = max(math.ceil(p / 100 * self.count), 1)
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= rank:
+                    return BUCKET_BOUNDS[min(index, len(BUCKET_BOUNDS) - 1)]
+
+    def mean(self):
+        """Mean latency in seconds, or None if empty"""
+        with self.lock:
+            return self.total / self.count if self.count else None
+
+    def summary(self):
+        """One-line description of the histogram for logs"""
+        if self.count == 0:
+            return "no samples"
+        return (f"n={self.count} mean={self.total / self.count:.3f}s "
+                f"p50<={self.percentile(50):.3f}s p95<={self.percentile(95):.3f}s")
+
+
+# Histograms for every route seen by this container, keyed by "stage:model"
+histograms = {}
+histograms_lock = threading.Lock()
+
+
+def get_histogram(name):
+    """Return the histogram for a route, creating it on first use"""
+    with histograms_lock:
+        if name not in histograms:
+            histograms[name] = LatencyHistogram()
+        return histograms[name]
+
+
+def log_latency_summary():
+    """Log the latency histogram of every route seen so far"""
+    for name, histogram in sorted(histograms.items()):
+        logger.timer(f"Route latency {name}: {histogram.summary()}")
@@ -0,0 +1,17 @@
+import re
+import logging
+import constants  # This configures logging
+from chatbot_config import canonicalizer_abbreviations
+
+logger = logging.getLogger(__name__)
+
+# Words of a question or schema value: lowercase letters and digits, "&" read as "and"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase word tokens with abbreviations expanded"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or "").lower().replace("&", " and ")):
+        tokens.extend(canonicalizer_abbreviations.get(token, token).split())
+    return tokens
@@ -1,16 +1,41 @@
-import json
+import time
 import logging
-import traceback
-from chatbot_config import get_prompt, get_config, get_id, get_random_message
+from chatbot_config import (
+    get_prompt,
+    get_config,
+    get_random_message,
+    get_id,
+    get_schema_value_mode,
+    get_schema_format,
+    deterministic_answers_enabled,
+    data_frames_enabled,
+    canonicalizer_enabled,
+    create_question_enabled
+)
 from utilities import (
-    converse_with_model,
+    converse_with_route,
+    converse_with_lookup,
     parse_and_send_response,    
-    download_s3_json,
     create_history,
     execute_knowledge_base_query,
     format_results_for_response,
-    extract_json_content
+    get_structured_output,
+    text_as_stream,
+    send_result_table,
+    ensure_connection_open,
+    ClientDisconnected
 )
+from deadline import Deadline, StageTimeout
+from latency import log_latency_summary, histograms
+from answer_templates import render_deterministic_answer
+from results import ResultTable
+from canonicalizer import canonicalize_question
+from schema_index import get_schema_index
+from schema_render import render_schema
+from schema_artifact import artifact_for
+from schema_store import load_schema
+from codec import decode_chat_request, InvalidRequest
+from request_trace import record_stage, record_value
 import constants  # This configures logging
 from TestingTimer import timer
 
@@ -18,19 +43,23 @@ logger = logging.getLogger(__name__)
 
 
 # Orchestrate the chat request processing
-def orchestrate(event):
+def orchestrate(event, deadline=None):
     """
     Main orchestration function for processing chat requests via WebSocket.
     
     Extracts connection info, parses messages, classifies queries, and routes
     to appropriate handlers (SQL, NoSQL, or dangerous query blocking).
+    Every stage runs inside its own time budget, bounded by the request deadline.
     """
     logger.info("Starting orchestration")
+
+    if deadline is None:
+        deadline = Deadline.from_context(None)
     
     # Extract WebSocket connection ID
     try:
         connectionId = event["requestContext"]["connectionId"]
-        logger.info(f"Processing connection: {connectionId}")
+        logger.info("Processing connection: %s", connectionId)
     except KeyError:
         logger.error("Failed to extract connection ID")
         return None
@@ -39,25 +68,26 @@ def orchestrate(event):
     # send_info_message(connectionId, get_random_message("message_received"))   // used for testing
     
     try:
-        # Parse chat history
-        chatHistory = json.loads(event["body"])["messages"]
+        # Parse and validate chat history
+        chatHistory = decode_chat_request(event["body"])
 
         # Ensure updated chat history to include "BREAK_TOKEN" for streaming responses to not screw up prompting
         chatHistory = fix_chat_history(chatHistory)
 
-        logger.info(f"Parsed {len(chatHistory)} messages")
+        logger.info("Parsed %s messages", len(chatHistory))
         
-        # Get database schema from S3
-        schema = download_s3_json()
-        logger.info("Downloaded schema from S3")
+        # Get database schema (compiled artifact when published, otherwise the raw template from S3)
+        schema = load_schema()
+        logger.info("Schema loaded")
 
         # Send info message about query classification
         send_info_message(connectionId, get_random_message("classify"))
         
         # Classify the user's query
-        classification_response = classify_query(chatHistory[-1], chatHistory, schema)
-        classification = json.loads(extract_json_content(classification_response["output"]["message"]["content"][0]["text"]))
-        logger.info(f"Query classified as: {classification['classification']}")
+        classification_response = classify_query(chatHistory[-1], chatHistory, schema, deadline=deadline)
+        classification = get_structured_output(classification_response)
+        logger.info("Query classified as: %s", classification['classification'])
+        record_value("classification", classification['classification'])
         logger.timer(timer.checkpoint("Question Classification completed"))
 
         
@@ -67,14 +97,15 @@ def orchestrate(event):
             # Send info message about creating the question
             send_info_message(connectionId, get_random_message("create_question"))
 
-            response = respond_to_sql_query(chatHistory=chatHistory, schema=schema, reasoning=classification, connectionId=connectionId)
+            response = respond_to_sql_query(chatHistory=chatHistory, schema=schema, reasoning=classification, connectionId=connectionId, deadline=deadline)
             logger.timer(timer.checkpoint("Response streaming Started"))
-            parse_and_send_response(response, connectionId)
+            parse_and_send_response(response, connectionId, deadline=deadline.for_stage("final_response"))
             logger.info("SQL query processed successfully")
 
         elif classification["classification"] == "NoSQL_Query":
-            response = respond_to_nosql_query(chatHistory, schema, classification)
-            parse_and_send_response(response, connectionId)
+            ensure_connection_open(connectionId)
+            response = respond_to_nosql_query(chatHistory, schema, classification, deadline=deadline)
+            parse_and_send_response(response, connectionId, deadline=deadline.for_stage("no_sql"))
             logger.info("NoSQL query processed successfully")
 
         elif classification["classification"] == "Dangerous":
@@ -85,21 +116,37 @@ def orchestrate(event):
         else:
             logger.error(f"Unknown classification: {classification['classification']}")
             raise ValueError(f"Unknown classification type: {classification['classification']}")
+
+    except ClientDisconnected as e:
+        logger.info("Client disconnected, skipping remaining stages: %s", e)
+
+    except InvalidRequest as e:
+        logger.warning(f"Invalid chat request: {e}")
+        record_value("error", f"Invalid chat request: {e}")
+        send_error_message(connectionId, "Your message could not be read. Please start a new chat.")
+
+    except StageTimeout as e:
+        logger.warning(f"Orchestration ran out of time: {e}")
+        record_value("error", f"Timed out: {e}")
+
+        if connectionId:
+            send_error_message(connectionId, get_random_message("timeout"))
               
     except Exception as e:
         logger.error(f"Orchestration failed: {str(e)}")
-        logger.debug(f"Full traceback: {traceback.format_exc()}")
+        record_value("error", str(e))
+        logger.debug("Full traceback", exc_info=True)
         
         if connectionId:
-            parse_and_send_response("An unexpected error occurred. Please try again later.", 
-                                  connectionId, classic=True, pure=True)
+            send_error_message(connectionId, "An unexpected error occurred. Please try again later.")
     
+    log_latency_summary()
     logger.info("Orchestration completed")
     return None
 
 
 # Classify the user's query to determine response strategy.
-def classify_query(message, chatHistory, schema):
+def classify_query(message, chatHistory, schema, deadline=None):
     """
     Classify the user's query using AI to determine response strategy.
     Returns classification with reasoning for routing decisions.
@@ -108,14 +155,15 @@ def classify_query(message, chatHistory, schema):
     
     try:
         history = create_history(chatHistory)
-        schema_json = json.dumps(schema, indent=4)
+        schema_text, index = schema_for_stage(schema, "classify")
 
-        response = converse_with_model(
-            get_id("classify"),
+        response = converse_with_stage(
+            "classify",
             [message],
+            index,
             config=get_config("classify"),
-            system=get_prompt("classify", message=message["content"][0]["text"], chatHistory=history, schema=schema_json),
-            streaming=False
+            system=get_prompt("classify", message=message["content"][0]["text"], chatHistory=history, schema=schema_text),
+            deadline=deadline.for_stage("classify") if deadline else None
         )
         
         logger.info("Query classification completed")
@@ -127,7 +175,7 @@ def classify_query(message, chatHistory, schema):
 
 
 # Respond to NoSQL queries by streaming responses.
-def respond_to_nosql_query(chatHistory, schema, reasoning):
+def respond_to_nosql_query(chatHistory, schema, reasoning, deadline=None):
     """
     Handle NoSQL database queries with streaming responses.
     Processes non-relational database operations and document queries.
@@ -135,15 +183,16 @@ def respond_to_nosql_query(chatHistory, schema, reasoning):
     logger.info("Processing NoSQL query")
     
     try:
-        schema_json = json.dumps(schema, indent=4)
+        schema_text, _ = schema_for_stage(schema, "no_sql")
         query_reasoning = reasoning.get("reasoning", "")
 
-        response = converse_with_model(
-            get_id("no_sql"), 
+        response = converse_with_route(
+            "no_sql", 
             chatHistory, 
             config=get_config("no_sql"), 
-            system=get_prompt("no_sql", chatHistory=chatHistory, schema=schema_json, reasoning=query_reasoning),
-            streaming=True
+            system=get_prompt("no_sql", chatHistory=chatHistory, schema=schema_text, reasoning=query_reasoning),
+            streaming=True,
+            deadline=deadline.for_stage("no_sql") if deadline else None
         )
         
         logger.info("NoSQL query completed")
@@ -155,21 +204,35 @@ def respond_to_nosql_query(chatHistory, schema, reasoning):
 
 
 # Respond to SQL queries by orchestrating a multi-stage pipeline.
-def respond_to_sql_query(chatHistory, schema, reasoning, connectionId):
+def respond_to_sql_query(chatHistory, schema, reasoning, connectionId, deadline=None):
     """
     Handle SQL queries through multi-stage pipeline:
     1. Create specific question from user input
     2. Retrieve answers from the database
     3. Generate final response based on query results.
     This orchestrates the entire SQL query process, ensuring robust error handling.
+    Simple count questions are canonicalized locally and skip the question model.
+    If question creation runs out of time, the raw user question is used instead.
     """
     logger.info("Starting SQL query pipeline")
     
     try:
         # Stage 1: Create specific question
-        logger.info("Creating specific question")
-        response = create_question(message=chatHistory[-1], chatHistory=chatHistory, schema=schema, reasoning=reasoning)
-        specific_question_json = json.loads(extract_json_content(response["output"]["message"]["content"][0]["text"]))
+        canonical = canonicalize_question(chatHistory, schema) if canonicalizer_enabled else None
+        if canonical and canonical.confident:
+            log_canonicalizer_savings()
+            specific_question_json = {"improved_questions": [canonical.question]}
+        elif not create_question_enabled:
+            logger.info("Question creation disabled, using the raw question")
+            specific_question_json = {"improved_questions": [chatHistory[-1]["content"][0]["text"]]}
+        else:
+            logger.info("Creating specific question")
+            try:
+                response = create_question(message=chatHistory[-1], chatHistory=chatHistory, schema=schema, reasoning=reasoning, deadline=deadline)
+                specific_question_json = get_structured_output(response)
+            except StageTimeout as e:
+                logger.warning(f"Question creation timed out, using the raw question: {e}")
+                specific_question_json = {"improved_questions": [chatHistory[-1]["content"][0]["text"]]}
         logger.timer(timer.checkpoint("Specific Question Creation completed"))
 
         # Send info message about creating the question
@@ -184,34 +247,55 @@ def respond_to_sql_query(chatHistory, schema, reasoning, connectionId):
         specific_question = specific_question_json["improved_questions"][0]  
         unanswered_questions = get_unanswered_questions(specific_question_json)
         
-        logger.info(f"Specific question created: {specific_question}")
+        logger.info("Specific question created: %s", specific_question)
+        record_value("refined_question", specific_question)
+        record_value("canonicalized", bool(canonical and canonical.confident))
 
 
         # Stage 2: get answers from the database
         logger.info("Retrieving answers from the database")
         results = retrieve_answers_from_database(
             question=specific_question, 
+            deadline=deadline
         )
 
 
+        # Show the rows right away, the prose answer follows
+        table_sent = data_frames_enabled and isinstance(results, ResultTable) and bool(results.row_count)
+        if table_sent:
+            send_result_table(connectionId, results)
+            logger.timer(timer.checkpoint("Result data frames sent"))
+
         # Check if results are empty
         if not results:
             logger.warning("No results found for the specific question")
             results = "No results found for your query."
 
+        # Simple results are answered from templates, skipping the final model call
+        if deterministic_answers_enabled:
+            deterministic_answer = render_deterministic_answer(specific_question, results, unanswered_questions, table_sent)
+            if deterministic_answer:
+                logger.info("Answering from template, final response model skipped")
+                record_value("answered_by", "template")
+                logger.timer(timer.checkpoint("Deterministic answer rendered"))
+                return text_as_stream(deterministic_answer)
+
         # Format results for response
         results = format_results_for_response(specific_question, results)
 
         logger.custom(" list of results: " + str(results))
 
 
-        # Stage 3: Generate final response
+        # Stage 3: Generate final response (only if someone is still listening)
+        record_value("answered_by", "model")
+        ensure_connection_open(connectionId)
         logger.info("Generating final response")
         final_response = get_final_response(
             chatHistory=chatHistory, 
             schema=schema, 
             results=results,
-            unanswered_questions=unanswered_questions
+            unanswered_questions=unanswered_questions,
+            deadline=deadline
         )
         
         logger.info("SQL pipeline completed")
@@ -219,12 +303,12 @@ def respond_to_sql_query(chatHistory, schema, reasoning, connectionId):
         
     except Exception as e:
         logger.error(f"SQL pipeline failed: {e}")
-        logger.debug(f"Traceback: {traceback.format_exc()}")
+        logger.debug("Traceback", exc_info=True)
         raise
 
 
 # Create a specific question based on user input and schema.
-def create_question(message, chatHistory, schema, reasoning):
+def create_question(message, chatHistory, schema, reasoning, deadline=None):
     """
     Transform user input into a specific, actionable database question.
     Uses conversation context and schema to refine vague queries.
@@ -233,21 +317,22 @@ def create_question(message, chatHistory, schema, reasoning):
     
     try:
         formatted_history = create_history(chatHistory)
-        schema_json = json.dumps(schema, indent=4)
+        schema_text, index = schema_for_stage(schema, "create_question")
         query_reasoning = reasoning.get("reasoning", "")
 
-        response = converse_with_model(
-            get_id("create_question"),
+        response = converse_with_stage(
+            "create_question",
             [message],
+            index,
             config=get_config("create_question"),
             system=get_prompt(
                 "create_question", 
                 message=message["content"][0]["text"], 
                 chatHistory=formatted_history, 
-                schema=schema_json, 
+                schema=schema_text, 
                 reasoning=query_reasoning
             ),
-            streaming=False
+            deadline=deadline.for_stage("create_question") if deadline else None
         )
         
         return response
@@ -257,8 +342,51 @@ def create_question(message, chatHistory, schema, reasoning):
         raise
 
 
+# Render the schema for a stage's prompt.
+def schema_for_stage(schema, stage):
+    """
+    Render the schema in the stage's configured format, using the compiled
+    artifact's rendering when there is one. In lookup mode the possible_values
+    are left out and the schema index serving them is returned too.
+    """
+    mode = get_schema_value_mode(stage)
+    format = get_schema_format(stage)
+    index = get_schema_index(schema) if mode == "lookup" else None
+
+    artifact = artifact_for(schema)
+    schema_text = artifact.rendering(format, mode) if artifact else None
+    if schema_text is None:
+        schema_text = render_schema(index.compact_schema() if index else schema, format)
+    return schema_text, index
+
+
+# Run a non-streaming stage, looking up schema values through a tool when its prompt carries none.
+def converse_with_stage(stage, messages, index, config=None, system=None, deadline=None):
+    """
+    Call the stage's model route. With a schema index (lookup mode) the model
+    may call lookup_values before it answers.
+    """
+    if index:
+        return converse_with_lookup(stage, messages, index, config=config, system=system, deadline=deadline)
+    return converse_with_route(stage, messages, config=config, system=system, streaming=False, deadline=deadline)
+
+
+# Log the model time saved by answering create_question locally.
+def log_canonicalizer_savings():
+    """
+    Log the create_question latency avoided by the canonicalizer,
+    estimated from the mean latency of the stage's primary model in this container.
+    """
+    histogram = histograms.get(f"create_question:{get_id('create_question')}")
+    saved = histogram.mean() if histogram else None
+    if saved is None:
+        logger.timer("Question canonicalized locally, create_question model skipped (no latency samples yet)")
+    else:
+        logger.timer(f"Question canonicalized locally, create_question model skipped (~{saved:.2f}s saved)")
+
+
 # Retrieve final response based on SQL query results.
-def get_final_response(chatHistory, schema, results, unanswered_questions="None"):
+def get_final_response(chatHistory, schema, results, unanswered_questions="None", deadline=None):
     """
     Convert SQL query results into natural language response.
     Synthesizes data into conversational format that answers the user's question.
@@ -266,14 +394,15 @@ def get_final_response(chatHistory, schema, results, unanswered_questions="None"
     logger.info("Generating final response")
     
     try:
-        schema_json = json.dumps(schema, indent=4)
+        schema_text, _ = schema_for_stage(schema, "final_response")
 
-        response = converse_with_model(
-            get_id("final_response"),
+        response = converse_with_route(
+            "final_response",
             chatHistory,
             config=get_config("final_response"),
-            system=get_prompt("final_response", schema=schema_json, results=results, unanswered_questions=unanswered_questions),
-            streaming=True
+            system=get_prompt("final_response", schema=schema_text, results=results, unanswered_questions=unanswered_questions),
+            streaming=True,
+            deadline=deadline.for_stage("final_response") if deadline else None
         )
         
         logger.info("Final response generated")
@@ -285,7 +414,7 @@ def get_final_response(chatHistory, schema, results, unanswered_questions="None"
 
 
 # Retrieve answers from the database based on the specific question.
-def retrieve_answers_from_database(question):
+def retrieve_answers_from_database(question, deadline=None):
     """
     Retrieve answers from the database based on the specific question.
     This function executes the SQL queries and returns the results. - All inside bedrock knowledge bases
@@ -293,7 +422,15 @@ def retrieve_answers_from_database(question):
     logger.info("Retrieving answers from the database")
     try:
         # Send question to the knowledge base
-        results = execute_knowledge_base_query(question)
+        start = time.perf_counter()
+        results = execute_knowledge_base_query(
+            question,
+            deadline=deadline.for_stage("knowledge_base") if deadline else None
+        )
+        record_stage("knowledge_base", time.perf_counter() - start)
+        if isinstance(results, ResultTable):
+            record_value("sql", results.sql)
+            record_value("rows", results.row_count)
         logger.timer(timer.checkpoint("All Knowledge base retrieval completed"))
         logger.info("Database query executed successfully")
         return results
@@ -324,6 +461,18 @@ def send_info_message(connectionId, message):
     parse_and_send_response(message, connectionId, info=True)
     return
 
+
+# Send a final error message to the client, unless it has already gone.
+def send_error_message(connectionId, message):
+    """
+    Send a final error message to the client.
+    A closed connection is expected here and is not treated as a new failure.
+    """
+    try:
+        parse_and_send_response(message, connectionId, classic=True, pure=True)
+    except ClientDisconnected:
+        logger.info("Client already disconnected, error message not sent")
+
 def get_unanswered_questions(specific_question_json):
    questions = specific_question_json["improved_questions"][1:] if len(specific_question_json["improved_questions"]) > 1 else None
    
@@ -0,0 +1,332 @@
+import os
+import sys
+import time
+import random
+import marshal
+import pstats
+import cProfile
+import logging
+import threading
+from io import StringIO
+from collections import Counter
+from datetime import datetime, timezone
+import boto3
+from botocore.client import BaseClient
+from botocore.eventstream import EventStream
+import constants  # This configures logging
+from constants import PROFILE_SAMPLE_RATE, PROFILE_MODE, PROFILE_MODES, PROFILE_SINK, PROFILE_HEADER, PROFILE_SAMPLE_INTERVAL
+from codec import dumps_bytes, loads, DECODE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+TOP_FUNCTIONS = 25  # Functions listed in the summary
+_END = object()
+_s3_client = None
+
+
+# ============================================================================
+# REQUEST SELECTION
+# ============================================================================
+
+def _parse_mode(value):
+    """A mode name, or a truthy flag for the default mode; None when profiling is off"""
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in PROFILE_MODES:
+            return value
+        value = value in ("1", "true", "yes", "on")
+    return PROFILE_MODE if value else None
+
+
+def _body_flag(event):
+    """The "profile" key of a WebSocket message body, or None"""
+    body = event.get("body")
+    if not body:
+        return None
+    try:
+        message = loads(body)
+    except DECODE_ERRORS:
+        return None  # Reported when the request itself is decoded
+    return message.get("profile") if isinstance(message, dict) else None
+
+
+def profile_mode(event):
+    """
+    The profiling mode for a request event, or None when it is not profiled.
+    An explicit flag wins over the PROFILE_SAMPLE_RATE draw, so "profile": false
+    keeps a request out of sampling too. The flag is read from the event, then
+    from the message body (WebSocket clients cannot set headers), then from the
+    PROFILE_HEADER header (server mode).
+    """
+    requested = event.get("profile")
+    if requested is None:
+        requested = _body_flag(event)
+    if requested is None:
+        headers = event.get("headers") or {}
+        requested = next((value for name, value in headers.items() if name.lower() == PROFILE_HEADER), None)
+    if requested is None:
+        return PROFILE_MODE if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE else None
+    return _parse_mode(requested)
+
+
+# ============================================================================
+# AWS CALL TIMING
+# ============================================================================
+
+class AwsCallTimer:
+    """
+    Wall-clock time spent inside boto3 calls and model stream reads, per
+    operation and per thread. Patches botocore while any timer is running,
+    so every client (including per-deadline clients) is covered. Concurrent
+    requests (server mode) share one patch; each running timer sees every
+    call, and by_thread keeps each request thread's share apart.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+        self.by_thread = Counter()
+
+    def record(self, operation, seconds):
+        with self.lock:
+            entry = self.operations.setdefault(operation, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            self.by_thread[threading.get_ident()] += seconds
+
+    def start(self):
+        _install_patches(self)
+
+    def stop(self):
+        _remove_patches(self)
+
+    def summary(self):
+        return {
+            operation: {"calls": calls, "seconds": round(seconds, 4)}
+            for operation, (calls, seconds) in sorted(self.operations.items(), key=lambda item: -item[1][1])
+        }
+
+
+# botocore is patched once for all running timers and restored when the last one stops
+_patch_lock = threading.Lock()
+_running_timers = []
+_originals = None
+
+
+def _record(operation, seconds):
+    for timer in tuple(_running_timers):
+        timer.record(operation, seconds)
+
+
+def _install_patches(timer):
+    global _originals
+
+    with _patch_lock:
+        if timer in _running_timers:
+            return
+        if not _running_timers:
+            make_api_call, stream_iter = BaseClient._make_api_call, EventStream.__iter__
+            _originals = (make_api_call, stream_iter)
+
+            def timed_api_call(client, operation_name, api_params):
+                start = time.perf_counter()
+                try:
+                    return make_api_call(client, operation_name, api_params)
+                finally:
+                    _record(f"{client.meta.service_model.service_name}.{operation_name}", time.perf_counter() - start)
+
+            def timed_stream(stream):
+                events = stream_iter(stream)
+                operation = f"{stream._operation_name} (stream reads)"
+                while True:
+                    start = time.perf_counter()
+                    event = next(events, _END)
+                    _record(operation, time.perf_counter() - start)
+                    if event is _END:
+                        return
+                    yield event
+
+            BaseClient._make_api_call = timed_api_call
+            EventStream.__iter__ = timed_stream
+        _running_timers.append(timer)
+
+
+def _remove_patches(timer):
+    global _originals
+
+    with _patch_lock:
+        if timer not in _running_timers:
+            return
+        _running_timers.remove(timer)
+        if not _running_timers:
+            BaseClient._make_api_call, EventStream.__iter__ = _originals
+            _originals = None
+
+
+# ============================================================================
+# SAMPLING PROFILER
+# ============================================================================
+
+def _collapse(thread_name, frame):
+    """One stack as a collapsed-stack line (root first), for flame graph tools"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples every thread's stack at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.stacks[_collapse(names.get(ident, str(ident)), frame)] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hot_functions(self, thread_name):
+        """Functions on top of the given thread's stack, by share of samples"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            if stack.startswith(thread_name + ";"):
+                leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"function": name, "share": round(count / total, 4)} for name, count in leaves.most_common(TOP_FUNCTIONS)]
+
+
+# ============================================================================
+# REQUEST PROFILE
+# ============================================================================
+
+class RequestProfile:
+    """
+    Profile of one request, used as a context manager around orchestrate().
+    On exit the profile (collapsed stacks or pstats) and a summary with the
+    wall-clock split between CPU, AWS calls and other waiting are written to
+    the sink. Profiling failures are logged and never fail the request.
+    """
+
+    def __init__(self, request_id, mode=PROFILE_MODE, sink=PROFILE_SINK):
+        self.request_id = request_id or "unknown"
+        self.mode = mode
+        self.sink = sink
+        self.aws = AwsCallTimer()
+        self.profiler = None
+        self.sampler = None
+
+    def __enter__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.thread = threading.current_thread()
+        self.aws.start()
+        if self.mode == "deterministic":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.sampler = StackSampler(PROFILE_SAMPLE_INTERVAL)
+            self.sampler.start()
+        self.wall, self.cpu, self.thread_cpu = time.perf_counter(), time.process_time(), time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        thread_cpu = time.thread_time() - self.thread_cpu
+        if self.profiler:
+            self.profiler.disable()
+        if self.sampler:
+            self.sampler.stop()
+        self.aws.stop()
+
+        try:
+            summary = self.summary(wall, cpu, thread_cpu)
+            location = write_profile(self.sink, self.name(), self.files(summary))
+            breakdown = summary["request_thread"]
+            logger.timer(f"Profile written to {location}: {wall:.2f}s wall, {breakdown['cpu_seconds']:.2f}s CPU, "
+                         f"{breakdown['aws_seconds']:.2f}s in AWS calls")
+        except Exception as e:
+            logger.error(f"Failed to write profile: {e}")
+        return False
+
+    def name(self):
+        return f"{self.started_at:%Y/%m/%d}/{self.started_at:%H%M%S}-{self.request_id}"
+
+    def summary(self, wall, cpu, thread_cpu):
+        aws_seconds = self.aws.by_thread[self.thread.ident]
+        summary = {
+            "request_id": self.request_id,
+            "mode": self.mode,
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": round(wall, 4),
+            "process_cpu_seconds": round(cpu, 4),
+            # The request thread's wall time: running Python, inside boto3 calls, or waiting on other threads
+            "request_thread": {
+                "cpu_seconds": round(thread_cpu, 4),
+                "aws_seconds": round(aws_seconds, 4),
+                "other_seconds": round(max(wall - thread_cpu - aws_seconds, 0.0), 4),
+            },
+            "aws_calls": self.aws.summary(),
+        }
+        if self.sampler:
+            summary["samples"] = self.sampler.samples
+            summary["sample_interval"] = PROFILE_SAMPLE_INTERVAL
+            summary["hot_functions"] = self.sampler.hot_functions(self.thread.name)
+        return summary
+
+    def files(self, summary):
+        """File name to content for this profile"""
+        files = {}
+        if self.profiler:
+            # pstats.Stats(path) loads this; cProfile only sees the request thread
+            self.profiler.create_stats()
+            files["profile.pstats"] = marshal.dumps(self.profiler.stats)
+            report = StringIO()
+            pstats.Stats(self.profiler, stream=report).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            files["profile.txt"] = report.getvalue().encode("utf-8")
+        if self.sampler:
+            files["stacks.collapsed"] = self.sampler.collapsed().encode("utf-8")
+        files["summary.json"] = dumps_bytes(summary)
+        return files
+
+
+def write_profile(sink, name, files):
+    """Write profile files below the sink (a directory or s3://bucket/prefix) and return their location"""
+    global _s3_client
+
+    if sink.startswith("s3://"):
+        bucket_name, _, prefix = sink[len("s3://"):].partition("/")
+        prefix = f"{prefix.strip('/')}/{name}" if prefix.strip("/") else name
+        _s3_client = _s3_client or boto3.client("s3")
+        for file_name, body in files.items():
+            _s3_client.put_object(Bucket=bucket_name, Key=f"{prefix}/{file_name}", Body=body)
+        return f"s3://{bucket_name}/{prefix}/"
+
+    directory = os.path.join(sink, name)
+    os.makedirs(directory, exist_ok=True)
+    for file_name, body in files.items():
+        with open(os.path.join(directory, file_name), "wb") as file:
+            file.write(body)
+    return directory
@@ -12,14 +12,7 @@ You will classify the user question into one of three categories: **SQL_Query**,
 
 
 
-You will return a JSON object with the following format:
-
-{{
-    "classification": "SQL_Query" | "NoSQL_Query" | "Dangerous",
-    "reasoning": "Your reasoning for the classification"
-}}
-
-It is absolutely critical that you do not return any other text or formatting.
+{output_format}
 
 
 
@@ -82,13 +75,6 @@ The classification criteria:
 NOTE: The system "knows" information rather than querying a database. Questions about how to use the system are NoSQL_Query, not Dangerous.
 
 
-A note for the reasoning:
-- Always provide clear reasoning for your classification.
-- Explain why the question fits the SQL_Query, NoSQL_Query, or Dangerous category.
-- If classifying as NoSQL_Query due to invalid values, mention which values don't exist in the schema.
-- Please always do so in no more than 1-2 sentences.
-
-
 Important considerations:
 
 1. **Context matters**: Always evaluate the user_question together with chat_history. A vague question might be specific with context.
@@ -119,10 +105,51 @@ Here is the user question you will be classifying:
 
 
 Please classify the user question into one of the three categories: SQL_Query, NoSQL_Query, or Dangerous.
-Respond only with the JSON object format provided above, do not include any other text or formatting.
+Respond only in the output format described above, do not include any other text or formatting.
 
 A:
 
 """.strip()
 
-logger.info("Classification prompt template loaded")
\ No newline at end of file
+logger.info("Classification prompt template loaded")
+
+# Output format instructions for the classify prompt, selected by the stage's output mode in chatbot_config.
+# Compact formats put the label first and keep reasoning to one short sentence.
+classify_output_formats = {
+    "text": """
+You will return a JSON object with the following format:
+
+{
+    "classification": "SQL_Query" | "NoSQL_Query" | "Dangerous",
+    "reasoning": "Your reasoning for the classification"
+}
+
+It is absolutely critical that you do not return any other text or formatting.
+
+A note for the reasoning:
+- Always provide clear reasoning for your classification.
+- Explain why the question fits the SQL_Query, NoSQL_Query, or Dangerous category.
+- If classifying as NoSQL_Query due to invalid values, mention which values don't exist in the schema.
+- Please always do so in no more than 1-2 sentences.
+""".strip(),
+
+    "text_compact": """
+You will return a JSON object with the following format, classification first:
+
+{"classification": "SQL_Query" | "NoSQL_Query" | "Dangerous", "reasoning": "One short sentence"}
+
+It is absolutely critical that you do not return any other text or formatting.
+
+A note for the reasoning:
+- Keep it to one short sentence (under 25 words).
+- If classifying as NoSQL_Query due to invalid values, name the values that don't exist in the schema.
+""".strip(),
+
+    "tool": """
+You will record your answer by calling the record_classification tool exactly once.
+Set "classification" to one of "SQL_Query", "NoSQL_Query" or "Dangerous".
+Set "reasoning" to one short sentence (under 25 words) explaining the classification.
+If classifying as NoSQL_Query due to invalid values, name the values that don't exist in the schema.
+Do not write any text outside the tool call.
+""".strip()
+}
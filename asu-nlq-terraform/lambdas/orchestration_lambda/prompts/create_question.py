@@ -15,14 +15,7 @@ CRITICAL: You must IMPROVE vague questions by adding essential attributes, espec
 
 
 
-You will return a JSON object with the following format:
-
-{{
-    "improved_questions": ["String", "String"],
-    "reasoning": "Your reasoning for the SQL-eeze translation"
-}}
-
-It is absolutely critical that you do not return any other text or formatting.
+{output_format}
 
 
 
@@ -184,4 +177,25 @@ This means that wherever a user has something that looks like an attribute, you
 
 """.strip()
 
-logger.info("SQL-eeze translation prompt template loaded")
\ No newline at end of file
+# Output format instructions for the create_question prompt, selected by the stage's output mode in chatbot_config.
+# Only the improved questions are used downstream, so no reasoning is requested.
+create_question_output_formats = {
+    "text": """
+You will return a JSON object with the following format:
+
+{"improved_questions": ["String", "String"]}
+
+It is absolutely critical that you do not return any other text or formatting.
+""".strip(),
+
+    "tool": """
+You will record your answer by calling the record_improved_questions tool exactly once.
+Set "improved_questions" to the list of SQL-eeze statements, most important first.
+Do not write any text outside the tool call.
+""".strip()
+}
+
+# The text format is already compact (no reasoning), so both text modes share it
+create_question_output_formats["text_compact"] = create_question_output_formats["text"]
+
+logger.info("SQL-eeze translation prompt template loaded")
@@ -0,0 +1,16 @@
+import logging
+import constants  # This configures logging
+
+logger = logging.getLogger(__name__)
+
+# Appended to prompts of stages whose schema lists column names and descriptions only (lookup mode)
+schema_lookup_instructions = """
+SCHEMA VALUE LOOKUP:
+
+The schema above lists each column with its description and "value_count", but NOT its possible values.
+Before you use a value for a column, call the lookup_values tool with the "column_name" and the user's wording (for example column "College", query "engineering").
+The tool returns the exact possible values that match, best match first. Only use values returned by the tool, written exactly as returned.
+You may look up several columns at once. An empty query lists the first values of the column.
+""".strip()
+
+logger.info("Schema lookup prompt loaded successfully")
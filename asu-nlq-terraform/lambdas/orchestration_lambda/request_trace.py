@@ -0,0 +1,102 @@
+import time
+import threading
+import contextvars
+import logging
+import constants  # This configures logging
+
+logger = logging.getLogger(__name__)
+
+# What one request did: stage timings, token usage and the values worth keeping
+# (classification, refined question, SQL, ...). Only requests run under a trace
+# (batch mode) collect one; everywhere else the record_* calls are no-ops.
+# Worker threads do not inherit context variables, so work handed to an
+# executor is submitted through contextvars.copy_context().run.
+
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+class RequestTrace:
+    """Stage timings, token usage and values of one request"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.usage = {}
+        self.values = {}
+        self.stream_stage = None
+
+    def add_stage(self, stage, seconds):
+        with self.lock:
+            entry = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+
+    def add_usage(self, stage, usage):
+        with self.lock:
+            entry = self.usage.setdefault(stage, {"inputTokens": 0, "outputTokens": 0, "totalTokens": 0})
+            for name in entry:
+                entry[name] += usage.get(name, 0)
+
+    def set(self, name, value):
+        with self.lock:
+            self.values.setdefault(name, value)
+
+    def tokens(self):
+        """Token usage summed over all stages"""
+        total = {"inputTokens": 0, "outputTokens": 0, "totalTokens": 0}
+        for usage in self.usage.values():
+            for name in total:
+                total[name] += usage[name]
+        return total
+
+    def to_dict(self):
+        return {
+            **self.values,
+            "seconds": round(time.perf_counter() - self.started, 4),
+            "stages": {stage: {"calls": entry["calls"], "seconds": round(entry["seconds"], 4)} for stage, entry in self.stages.items()},
+            "usage": self.usage,
+            "tokens": self.tokens()
+        }
+
+
+# Function to run the rest of the current context under a new trace
+def start_trace():
+    """Start collecting a trace for the request handled in this context"""
+    trace = RequestTrace()
+    _trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _trace.get()
+
+
+# Function to record the time (and token usage) of one stage call
+def record_stage(stage, seconds, usage=None, streaming=False):
+    """
+    Record a stage call. A streaming call's usage arrives with the stream's
+    metadata event, so it is attributed to the stage by record_stream_usage.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return
+    trace.add_stage(stage, seconds)
+    if usage:
+        trace.add_usage(stage, usage)
+    if streaming:
+        trace.stream_stage = stage
+
+
+# Function to record the usage reported at the end of a model stream
+def record_stream_usage(usage):
+    trace = _trace.get()
+    if trace is not None and usage:
+        trace.add_usage(trace.stream_stage or "stream", usage)
+
+
+# Function to record a value of the request (the first value recorded under a name is kept)
+def record_value(name, value):
+    trace = _trace.get()
+    if trace is not None:
+        trace.set(name, value)
@@ -0,0 +1,210 @@
+import io
+import csv
+import logging
+import constants  # This configures logging
+
+logger = logging.getLogger(__name__)
+
+# Knowledge base column types that hold numbers
+NUMERIC_TYPES = {"LONG", "DOUBLE", "INTEGER", "FLOAT", "DECIMAL", "NUMBER"}
+
+# Values the knowledge base uses for SQL NULL
+NULL_VALUES = (None, "", "null", "NULL")
+
+# Rough characters per token, used to keep rendered results inside a token budget
+CHARS_PER_TOKEN = 4
+
+
+class ResultTable:
+    """
+    Columnar view of a knowledge base result set.
+    Column names and types are stored once; each column holds its values in row order.
+    """
+
+    def __init__(self, columns, types=None, values=None, sql=None):
+        self.columns = list(columns)
+        self.types = list(types) if types else [None] * len(self.columns)
+        self.values = values if values is not None else [[] for _ in self.columns]
+        self.sql = sql
+
+    @classmethod
+    def from_retrieval_results(cls, retrieval_results):
+        """Build a table from the retrievalResults of a Bedrock knowledge base SQL retrieval"""
+        columns, types, index = [], [], {}
+        rows = []
+        sql = None
+
+        for result in retrieval_results:
+            sql = sql or result.get("location", {}).get("sqlLocation", {}).get("query")
+            row = result.get("content", {}).get("row") or []
+            values, occurrences = {}, {}
+            for column in row:
+                # Repeated names in one row (e.g. two "count" columns) stay separate columns
+                name = column.get("columnName")
+                occurrences[name] = occurrences.get(name, 0) + 1
+                key = (name, occurrences[name])
+                if key not in index:
+                    index[key] = len(columns)
+                    columns.append(name)
+                    types.append(column.get("type"))
+                values[index[key]] = column.get("columnValue")
+            rows.append(values)
+
+        table = cls(unique_names(columns), types, [[row.get(i) for row in rows] for i in range(len(columns))], sql)
+        logger.info("Result table built: %s rows, %s columns", table.row_count, len(columns))
+        return table
+
+    @property
+    def row_count(self):
+        return len(self.values[0]) if self.values else 0
+
+    def __len__(self):
+        return self.row_count
+
+    def row(self, index):
+        """Return one row as a list of values"""
+        return [column[index] for column in self.values]
+
+    def rows(self):
+        """Iterate over rows as lists of values"""
+        return zip(*self.values) if self.values else iter(())
+
+    def is_numeric(self, column_index):
+        """True when every non-null value in the column is a number of a numeric type"""
+        column_type = self.types[column_index]
+        if column_type and column_type.upper() not in NUMERIC_TYPES:
+            return False
+        present = [value for value in self.values[column_index] if value not in NULL_VALUES]
+        return bool(present) and all(to_number(value) is not None for value in present)
+
+    def numeric_columns(self):
+        """Indexes of the numeric columns"""
+        return [i for i in range(len(self.columns)) if self.is_numeric(i)]
+
+    def has_nulls(self):
+        """True when any cell is NULL"""
+        return any(value in NULL_VALUES for column in self.values for value in column)
+
+    def summarize(self, top_k):
+        """Totals, min and max of numeric columns plus the top-k rows by the first numeric column"""
+        summary = {"columns": {}, "top_rows": [], "top_by": None}
+
+        for i in self.numeric_columns():
+            numbers = [to_number(value) for value in self.values[i] if value not in NULL_VALUES]
+            summary["columns"][self.columns[i]] = {
+                "total": sum(numbers),
+                "min": min(numbers),
+                "max": max(numbers)
+            }
+
+        numeric = self.numeric_columns()
+        if numeric:
+            key = numeric[0]
+            ranked = sorted(self.rows(), key=lambda row: to_number(row[key]) or 0, reverse=True)
+            summary["top_rows"] = [list(row) for row in ranked[:top_k]]
+            summary["top_by"] = self.columns[key]
+
+        return summary
+
+    def json_rows(self, max_rows=None):
+        """Rows as JSON-ready lists: numbers for numeric columns, None for NULL"""
+        numeric = set(self.numeric_columns())
+        rows = []
+        for row in self.rows():
+            if max_rows is not None and len(rows) >= max_rows:
+                break
+            rows.append([
+                None if value in NULL_VALUES else (to_number(value) if i in numeric else value)
+                for i, value in enumerate(row)
+            ])
+        return rows
+
+    def render(self, rows, format="csv"):
+        """Render the header once followed by the given rows, as CSV or a markdown table"""
+        return "\n".join(self.header_lines(format) + [self.row_line(row, format) for row in rows])
+
+    def header_lines(self, format="csv"):
+        """Header line(s) for the given format"""
+        if format == "markdown":
+            return ["| " + " | ".join(self.columns) + " |", "|" + "---|" * len(self.columns)]
+        return [csv_line(self.columns)]
+
+    def row_line(self, row, format="csv"):
+        """A single rendered row for the given format"""
+        if format == "markdown":
+            return "| " + " | ".join(display(value) for value in row) + " |"
+        return csv_line(display(value) for value in row)
+
+    def render_for_prompt(self, max_rows, max_tokens, top_k, format="csv"):
+        """
+        Render the table for a model prompt within a row and token cap.
+        When the result is larger than the caps, a prefix of the rows is shown
+        together with precomputed totals, min/max and top-k rows.
+        """
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        full = self.render(self.rows(), format) if self.row_count <= max_rows else None
+        if full is not None and len(full) <= max_chars:
+            return full
+
+        summary = self.summarize(top_k)
+        summary_text = self.render_summary(summary, format)
+
+        # Show as many leading rows as still fit next to the summary
+        used = len(summary_text) + len("\n".join(self.header_lines(format)))
+        shown = []
+        for row in self.rows():
+            used += len(self.row_line(row, format)) + 1
+            if len(shown) >= max_rows or used > max_chars:
+                break
+            shown.append(row)
+
+        logger.info("Result set capped: showing %s of %s rows with a summary", len(shown), self.row_count)
+        return (f"{self.render(shown, format)}\n"
+                f"(Showing {len(shown)} of {self.row_count} rows.)\n\n"
+                f"{summary_text}")
+
+    def render_summary(self, summary, format="csv"):
+        """Render a summary from summarize() as text"""
+        lines = [f"Summary of all {self.row_count} rows:"]
+        for name, stats in summary["columns"].items():
+            lines.append(f"- {name}: total {display(stats['total'])}, "
+                         f"min {display(stats['min'])}, max {display(stats['max'])}")
+        if summary["top_rows"]:
+            lines.append(f"Top {len(summary['top_rows'])} rows by {summary['top_by']}:")
+            lines.append(self.render(summary["top_rows"], format))
+        return "\n".join(lines)
+
+
+def unique_names(names):
+    """Make column names unique by suffixing repeats (count, count_2, ...)"""
+    seen = {}
+    unique = []
+    for name in names:
+        name = name or "column"
+        seen[name] = seen.get(name, 0) + 1
+        unique.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    return unique
+
+
+def csv_line(values):
+    """Render values as one CSV line"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(values)
+    return buffer.getvalue()
+
+
+def to_number(value):
+    """Parse a knowledge base value as a number, or None if it is not one"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def display(value):
+    """Render a cell compactly: NULL for missing values, whole floats without .0"""
+    if value in NULL_VALUES:
+        return "NULL"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else f"{value:.2f}"
+    return str(value)
@@ -0,0 +1,189 @@
+import json
+import hashlib
+import logging
+from datetime import datetime, timezone
+import constants  # This configures logging
+from normalize import tokenize
+from results import CHARS_PER_TOKEN
+from schema_render import render_schema, compact_schema, RENDERERS
+
+logger = logging.getLogger(__name__)
+
+# Version of the artifact layout, bumped when fields change meaning
+ARTIFACT_VERSION = 1
+
+# Schema value modes a rendering is precompiled for
+RENDERING_MODES = ("inline", "lookup")
+
+
+class SchemaArtifact:
+    """
+    A compiled schema: the schema itself plus its prompt renderings, value index
+    and token costs, identified by the hash of the schema's content.
+    """
+
+    def __init__(self, data):
+        self.hash = data["hash"]
+        self.version = data.get("version")
+        self.schema = data["schema"]
+        self.renderings = data.get("renderings", {})
+        self.value_index = data.get("value_index", {})
+        self.token_costs = data.get("token_costs", {})
+        self.compiled_at = data.get("compiled_at")
+
+        if self.version != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported schema artifact version: {self.version}")
+        if schema_hash(self.schema) != self.hash:
+            raise ValueError(f"Schema artifact content does not match its hash {self.hash}")
+
+    def rendering(self, format, mode="inline"):
+        """The precompiled prompt rendering, or None if this format was not compiled"""
+        return self.renderings.get(mode, {}).get(format)
+
+
+# Artifacts loaded by this container, by hash. Kept for the container's lifetime.
+loaded_artifacts = {}
+
+
+def register_artifact(artifact):
+    """Keep a loaded artifact so its schema object can be recognised later"""
+    loaded_artifacts[artifact.hash] = artifact
+    return artifact
+
+
+def artifact_for(schema):
+    """The loaded artifact whose schema is this very object, or None"""
+    for artifact in loaded_artifacts.values():
+        if artifact.schema is schema:
+            return artifact
+    return None
+
+
+def schema_key(schema):
+    """Cache key for anything derived from a schema: its artifact hash, or its content hash"""
+    artifact = artifact_for(schema)
+    return artifact.hash if artifact else schema_hash(schema)
+
+
+def schema_hash(schema):
+    """SHA-256 of the schema's canonical (sorted, minified) JSON"""
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# Validate a schema definition before it is compiled.
+def validate_schema(schema):
+    """Return a list of problems with the schema definition (empty when valid)"""
+    errors = []
+    tables = schema.get("tables") if isinstance(schema, dict) else None
+    if not isinstance(tables, list) or not tables:
+        return ["Schema must contain a non-empty 'tables' list"]
+
+    table_names = set()
+    for position, table in enumerate(tables):
+        name = table.get("table_name")
+        where = f"Table {name or position}"
+        if not name:
+            errors.append(f"{where}: missing table_name")
+        elif name in table_names:
+            errors.append(f"{where}: duplicate table_name")
+        table_names.add(name)
+        if not table.get("description"):
+            errors.append(f"{where}: missing description")
+
+        columns = table.get("columns")
+        if not isinstance(columns, list) or not columns:
+            errors.append(f"{where}: must contain a non-empty 'columns' list")
+            continue
+
+        column_names = set()
+        for column in columns:
+            column_name = column.get("column_name")
+            if not column_name:
+                errors.append(f"{where}: column without column_name")
+                continue
+            if column_name in column_names:
+                errors.append(f"{where}.{column_name}: duplicate column_name")
+            column_names.add(column_name)
+            for field in ("data_type", "description"):
+                if not column.get(field):
+                    errors.append(f"{where}.{column_name}: missing {field}")
+
+            values = column.get("possible_values")
+            if values is not None:
+                if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                    errors.append(f"{where}.{column_name}: possible_values must be a list of strings")
+                elif len(set(values)) != len(values):
+                    errors.append(f"{where}.{column_name}: duplicate possible_values")
+
+    return errors
+
+
+# Compile a schema into an artifact.
+def compile_artifact(schema):
+    """
+    Build the artifact for a valid schema: prompt renderings in every format
+    (inline and lookup mode), the normalized value index and token costs.
+    """
+    compact = compact_schema(schema)
+    renderings = {
+        "inline": {format: render_schema(schema, format) for format in RENDERERS},
+        "lookup": {format: render_schema(compact, format) for format in RENDERERS},
+    }
+
+    value_index = {}
+    for table in schema["tables"]:
+        for column in table["columns"]:
+            values = column.get("possible_values")
+            if values:
+                value_index[column["column_name"]] = {
+                    "values": values,
+                    "normalized": [" ".join(tokenize(value)) for value in values]
+                }
+
+    return {
+        "version": ARTIFACT_VERSION,
+        "hash": schema_hash(schema),
+        "compiled_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "schema": schema,
+        "renderings": renderings,
+        "value_index": value_index,
+        "token_costs": token_costs(schema, renderings)
+    }
+
+
+def token_costs(schema, renderings):
+    """Approximate prompt tokens per format, and per table and column in minified JSON"""
+    costs = {
+        "formats": {
+            mode: {format: estimate_tokens(text) for format, text in texts.items()}
+            for mode, texts in renderings.items()
+        },
+        "tables": {}
+    }
+
+    for table in schema["tables"]:
+        columns = {}
+        for column in table["columns"]:
+            values = column.get("possible_values") or []
+            columns[column["column_name"]] = {
+                "total": estimate_tokens(minified(column)),
+                "values": estimate_tokens(minified(values)) if values else 0
+            }
+        costs["tables"][table["table_name"]] = {
+            "total": estimate_tokens(minified(table)),
+            "description": estimate_tokens(table.get("description", "")),
+            "columns": columns
+        }
+
+    return costs
+
+
+def estimate_tokens(text):
+    """Approximate token count of a text"""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def minified(value):
+    """Minified JSON of a value"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
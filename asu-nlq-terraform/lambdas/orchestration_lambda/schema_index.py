@@ -0,0 +1,127 @@
+import logging
+from difflib import SequenceMatcher
+import constants  # This configures logging
+from chatbot_config import schema_lookup_max_results
+from normalize import tokenize
+from schema_render import compact_schema
+from schema_artifact import schema_key, artifact_for
+
+logger = logging.getLogger(__name__)
+
+# Lowest match score a value needs to be returned by a lookup
+MIN_LOOKUP_SCORE = 0.6
+
+# Similarity a misspelled query word needs to a value word to count as a match
+FUZZY_WORD_CUTOFF = 0.8
+
+
+class SchemaIndex:
+    """
+    In-memory index of the schema's possible_values, served to models through the lookup_values tool
+    so prompts only need column names and descriptions.
+    """
+
+    def __init__(self, schema, value_index=None):
+        """Index the schema's values, or load a value index precompiled into a schema artifact"""
+        self.schema = schema
+        self.values = {}
+        self.normalized = {}
+
+        if value_index is not None:
+            for name, entry in value_index.items():
+                self.values[name] = entry["values"]
+                self.normalized[name] = entry["normalized"]
+        else:
+            for table in schema.get("tables", []):
+                for column in table.get("columns", []):
+                    values = column.get("possible_values")
+                    if values:
+                        self.values[column["column_name"]] = list(values)
+                        self.normalized[column["column_name"]] = [" ".join(tokenize(value)) for value in values]
+
+        logger.info("Schema index built for %s columns", len(self.values))
+
+    def compact_schema(self):
+        """The schema with every possible_values list replaced by its length"""
+        return compact_schema(self.schema)
+
+    def lookup(self, column, query="", limit=schema_lookup_max_results):
+        """
+        Return the possible values of a column that best match the query.
+        Column names are matched case-insensitively; unknown columns return the known ones.
+        """
+        name = self.resolve_column(column)
+        if name is None:
+            logger.warning(f"Lookup for unknown column: {column}")
+            return {"error": f"Column {column!r} has no listed values", "columns": list(self.values)}
+
+        values = self.values[name]
+        query_text = " ".join(tokenize(query))
+        if not query_text:
+            matches = values
+        else:
+            scored = [
+                (match_score(query_text, normalized), position)
+                for position, normalized in enumerate(self.normalized[name])
+            ]
+            # Best score first, shorter values first among equals ("Computer Science" before "Applied Computer Science")
+            ranked = sorted(
+                (item for item in scored if item[0] >= MIN_LOOKUP_SCORE),
+                key=lambda item: (-item[0], len(self.normalized[name][item[1]].split()), item[1])
+            )
+            matches = [values[position] for _, position in ranked]
+
+        logger.info("Lookup %s=%r: %s of %s values match", name, query, len(matches), len(values))
+        return {
+            "column": name,
+            "query": query,
+            "values": matches[:limit],
+            "total_matches": len(matches),
+            "total_values": len(values)
+        }
+
+    def resolve_column(self, column):
+        """Exact column name for a possibly differently cased or quoted name"""
+        wanted = (column or "").strip().strip('"').lower()
+        for name in self.values:
+            if name.lower() == wanted:
+                return name
+        return None
+
+
+# Indexes built so far, by schema content hash
+schema_indexes = {}
+
+
+# Index for a schema, built once per schema content.
+def get_schema_index(schema):
+    """Return the (cached) SchemaIndex for a schema, from its compiled artifact when there is one"""
+    key = schema_key(schema)
+    if key not in schema_indexes:
+        artifact = artifact_for(schema)
+        schema_indexes[key] = SchemaIndex(schema, artifact.value_index if artifact else None)
+    return schema_indexes[key]
+
+
+def match_score(query, value):
+    """
+    Score how well a normalized value matches a normalized query, from 0 to 1.
+    Exact matches score 1; otherwise each query word is scored against its best
+    value word (equal, prefix/substring or a close spelling) and the mean is scaled by 0.9.
+    """
+    if query == value:
+        return 1.0
+
+    value_tokens = value.split()
+    scores = [max((word_score(word, token) for token in value_tokens), default=0.0) for word in query.split()]
+    return 0.9 * sum(scores) / len(scores)
+
+
+def word_score(word, token):
+    """Score one query word against one value word"""
+    if word == token:
+        return 1.0
+    if word in token:
+        return 0.9
+    ratio = SequenceMatcher(None, word, token).ratio()
+    return ratio if ratio >= FUZZY_WORD_CUTOFF else 0.0
@@ -0,0 +1,112 @@
+import copy
+import json
+import logging
+import constants  # This configures logging
+
+logger = logging.getLogger(__name__)
+
+
+# Render a schema definition for a prompt in the given format.
+def render_schema(schema, format="json"):
+    """
+    Render the schema as text for a model prompt.
+    Every format carries the same tables, columns, types, descriptions and
+    values (or value counts in lookup mode); they differ only in overhead.
+    """
+    renderer = RENDERERS.get(format)
+    if renderer is None:
+        logger.warning(f"Unknown schema format: {format}, using json")
+        renderer = render_json
+    return renderer(schema)
+
+
+def render_json(schema):
+    """Indented JSON, as the schema file is written"""
+    return json.dumps(schema, indent=4)
+
+
+def render_json_min(schema):
+    """JSON without whitespace"""
+    return json.dumps(schema, separators=(",", ":"), ensure_ascii=False)
+
+
+def render_ddl(schema):
+    """SQL CREATE TABLE statements with descriptions and values as comments"""
+    lines = []
+    for table in schema.get("tables", []):
+        lines.append(f"-- {one_line(table.get('description', ''))}")
+        lines.append(f"CREATE TABLE {table['table_name']} (")
+        columns = table.get("columns", [])
+        for position, column in enumerate(columns):
+            separator = "," if position < len(columns) - 1 else ""
+            comment = one_line(column.get("description", ""))
+            values = describe_values(column, lambda value: "'" + value.replace("'", "''") + "'", ", ")
+            if values:
+                comment += f" Values: {values}"
+            lines.append(f"  {column['column_name']} {column.get('data_type', '')}{separator} -- {comment}")
+        lines.append(");")
+    return "\n".join(lines)
+
+
+def render_outline(schema):
+    """Indented YAML-like outline, one line per column plus one for its values"""
+    lines = []
+    for table in schema.get("tables", []):
+        lines.append(f"table {table['table_name']}: {one_line(table.get('description', ''))}")
+        for column in table.get("columns", []):
+            lines.append(f"  {column['column_name']} ({column.get('data_type', '')}): {one_line(column.get('description', ''))}")
+            values = describe_values(column, str, " | ")
+            if values:
+                lines.append(f"    values: {values}")
+    return "\n".join(lines)
+
+
+def render_tsv(schema):
+    """Tab-separated column table per table, values joined with |"""
+    lines = []
+    for table in schema.get("tables", []):
+        lines.append(f"table\t{table['table_name']}\t{one_line(table.get('description', ''))}")
+        lines.append("column\ttype\tdescription\tvalues")
+        for column in table.get("columns", []):
+            lines.append("\t".join([
+                column["column_name"],
+                column.get("data_type", ""),
+                one_line(column.get("description", "")),
+                describe_values(column, str, "|")
+            ]))
+    return "\n".join(lines)
+
+
+def compact_schema(schema):
+    """The schema with every possible_values list replaced by its length (lookup mode)"""
+    compact = copy.deepcopy(schema)
+    for table in compact.get("tables", []):
+        for column in table.get("columns", []):
+            values = column.pop("possible_values", None)
+            if values:
+                column["value_count"] = len(values)
+    return compact
+
+
+def describe_values(column, quote, separator):
+    """A column's possible values joined for display, or its value count in lookup mode"""
+    if column.get("possible_values"):
+        return separator.join(quote(value) for value in column["possible_values"])
+    if column.get("value_count"):
+        return f"{column['value_count']} values, use lookup_values"
+    return ""
+
+
+def one_line(text):
+    """Collapse whitespace (including newlines and tabs) so the text fits on one line"""
+    return " ".join(str(text).split())
+
+
+# Renderers by format name, as configured per stage in chatbot_config
+RENDERERS = {
+    "json": render_json,
+    "json_min": render_json_min,
+    "ddl": render_ddl,
+    "outline": render_outline,
+    "tsv": render_tsv,
+}
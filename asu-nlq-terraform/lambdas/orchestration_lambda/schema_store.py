@@ -0,0 +1,94 @@
+import time
+import logging
+import threading
+from botocore.exceptions import ClientError
+import constants  # This configures logging
+from chatbot_config import schema_pointer_suffix, schema_pointer_check_interval
+from schema_artifact import SchemaArtifact, register_artifact, loaded_artifacts
+from codec import loads
+import utilities
+
+logger = logging.getLogger(__name__)
+
+# Pointer state: the artifact in use, the pointer's ETag and when it was last checked
+current_artifact = None
+pointer_etag = None
+last_pointer_check = None
+pointer_lock = threading.Lock()
+
+
+# Load the schema for a request, from the compiled artifact when one is published.
+def load_schema():
+    """
+    Return the schema definition. A published artifact is loaded once by hash and
+    then reused; only the small pointer object is re-checked, at most every
+    schema_pointer_check_interval seconds. Without a pointer the raw template is downloaded.
+    """
+    artifact = get_schema_artifact()
+    if artifact is not None:
+        return artifact.schema
+
+    return utilities.download_s3_json()
+
+
+def get_schema_artifact():
+    """Return the current schema artifact, or None if no pointer is published"""
+    global current_artifact, pointer_etag, last_pointer_check
+
+    with pointer_lock:
+        now = time.monotonic()
+        if last_pointer_check is not None and now - last_pointer_check < schema_pointer_check_interval:
+            return current_artifact
+        last_pointer_check = now
+
+        pointer_key = constants.TEMPLATE_NAME + schema_pointer_suffix
+        request = {"Bucket": constants.DATABASE_DESCRIPTIONS_S3_NAME, "Key": pointer_key}
+        if current_artifact is not None and pointer_etag:
+            request["IfNoneMatch"] = pointer_etag
+
+        try:
+            response = utilities.s3_client.get_object(**request)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code in ("304", "NotModified"):
+                return current_artifact
+            if code in ("NoSuchKey", "404"):
+                if current_artifact is not None:
+                    logger.warning("Schema pointer removed, falling back to the raw template")
+                current_artifact = None
+                return None
+            if current_artifact is not None:
+                logger.warning(f"Schema pointer check failed, keeping artifact {current_artifact.hash[:12]}: {e}")
+                return current_artifact
+            logger.error(f"Schema pointer check failed: {e}")
+            raise
+
+        pointer = loads(response["Body"].read())
+        pointer_etag = response.get("ETag")
+
+        try:
+            current_artifact = load_artifact(pointer["hash"], pointer["artifact"])
+        except Exception as e:
+            if current_artifact is None:
+                logger.error(f"Failed to load schema artifact {pointer.get('hash')}: {e}")
+                raise
+            logger.warning(f"Failed to load schema artifact {pointer.get('hash')}, keeping {current_artifact.hash[:12]}: {e}")
+            pointer_etag = None
+
+        return current_artifact
+
+
+def load_artifact(hash, key):
+    """Return the artifact with this hash, downloading and verifying it the first time"""
+    if hash in loaded_artifacts:
+        return loaded_artifacts[hash]
+
+    logger.info("Downloading schema artifact %s from %s", hash[:12], key)
+    start = time.perf_counter()
+    response = utilities.s3_client.get_object(Bucket=constants.DATABASE_DESCRIPTIONS_S3_NAME, Key=key)
+    artifact = SchemaArtifact(loads(response["Body"].read()))
+    if artifact.hash != hash:
+        raise ValueError(f"Schema artifact {key} has hash {artifact.hash}, pointer expects {hash}")
+
+    logger.timer(f"Schema artifact {hash[:12]} loaded in {(time.perf_counter() - start) * 1000:.0f}ms")
+    return register_artifact(artifact)
@@ -0,0 +1,366 @@
+"""
+Server mode: one long-lived asyncio process running orchestrate() for many
+conversations at once, instead of two Lambda invocations per chat message.
+
+Requests arrive over HTTP (e.g. an API Gateway WebSocket HTTP integration that
+forwards the message body and maps the connection id to a header) or from an
+SQS queue, wait in a bounded queue and are picked up by SERVER_CONCURRENCY
+workers. Each conversation runs the Lambda's synchronous pipeline on a worker
+thread; nearly all of its time is spent waiting on Bedrock, the knowledge base
+and API Gateway (boto3 releases the GIL while waiting), so hundreds of
+conversations interleave in one process. Schema, index, latency and client
+caches stay warm and are shared by all of them.
+
+Endpoints:
+    POST /chat     WebSocket message body, connection id in X-Connection-Id
+    POST /chat/stream
+                   Same body; the frames are streamed back in the response as
+                   Server-Sent Events (or NDJSON with Accept: application/x-ndjson)
+    POST /cancel   Close the connection in X-Connection-Id
+    GET  /health   Queue and worker counters
+
+Callers of /chat, /chat/stream and /cancel send "Authorization: Bearer <SERVER_TOKEN>".
+Without SERVER_TOKEN the server trusts every caller, since a connection id is
+all it takes to post to or cancel a conversation; bind it to a private network
+only the gateway or queue can reach.
+
+Usage:
+    SERVER_TOKEN=... python server.py
+    SERVER_CONCURRENCY=128 SERVER_QUEUE_URL=https://sqs.../chat python server.py
+"""
+
+import os
+import hmac
+
+# Every conversation in flight may hold a connection to each AWS service
+os.environ.setdefault("AWS_MAX_POOL_CONNECTIONS", os.environ.get("SERVER_CONCURRENCY", "64"))
+
+import time
+import uuid
+import signal
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.exceptions import ClientError
+import constants  # This configures logging
+from constants import (
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_CONCURRENCY,
+    SERVER_QUEUE_SIZE,
+    SERVER_QUEUE_URL,
+    SERVER_SHUTDOWN_GRACE,
+    SERVER_TOKEN
+)
+from chatbot_config import request_budget
+from codec import dumps_bytes, loads, DECODE_ERRORS
+from deadline import Deadline
+from orchestration import orchestrate
+from structured_log import bind_request
+from transport import StreamTransport
+from warmup import warm_container
+import utilities
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1_048_576
+HTTP_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 503: "Service Unavailable"}
+
+
+# Checks the shared secret of a request to a conversation endpoint
+def authorized(headers, token=SERVER_TOKEN):
+    """True when no token is configured or the request carries it as a bearer token"""
+    if not token:
+        return True
+    scheme, _, supplied = headers.get("authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(supplied.strip().encode("utf-8"), token.encode("utf-8"))
+
+
+# Runs one chat event through the pipeline on a worker thread
+def process_event(event):
+    """Orchestrate one chat event, as the Lambda's background invocation does"""
+    connectionId = event["requestContext"]["connectionId"]
+    bind_request(event.get("request_id"), connectionId)
+    try:
+        orchestrate(event, deadline=Deadline(request_budget))
+    finally:
+        # The process outlives connections, so closed ones are forgotten once their conversation is done
+        utilities.closed_connections.discard(connectionId)
+
+
+class ChatServer:
+    """Bounded queue of chat events and the workers that orchestrate them"""
+
+    def __init__(self, concurrency=SERVER_CONCURRENCY, queue_size=SERVER_QUEUE_SIZE):
+        self.concurrency = concurrency
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="conversation")
+        self.workers = []
+        self.started = time.monotonic()
+        self.counts = {"accepted": 0, "rejected": 0, "completed": 0, "failed": 0, "in_flight": 0}
+
+    def start(self):
+        self.workers = [asyncio.create_task(self.work()) for _ in range(self.concurrency)]
+
+    async def stop(self, grace=SERVER_SHUTDOWN_GRACE):
+        """Let queued and in-flight conversations finish (up to the grace period), then stop the workers"""
+        try:
+            await asyncio.wait_for(self.queue.join(), grace)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping with {self.counts['in_flight']} conversations in flight and {self.queue.qsize()} queued")
+        for worker in self.workers:
+            worker.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, event, on_done=None):
+        """
+        Queue an event without waiting; False when the queue is full.
+        on_done is awaited with whether the conversation succeeded.
+        """
+        try:
+            self.queue.put_nowait((event, on_done))
+        except asyncio.QueueFull:
+            self.counts["rejected"] += 1
+            return False
+        self.counts["accepted"] += 1
+        return True
+
+    async def put(self, event, on_done=None):
+        """Queue an event, waiting for room"""
+        await self.queue.put((event, on_done))
+        self.counts["accepted"] += 1
+
+    async def work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            event, on_done = await self.queue.get()
+            self.counts["in_flight"] += 1
+            ok = False
+            try:
+                await loop.run_in_executor(self.executor, process_event, event)
+                self.counts["completed"] += 1
+                ok = True
+            except Exception as e:
+                self.counts["failed"] += 1
+                logger.error(f"Conversation failed: {e}")
+            finally:
+                self.counts["in_flight"] -= 1
+                self.queue.task_done()
+            if on_done:
+                await on_done(ok)
+
+    def health(self):
+        return {
+            **self.counts,
+            "queued": self.queue.qsize(),
+            "concurrency": self.concurrency,
+            "uptime_seconds": round(time.monotonic() - self.started, 1)
+        }
+
+    async def handle(self, method, path, headers, body):
+        """Status and JSON payload for one HTTP request"""
+        if method == "GET" and path == "/health":
+            return 200, self.health()
+        if method != "POST" or path not in ("/chat", "/cancel"):
+            return 404, {"error": "Not found"}
+        if not authorized(headers):
+            return 401, {"error": "Unauthorized"}
+
+        connectionId = headers.get("x-connection-id")
+        if not connectionId:
+            return 400, {"error": "X-Connection-Id header is required"}
+
+        if path == "/cancel":
+            # Not on the conversation executor, which may be fully busy
+            await asyncio.to_thread(utilities.close_connection, connectionId)
+            return 200, {"status": "cancelled"}
+
+        request_id = headers.get("x-request-id") or str(uuid.uuid4())
+        event = {
+            "requestContext": {"connectionId": connectionId, "routeKey": "sendMessage"},
+            "body": body.decode("utf-8"),
+            "request_id": request_id
+        }
+        if not self.submit(event):
+            return 503, {"error": "Server is busy, try again"}
+        return 202, {"status": "accepted", "request_id": request_id}
+
+    async def stream_chat(self, headers, body, writer):
+        """Run a conversation and stream its frames back as a chunked HTTP response"""
+        loop = asyncio.get_running_loop()
+        connectionId = headers.get("x-connection-id") or f"stream-{uuid.uuid4().hex}"
+        format = "ndjson" if "application/x-ndjson" in headers.get("accept", "") else "sse"
+
+        # Frames are written from the conversation's worker thread
+        def write(data):
+            if writer.is_closing():
+                raise ConnectionResetError("Client disconnected")
+            loop.call_soon_threadsafe(writer.write, b"%x\r\n%s\r\n" % (len(data), data))
+
+        transport = StreamTransport(write, lambda: loop.call_soon_threadsafe(writer.write, b"0\r\n\r\n"), format)
+        event = {
+            "requestContext": {"connectionId": connectionId, "routeKey": "sendMessage"},
+            "body": body.decode("utf-8"),
+            "request_id": headers.get("x-request-id") or str(uuid.uuid4())
+        }
+        done = loop.create_future()
+
+        async def finished(ok):
+            done.set_result(ok)
+
+        utilities.register_transport(connectionId, transport)
+        try:
+            if not self.submit(event, finished):
+                await write_response(writer, 503, {"error": "Server is busy, try again"})
+                return
+            content_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+            writer.write((f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nCache-Control: no-cache\r\n"
+                          f"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n").encode("latin-1"))
+            await done
+            transport.close(connectionId)
+            await asyncio.sleep(0)  # Let the final chunk be written
+            await writer.drain()
+        finally:
+            utilities.release_transport(connectionId)
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one keep-alive connection"""
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if method == "POST" and path == "/chat/stream":
+                    if authorized(headers):
+                        await self.stream_chat(headers, body, writer)
+                    else:
+                        await write_response(writer, 401, {"error": "Unauthorized"})
+                    break
+                status, payload = await self.handle(*request)
+                await write_response(writer, status, payload)
+                if request[2].get("connection", "").lower() == "close":
+                    break
+        except ValueError as e:
+            await write_response(writer, 400, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+async def read_request(reader):
+    """Method, path, lower-cased headers and body of the next request, or None at end of stream"""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ValueError("Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_BYTES:
+        raise ValueError(f"Request body over {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method, target.split("?", 1)[0], headers, body
+
+
+async def write_response(writer, status, payload):
+    body = dumps_bytes(payload)
+    head = (f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+# ============================================================================
+# SQS
+# ============================================================================
+
+async def consume_queue(server, queue_url):
+    """
+    Feed WebSocket events (the Lambda event shape) from an SQS queue.
+    A message is deleted once its conversation is done; failures are left
+    for SQS to redeliver after the visibility timeout.
+    """
+    sqs = boto3.client("sqs")
+    logger.info("Consuming %s", queue_url)
+
+    while True:
+        try:
+            response = await asyncio.to_thread(
+                sqs.receive_message, QueueUrl=queue_url, MaxNumberOfMessages=10, WaitTimeSeconds=20
+            )
+        except ClientError as e:
+            logger.error(f"Failed to receive from queue: {e}")
+            await asyncio.sleep(5)
+            continue
+
+        for message in response.get("Messages", []):
+            async def delete(ok=True, receipt=message["ReceiptHandle"]):
+                if ok:
+                    await asyncio.to_thread(sqs.delete_message, QueueUrl=queue_url, ReceiptHandle=receipt)
+
+            try:
+                event = loads(message["Body"])
+                event["requestContext"]["connectionId"]
+            except (*DECODE_ERRORS, KeyError, TypeError):
+                logger.error(f"Dropping malformed queue message {message.get('MessageId')}")
+                await delete()
+                continue
+            await server.put(event, delete)
+
+
+# ============================================================================
+# ENTRY POINT
+# ============================================================================
+
+async def serve(host=SERVER_HOST, port=SERVER_PORT, concurrency=SERVER_CONCURRENCY, queue_url=SERVER_QUEUE_URL):
+    """Run the server until SIGTERM or SIGINT"""
+    server = ChatServer(concurrency)
+
+    # Warm the shared caches, clients and connections before taking traffic
+    try:
+        await asyncio.to_thread(warm_container)
+    except Exception as e:
+        logger.warning(f"Warmup at startup failed, the first requests will initialize lazily: {e}")
+    if not SERVER_TOKEN:
+        logger.warning("SERVER_TOKEN is not set: any caller can post to or cancel a conversation, "
+                       "so %s:%s must only be reachable from a private network", host, port)
+
+    server.start()
+    http = await asyncio.start_server(server.handle_connection, host, port)
+    consumer = asyncio.create_task(consume_queue(server, queue_url)) if queue_url else None
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, stopping.set)
+
+    logger.custom(f" Server listening on {host}:{port} with {concurrency} conversation workers")
+    await stopping.wait()
+
+    logger.custom(" Server stopping")
+    http.close()
+    if consumer:
+        consumer.cancel()
+    await server.stop()
+    await http.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
@@ -0,0 +1,179 @@
+import contextvars
+import logging
+import traceback
+
+# Imported by constants while logging is configured, so this module only uses the
+# standard library at import time (the codec is imported on first JSON record).
+
+# ============================================================================
+# REQUEST CORRELATION
+# ============================================================================
+# The request being handled, attached to every record. Worker threads do not
+# inherit context variables, so the last bound request is also kept as a
+# process-wide fallback (a Lambda container handles one request at a time).
+
+_request = contextvars.ContextVar("request", default=None)
+_fallback = {"request_id": None, "connection_id": None}
+
+
+def bind_request(request_id=None, connection_id=None):
+    """Correlate all following log records with this request"""
+    request = {"request_id": request_id, "connection_id": connection_id}
+    _request.set(request)
+    _fallback.update(request)
+    return request
+
+
+def current_request():
+    """The request bound to this context, or the last one bound in the process"""
+    return _request.get() or _fallback
+
+
+class RequestContextFilter(logging.Filter):
+    """Add request_id and connection_id to every record"""
+
+    def filter(self, record):
+        request = current_request()
+        record.request_id = request["request_id"] or "-"
+        record.connection_id = request["connection_id"] or "-"
+        return True
+
+
+# ============================================================================
+# DEFERRED VALUES
+# ============================================================================
+
+class Lazy:
+    """A log argument computed only when a record is actually formatted"""
+
+    __slots__ = ("function", "args")
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def value(self):
+        return self.function(*self.args)
+
+    def __str__(self):
+        return str(self.value())
+
+
+def first_key(mapping):
+    """The first key of a mapping (the kind of a stream event), or None"""
+    return next(iter(mapping), None)
+
+
+class LazyJson:
+    """A payload logged as JSON: embedded as-is in JSON output, encoded and shortened in text output"""
+
+    __slots__ = ("payload", "limit")
+
+    def __init__(self, payload, limit=500):
+        self.payload = payload
+        self.limit = limit
+
+    def value(self):
+        return self.payload
+
+    def __str__(self):
+        from codec import dumps
+        text = dumps(self.payload)
+        return text if len(text) <= self.limit else f"{text[:self.limit]}... ({len(text)} chars)"
+
+
+# ============================================================================
+# EVENT SAMPLING
+# ============================================================================
+
+class EventSampler:
+    """
+    Keep one record in N per event type, by counting rather than random draws.
+    The rate for an event is the share of records kept (1.0 keeps all).
+    """
+
+    def __init__(self, rates=None):
+        self.rates = dict(rates or {})
+        self.counts = {}
+
+    def every(self, event):
+        """Keep one in this many records of the event (0 drops all)"""
+        rate = self.rates.get(event, 1.0)
+        if rate >= 1:
+            return 1
+        return max(1, round(1 / rate)) if rate > 0 else 0
+
+    def sample(self, event):
+        every = self.every(event)
+        if every <= 1:
+            return every == 1
+        count = self.counts.get(event, 0)
+        self.counts[event] = count + 1
+        return count % every == 0
+
+
+sampler = EventSampler()
+
+
+def log_event(logger, level, event, message, **fields):
+    """
+    Log a structured event. Nothing is formatted unless the level is enabled
+    and the event is sampled; field values may be Lazy.
+    """
+    if not logger.isEnabledFor(level) or not sampler.sample(event):
+        return
+    logger.log(level, message, extra={"event": event, "fields": fields, "sample_every": sampler.every(event)})
+
+
+# ============================================================================
+# FORMATTERS
+# ============================================================================
+
+class TextFormatter(logging.Formatter):
+    """The configured text format, with event fields appended as key=value"""
+
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, for CloudWatch Logs Insights queries"""
+
+    def format(self, record):
+        from codec import dumps
+
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "connection_id": getattr(record, "connection_id", "-"),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            entry["event"] = event
+            if record.sample_every != 1:
+                entry["sample_every"] = record.sample_every
+            for key, value in record.fields.items():
+                entry[key] = value.value() if isinstance(value, (Lazy, LazyJson)) else value
+        if record.exc_info:
+            entry["exception"] = "".join(traceback.format_exception(*record.exc_info))
+
+        try:
+            return dumps(entry)
+        except TypeError:
+            return dumps({key: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+                          for key, value in entry.items()})
+
+
+def install(output="text", text_format=None, sample_rates=None):
+    """Attach request correlation and the chosen formatter to the root handlers"""
+    sampler.rates = dict(sample_rates or {})
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(RequestContextFilter())
+        handler.setFormatter(JsonFormatter() if output == "json" else TextFormatter(text_format))
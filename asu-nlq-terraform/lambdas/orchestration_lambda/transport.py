@@ -0,0 +1,143 @@
+import logging
+import threading
+from botocore.exceptions import ClientError
+import constants  # This configures logging
+from codec import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+# Every transport carries the same frame protocol: JSON objects typed info,
+# messageStart, contentBlockDelta, breakTokenType, messageStop, data, ...
+# (plus untyped {"message": ...} frames for classic responses).
+
+
+class ConnectionGone(Exception):
+    """The client on the other end of a transport has gone away"""
+    pass
+
+
+class Transport:
+    """Delivers frames to the client of a connection"""
+
+    name = "transport"
+
+    def send(self, connectionId, frame):
+        """Deliver one frame; raise ConnectionGone when the client has left"""
+        raise NotImplementedError
+
+    def is_open(self, connectionId):
+        """False once the client is known to have left"""
+        return True
+
+    def close(self, connectionId):
+        """End the response or connection"""
+        pass
+
+
+class WebSocketTransport(Transport):
+    """API Gateway WebSocket: one management API post_to_connection request per frame"""
+
+    name = "websocket"
+
+    def __init__(self, client):
+        self.client = client
+
+    def send(self, connectionId, frame):
+        try:
+            self.client.post_to_connection(ConnectionId=connectionId, Data=dumps_bytes(frame))
+        except self.client.exceptions.GoneException:
+            raise ConnectionGone(connectionId)
+
+    def is_open(self, connectionId):
+        try:
+            self.client.get_connection(ConnectionId=connectionId)
+        except self.client.exceptions.GoneException:
+            return False
+        except ClientError as e:
+            # A failed check is not proof the client left - carry on
+            logger.warning(f"Failed to check connection {connectionId}: {e}")
+        return True
+
+    def close(self, connectionId):
+        try:
+            self.client.delete_connection(ConnectionId=connectionId)
+        except self.client.exceptions.GoneException:
+            logger.info("Connection was already closed")
+
+
+class StreamTransport(Transport):
+    """
+    One streamed HTTP response per connection: Server-Sent Events ("sse",
+    a "data:" line per frame) or newline-delimited JSON ("ndjson") over
+    chunked transfer encoding. write is called with each encoded frame and
+    raises ConnectionError (or OSError) once the client has disconnected;
+    end, if given, is called once when the response is finished.
+    """
+
+    name = "stream"
+    FORMATS = ("sse", "ndjson")
+
+    def __init__(self, write, end=None, format="sse"):
+        if format not in self.FORMATS:
+            raise ValueError(f"Stream format must be one of {self.FORMATS}")
+        self.write = write
+        self.end = end
+        self.format = format
+        self.closed = False
+
+    def encode(self, frame):
+        data = dumps_bytes(frame)
+        return b"data: " + data + b"\n\n" if self.format == "sse" else data + b"\n"
+
+    def send(self, connectionId, frame):
+        if self.closed:
+            raise ConnectionGone(connectionId)
+        try:
+            self.write(self.encode(frame))
+        except OSError:
+            self.closed = True
+            raise ConnectionGone(connectionId)
+
+    def is_open(self, connectionId):
+        return not self.closed
+
+    def close(self, connectionId):
+        if not self.closed:
+            self.closed = True
+            if self.end:
+                self.end()
+
+
+class MemoryTransport(Transport):
+    """Keeps frames in memory per connection, for tests, benchmarks and offline runs"""
+
+    name = "memory"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = {}
+        self.closed = set()
+
+    def send(self, connectionId, frame):
+        if connectionId in self.closed:
+            raise ConnectionGone(connectionId)
+        with self.lock:
+            self.frames.setdefault(connectionId, []).append(frame)
+
+    def is_open(self, connectionId):
+        return connectionId not in self.closed
+
+    def close(self, connectionId):
+        self.closed.add(connectionId)
+
+    def text(self, connectionId):
+        """The streamed answer text of a connection, with BREAK_TOKEN frames restored"""
+        parts = []
+        for frame in self.frames.get(connectionId, []):
+            if frame.get("type") == "contentBlockDelta":
+                parts.append(frame["data"]["delta"].get("text", ""))
+            elif frame.get("type") == "breakTokenType":
+                parts.append("BREAK_TOKEN")
+            elif "message" in frame and "type" not in frame:
+                parts.append(frame["message"])
+        return "".join(parts)
@@ -1,10 +1,42 @@
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
-import json
+import math
+import contextvars
+import threading
+import time
 import logging
-import traceback
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
 import constants  # This configures logging
 from TestingTimer import timer
+from chatbot_config import (
+    minimum_stage_budget,
+    get_budget,
+    truncated_response_notice,
+    knowledge_base_timeout_message,
+    result_max_rows,
+    result_max_tokens,
+    result_top_k,
+    result_format,
+    data_frame_max_rows,
+    data_frame_max_bytes,
+    data_frame_include_sql,
+    get_route,
+    get_tool_config,
+    hedge_percentile,
+    hedge_min_samples,
+    hedge_default_delay,
+    schema_lookup_tool,
+    schema_lookup_max_rounds
+)
+from deadline import StageTimeout, TIMEOUT_ERRORS
+from latency import get_histogram
+from results import ResultTable
+from codec import dumps_bytes, loads, DECODE_ERRORS
+from transport import WebSocketTransport, ConnectionGone
+from structured_log import log_event, first_key, Lazy, LazyJson
+from request_trace import record_stage, record_stream_usage
 
 logger = logging.getLogger(__name__)
 
@@ -16,13 +48,14 @@ def get_clients():
     
     try:
         apiGatewayURL = "https" + constants.API_GATEWAY_URL[3:] + "/prod"
-        logger.info(f"API Gateway URL: {apiGatewayURL}")
+        logger.info("API Gateway URL: %s", apiGatewayURL)
         
         # Initialize AWS service clients
-        gateway = boto3.client("apigatewaymanagementapi", endpoint_url=apiGatewayURL)
-        bedrock = boto3.client('bedrock-runtime')
-        s3_client = boto3.client('s3')
-        agent = boto3.client('bedrock-agent-runtime')
+        config = Config(max_pool_connections=constants.AWS_MAX_POOL_CONNECTIONS)
+        gateway = boto3.client("apigatewaymanagementapi", endpoint_url=apiGatewayURL, config=config)
+        bedrock = boto3.client('bedrock-runtime', config=config)
+        s3_client = boto3.client('s3', config=config)
+        agent = boto3.client('bedrock-agent-runtime', config=config)
         
         logger.info("AWS clients initialized successfully")
         return gateway, bedrock, s3_client, agent
@@ -34,19 +67,161 @@ def get_clients():
 # Initialize AWS service clients
 gateway, bedrock, s3_client, agent = get_clients()
 
+# Connections the client has closed or cancelled - nothing more is sent to them
+closed_connections = set()
 
-# Function to send JSON data to client via WebSocket connection
+# Transports of connections not served over the API Gateway WebSocket (see transport.py)
+transports = {}
+websocket_transport = None
+
+# Worker threads for hedged model requests (a primary and a hedge per call, so twice the pool)
+hedge_executor = ThreadPoolExecutor(max_workers=max(8, 2 * constants.AWS_MAX_POOL_CONNECTIONS), thread_name_prefix="hedge")
+
+# Bedrock error codes after which the next model in a route is tried
+FALLBACK_ERROR_CODES = {
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "ModelErrorException",
+    "InternalServerException"
+}
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client's WebSocket connection is no longer available"""
+    pass
+
+
+# Read timeouts budgeted clients are created with. A stage starts with just under its
+# budget left, which floors to the budget less a second; other remaining times drop to
+# the next lower power of two. Few distinct timeouts keep the clients' pools warm.
+TIMEOUT_BUCKETS = sorted(
+    {minimum_stage_budget}
+    | {2 ** power for power in range(1, 8)}
+    | {max(math.floor(get_budget(stage)) - 1, minimum_stage_budget)
+       for stage in ("classify", "create_question", "knowledge_base", "final_response", "no_sql")}
+)
+
+
+# A function to round a remaining time down to a client timeout
+def timeout_bucket(remaining):
+    """Return the largest timeout bucket that fits in the remaining seconds"""
+    fitting = [bucket for bucket in TIMEOUT_BUCKETS if bucket <= remaining]
+    return fitting[-1] if fitting else minimum_stage_budget
+
+
+# Budgeted clients are created on request threads; boto3 sessions are not thread-safe,
+# so they come from one dedicated session and are created one at a time
+_client_session = boto3.session.Session()
+_client_lock = threading.Lock()
+
+
+# A function to return a client whose timeouts fit inside a time budget
+@lru_cache(maxsize=32)
+def get_budgeted_client(service, read_timeout):
+    """
+    Return a client for the service with connect/read timeouts bounded by read_timeout.
+    Each call makes a single attempt (no retries) so it can never outlive its budget.
+    Clients are cached per timeout bucket to keep connection pools warm.
+    """
+    logger.info("Initializing %s client with read timeout: %ss", service, read_timeout)
+    config = Config(
+        connect_timeout=min(read_timeout, 5),
+        read_timeout=read_timeout,
+        retries={"total_max_attempts": 1},
+        max_pool_connections=constants.AWS_MAX_POOL_CONNECTIONS
+    )
+    with _client_lock:
+        return _client_session.client(service, config=config)
+
+
+# A function to return the Lambda client used to start background processing
+@lru_cache(maxsize=None)
+def get_lambda_client():
+    """Return the Lambda client, created once per container instead of once per request"""
+    return boto3.client('lambda', config=Config(max_pool_connections=constants.AWS_MAX_POOL_CONNECTIONS))
+
+
+# A function to pick the client for a call given its (optional) deadline
+def client_for_deadline(service, default_client, deadline=None):
+    """Return the default client, or a budgeted one when a deadline is given"""
+    if deadline is None:
+        return default_client
+
+    remaining = deadline.remaining()
+    if remaining < minimum_stage_budget:
+        raise StageTimeout(f"Only {remaining:.2f}s left, not starting {service} call")
+
+    return get_budgeted_client(service, timeout_bucket(remaining))
+
+
+# Function to record that a client connection is gone
+def mark_connection_closed(connectionId):
+    """Remember a closed connection so later sends fail fast without an API call"""
+    if connectionId not in closed_connections:
+        logger.warning(f"Client connection closed: {connectionId}")
+        closed_connections.add(connectionId)
+
+
+# Transport of the connection's client, the API Gateway WebSocket unless another is registered
+def transport_for(connectionId):
+    """Return the transport frames for this connection are delivered through"""
+    global websocket_transport
+
+    transport = transports.get(connectionId)
+    if transport is not None:
+        return transport
+    if websocket_transport is None or websocket_transport.client is not gateway:
+        websocket_transport = WebSocketTransport(gateway)
+    return websocket_transport
+
+
+# Function to route a connection's frames through another transport (HTTP stream, memory)
+def register_transport(connectionId, transport):
+    """Deliver this connection's frames through the given transport until released"""
+    transports[connectionId] = transport
+
+
+def release_transport(connectionId):
+    """Return the connection to the default WebSocket transport"""
+    transports.pop(connectionId, None)
+
+
+# Function to check that the client is still connected before starting more work
+def ensure_connection_open(connectionId):
+    """Raise ClientDisconnected if the client has closed or cancelled the connection"""
+    if connectionId in closed_connections:
+        raise ClientDisconnected(f"Connection {connectionId} is closed")
+
+    if not transport_for(connectionId).is_open(connectionId):
+        mark_connection_closed(connectionId)
+        raise ClientDisconnected(f"Connection {connectionId} is closed")
+
+
+# Function to close a client connection (used for explicit cancel requests)
+def close_connection(connectionId):
+    """Close the client's connection so in-flight work for it stops"""
+    logger.info("Closing connection: %s", connectionId)
+    transport_for(connectionId).close(connectionId)
+    mark_connection_closed(connectionId)
+
+
+# Function to send a frame to the client through its transport
 def send_to_gateway(connectionId, json_data):
-    """Send JSON data to client via WebSocket connection"""
-    logger.info(f"Sending data to connection: {json_data}")
+    """Send a JSON frame to the client (over the WebSocket unless another transport is registered)"""
+    # One record per frame on the hot path: sampled, and the payload is only encoded if emitted
+    log_event(logger, logging.DEBUG, "frame", "Sending frame", type=json_data.get("type"), frame=LazyJson(json_data))
+
+    if connectionId in closed_connections:
+        raise ClientDisconnected(f"Connection {connectionId} is closed")
     
     try:
-        gateway.post_to_connection(
-            ConnectionId=connectionId, 
-            Data=json.dumps(json_data)
-        )
-        logger.info("Data sent successfully")
-        
+        transport_for(connectionId).send(connectionId, json_data)
+
+    except ConnectionGone:
+        mark_connection_closed(connectionId)
+        raise ClientDisconnected(f"Connection {connectionId} is closed")
     except ClientError as e:
         logger.error(f"Failed to send to gateway: {e}")
         raise
@@ -56,49 +231,202 @@ def send_to_gateway(connectionId, json_data):
 
 
 # Function to converse with Bedrock AI model
-def converse_with_model(modelId, chatHistory, config=None, system=None, streaming=False):
-    """Get response from Bedrock AI model with optional streaming"""
-    logger.info(f"Conversing with model: {modelId}, streaming: {streaming}")
+def converse_with_model(modelId, chatHistory, config=None, system=None, streaming=False, deadline=None, tool_config=None):
+    """
+    Get response from Bedrock AI model with optional streaming, bounded by an optional deadline.
+    A tool_config forces a structured (tool call) answer.
+    """
+    logger.info("Conversing with model: %s, streaming: %s", modelId, streaming)
     
     try:
+        client = client_for_deadline('bedrock-runtime', bedrock, deadline)
+        request = {
+            "modelId": modelId,
+            "messages": chatHistory,
+            "inferenceConfig": config,
+            "system": system
+        }
+        if tool_config:
+            request["toolConfig"] = tool_config
+
         if streaming:
-            response = bedrock.converse_stream(
-                modelId=modelId,
-                messages=chatHistory,
-                inferenceConfig=config,
-                system=system
-            )
+            response = client.converse_stream(**request)
         else:
-            response = bedrock.converse(
-                modelId=modelId,
-                messages=chatHistory,
-                inferenceConfig=config,
-                system=system
-            )
+            response = client.converse(**request)
         
         logger.info("Model conversation completed")
         return response
         
+    except StageTimeout:
+        raise
+    except TIMEOUT_ERRORS as e:
+        logger.warning(f"Model conversation timed out: {e}")
+        raise StageTimeout(f"Model {modelId} did not respond within its time budget") from e
     except ClientError as e:
         logger.error(f"Bedrock client error: {e}")
         raise
     except Exception as e:
         logger.error(f"Model conversation failed: {e}")
-        logger.debug(f"Traceback: {traceback.format_exc()}")
+        logger.debug("Traceback", exc_info=True)
         raise
 
 
+# Function to converse with the models routed to a pipeline stage
+def converse_with_route(stage, chatHistory, config=None, system=None, streaming=False, deadline=None, tool_config=None):
+    """
+    Get a response for a pipeline stage using its model route.
+    Models are tried in order when one is throttled or unavailable, and
+    non-streaming calls on hedged routes race the first fallback once the
+    primary is slower than its usual latency.
+    The stage's own tool configuration is used unless one is given.
+    """
+    route = get_route(stage)
+    models = route["models"]
+    tool_config = None if streaming else (tool_config or get_tool_config(stage))
+    logger.info("Routing %s to models: %s", stage, models)
+
+    if route["hedge"] and not streaming and len(models) > 1:
+        return hedged_converse(stage, models, chatHistory, config, system, deadline, tool_config)
+
+    last_error = None
+    for modelId in models:
+        try:
+            return timed_converse(stage, modelId, chatHistory, config, system, streaming, deadline, tool_config)
+        except ClientError as e:
+            if not is_fallback_error(e):
+                raise
+            logger.warning(f"Model {modelId} unavailable for {stage}, trying next model: {e}")
+            last_error = e
+
+    raise last_error
+
+
+# Function to converse with a stage that looks up schema values through a tool
+def converse_with_lookup(stage, chatHistory, index, config=None, system=None, deadline=None):
+    """
+    Run a non-streaming stage whose prompt carries no schema values.
+    Each lookup_values call is answered from the in-memory schema index and sent
+    back to the model until it answers; after the last allowed round the answer
+    is forced. Returns the model's final response.
+    """
+    lookup_name = schema_lookup_tool["toolSpec"]["name"]
+    messages = list(chatHistory)
+    lookups = 0
+
+    for round_number in range(schema_lookup_max_rounds + 1):
+        final_round = round_number == schema_lookup_max_rounds
+        response = converse_with_route(
+            stage,
+            messages,
+            config=config,
+            system=system,
+            streaming=False,
+            deadline=deadline,
+            tool_config=get_tool_config(stage, force_answer=final_round)
+        )
+
+        message = response["output"]["message"]
+        tool_uses = [block["toolUse"] for block in message["content"] if "toolUse" in block]
+        requests = [tool_use for tool_use in tool_uses if tool_use["name"] == lookup_name]
+        if not requests or len(requests) < len(tool_uses):
+            logger.info("%s answered after %s schema lookups in %s calls", stage, lookups, round_number + 1)
+            return response
+
+        if final_round:
+            raise ValueError(f"{stage} still looking up values after {schema_lookup_max_rounds} rounds")
+
+        lookups += len(requests)
+        messages.append(message)
+        messages.append({
+            "role": "user",
+            "content": [
+                {
+                    "toolResult": {
+                        "toolUseId": request["toolUseId"],
+                        "content": [{"json": index.lookup(request["input"].get("column"), request["input"].get("query", ""))}]
+                    }
+                }
+                for request in requests
+            ]
+        })
+
+
+# Function to race a slow primary model against its fallback
+def hedged_converse(stage, models, chatHistory, config, system, deadline, tool_config=None):
+    """
+    Send the request to the primary model and, if it has not answered by the
+    route's hedge delay, send a duplicate to the fallback and use whichever
+    finishes first. The losing request is left to finish in the background.
+    """
+    primary, fallback = models[0], models[1]
+    delay = get_hedge_delay(stage, primary)
+
+    primary_future = hedge_executor.submit(contextvars.copy_context().run, timed_converse, stage, primary, chatHistory, config, system, False, deadline, tool_config)
+    done, _ = wait([primary_future], timeout=delay)
+
+    if done:
+        error = primary_future.exception()
+        if error is None:
+            return primary_future.result()
+        if not (isinstance(error, ClientError) and is_fallback_error(error)):
+            raise error
+        logger.warning(f"Model {primary} failed for {stage}, using fallback {fallback}: {error}")
+        return timed_converse(stage, fallback, chatHistory, config, system, False, deadline, tool_config)
+
+    logger.info("Model %s slower than %.2fs for %s, hedging with %s", primary, delay, stage, fallback)
+    hedge_future = hedge_executor.submit(contextvars.copy_context().run, timed_converse, stage, fallback, chatHistory, config, system, False, deadline, tool_config)
+    futures = {primary_future: primary, hedge_future: fallback}
+
+    last_error = None
+    for future in as_completed(futures):
+        if future.exception() is None:
+            logger.info("Hedged %s request answered by %s", stage, futures[future])
+            return future.result()
+        last_error = future.exception()
+        logger.warning(f"Hedged {stage} request to {futures[future]} failed: {last_error}")
+
+    raise last_error
+
+
+# Function to call a model and record the latency of its route
+def timed_converse(stage, modelId, chatHistory, config, system, streaming, deadline, tool_config=None):
+    """Call converse_with_model and record its latency in the route's histogram"""
+    start = time.perf_counter()
+    response = converse_with_model(modelId, chatHistory, config=config, system=system, streaming=streaming, deadline=deadline, tool_config=tool_config)
+    elapsed = time.perf_counter() - start
+    get_histogram(f"{stage}:{modelId}").record(elapsed)
+    record_stage(stage, elapsed, None if streaming else response.get("usage"), streaming=streaming)
+    return response
+
+
+# Function to decide how long to wait before hedging a request
+def get_hedge_delay(stage, modelId):
+    """Return the route's latency percentile, or the default until enough samples exist"""
+    histogram = get_histogram(f"{stage}:{modelId}")
+    if histogram.count < hedge_min_samples:
+        return hedge_default_delay
+    return histogram.percentile(hedge_percentile)
+
+
+# Function to check whether an error should move a request to the next model
+def is_fallback_error(error):
+    """True for Bedrock errors that another model may not hit (throttling, outages)"""
+    return error.response.get("Error", {}).get("Code") in FALLBACK_ERROR_CODES
+
+
 # Function to parse streaming response and send events to client 
 # Classic is when the response is not streaming just one whole string message
 # Pure is when the response is a string and not a dict from the model
 # Info is an update for the frontend from before the final response is made (Info messages never stream, and are always sent as a single message)
-def parse_and_send_response(response, connectionId, classic=None, pure=None, info=None):
+# Deadline bounds how long a streaming response may run before it is cut short
+def parse_and_send_response(response, connectionId, classic=None, pure=None, info=None, deadline=None):
     """Parse streaming response and send events to client in real-time"""
     logger.info("Parsing and sending response")
     
     # Initialize buffer for BREAK_TOKEN detection
     buffer = ""
     BREAK_TOKEN = "BREAK_TOKEN"
+    stream = None
     
     try:
 
@@ -130,9 +458,11 @@ def parse_and_send_response(response, connectionId, classic=None, pure=None, inf
         stream = response.get('stream')
         if stream:
             event_count = 0
-            for event in stream:
+            stream_start = time.perf_counter()
+            for event in bounded_stream(stream, deadline):
                 event_count += 1
-                
+                log_event(logger, logging.DEBUG, "stream_event", "Stream event", count=event_count, kind=Lazy(first_key, event))
+
                 # Handle content delta events (partial response chunks)
                 if "contentBlockDelta" in event:
                     contentBlockDelta = event["contentBlockDelta"]
@@ -310,26 +640,132 @@ def parse_and_send_response(response, connectionId, classic=None, pure=None, inf
                     # skip
                     continue
                 elif "metadata" in event:
-                    # skip
+                    record_stream_usage(event["metadata"].get("usage"))
                     continue
                 else:
                     logger.warning(f"Unhandled event type: {event}")
             
-            logger.info(f"Processed {event_count} streaming events")
+            record_stage("response_stream", time.perf_counter() - stream_start)
+            logger.info("Processed %s streaming events", event_count)
             
+    except ClientDisconnected:
+        # Stop paying for tokens nobody will read
+        logger.info("Client disconnected, aborting response stream")
+        if stream:
+            close_stream(stream)
+        raise
     except Exception as e:
         logger.error(f"Response parsing failed: {e}")
-        logger.debug(f"Traceback: {traceback.format_exc()}")
+        logger.debug("Traceback", exc_info=True)
         raise
 
 
+# Function to iterate a Bedrock stream without running past a deadline
+def bounded_stream(stream, deadline=None):
+    """
+    Yield events from a Bedrock stream until it ends or the deadline passes.
+    When cut short, the stream is closed and a truncation notice plus a
+    messageStop are emitted so the client always receives a complete message.
+    """
+    stopped = False
+    try:
+        for event in stream:
+            yield event
+            stopped = stopped or "messageStop" in event
+            if not stopped and deadline is not None and deadline.expired():
+                logger.warning("Stream exceeded its time budget, truncating response")
+                break
+        else:
+            return
+    except TIMEOUT_ERRORS as e:
+        logger.warning(f"Stream read timed out, truncating response: {e}")
+
+    close_stream(stream)
+
+    if not stopped:
+        yield {"contentBlockDelta": {"delta": {"text": truncated_response_notice}}}
+        yield {"messageStop": {"stopReason": "deadline_exceeded"}}
+
+
+# Function to close a Bedrock stream early
+def close_stream(stream):
+    """Close a model stream so Bedrock stops generating for it"""
+    try:
+        stream.close()
+        logger.info("Model stream closed")
+    except Exception as e:
+        logger.warning(f"Failed to close model stream: {e}")
+
+
+# Function to send a result table to the client as structured data frames
+def send_result_table(connectionId, table):
+    """
+    Send result rows to the client as "data" frames, so a table can be shown
+    before the prose answer streams. Rows are split across frames to keep
+    each frame under the WebSocket size cap.
+    """
+    logger.info("Sending result table with %s rows", table.row_count)
+
+    rows = table.json_rows(data_frame_max_rows)
+    header = {
+        "columns": table.columns,
+        "types": table.types,
+        "totalRows": table.row_count,
+        "truncated": table.row_count > len(rows)
+    }
+
+    # Split rows greedily by encoded size, leaving room for the frame envelope
+    budget = data_frame_max_bytes - len(dumps_bytes(header)) - 256
+    chunks, current, size = [], [], 0
+    for row in rows:
+        row_size = len(dumps_bytes(row)) + 1
+        if current and size + row_size > budget:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(row)
+        size += row_size
+    chunks.append(current)
+
+    for index, chunk in enumerate(chunks):
+        json_data = {
+            "type": "data",
+            "data": {
+                **header,
+                "chunk": index,
+                "chunks": len(chunks),
+                "rows": chunk
+            }
+        }
+        if index == 0 and data_frame_include_sql and table.sql:
+            json_data["data"]["sql"] = table.sql
+        send_to_gateway(connectionId, json_data)
+
+    logger.info("Result table sent in %s data frames", len(chunks))
+
+
+# Function to wrap a finished text answer as a model stream
+def text_as_stream(text):
+    """
+    Wrap a complete text answer in the shape of a converse_stream response,
+    so it goes out through the same frames as a streamed model answer.
+    """
+    return {
+        "stream": [
+            {"messageStart": {"role": "assistant"}},
+            {"contentBlockDelta": {"delta": {"text": text}, "contentBlockIndex": 0}},
+            {"contentBlockStop": {"contentBlockIndex": 0}},
+            {"messageStop": {"stopReason": "end_turn"}}
+        ]
+    }
+
+
 # Function to download and parse JSON file from S3 bucket
 def download_s3_json(bucket_name=None, file_key=None):
     """Download and parse JSON file from S3 bucket"""
     bucket = bucket_name or constants.DATABASE_DESCRIPTIONS_S3_NAME
     key = file_key or (constants.TEMPLATE_NAME + ".json")
     
-    logger.info(f"Downloading JSON from S3: {bucket}/{key}")
+    logger.info("Downloading JSON from S3: %s/%s", bucket, key)
     
     try:
         # Download the JSON file from S3
@@ -337,7 +773,7 @@ def download_s3_json(bucket_name=None, file_key=None):
         
         # Read file content and parse as JSON
         file_content = response['Body'].read()
-        json_data = json.loads(file_content)
+        json_data = loads(file_content)
         
         logger.info("JSON file downloaded and parsed successfully")
         return json_data
@@ -345,7 +781,7 @@ def download_s3_json(bucket_name=None, file_key=None):
     except ClientError as e:
         logger.error(f"S3 client error downloading JSON: {e}")
         raise
-    except json.JSONDecodeError as e:
+    except DECODE_ERRORS as e:
         logger.error(f"Failed to parse JSON file: {e}")
         raise
     except Exception as e:
@@ -356,7 +792,7 @@ def download_s3_json(bucket_name=None, file_key=None):
 # Function to create a formatted conversation history for AI model input
 def create_history(chatHistory):
     """Create a formatted conversation history for AI model input"""
-    logger.info(f"Creating history from {len(chatHistory)} messages")
+    logger.info("Creating history from %s messages", len(chatHistory))
     
     try:
         history = ""
@@ -377,7 +813,11 @@ def create_history(chatHistory):
 
 
 # Function to execute a knowledge base query using Bedrock Agent Runtime
-def execute_knowledge_base_query(question):
+def execute_knowledge_base_query(question, deadline=None):
+    """
+    Run a question against the knowledge base and collect every result row into a ResultTable.
+    Returns a message string instead when retrieval fails or times out.
+    """
     try:
         # Set up the knowledge base ID and retrieval configuration
         knowledge_base_id = constants.KNOWLEDGE_BASE_ID
@@ -386,20 +826,23 @@ def execute_knowledge_base_query(question):
         }
         
         # Retrieve from the Knowledge base
-        logger.info(f"Retrieving from knowledge base with query: {query['text']}")
+        logger.info("Retrieving from knowledge base with query: %s", query['text'])
         try:
             logger.timer(timer.checkpoint("A Knowledge base retrieval Started"))
-            kb_results = agent.retrieve(knowledgeBaseId=knowledge_base_id, retrievalQuery=query)
+            client = client_for_deadline('bedrock-agent-runtime', agent, deadline)
+            kb_results = client.retrieve(knowledgeBaseId=knowledge_base_id, retrievalQuery=query)
+        except (StageTimeout, *TIMEOUT_ERRORS) as e:
+            logger.warning(f"Knowledge base retrieval exceeded its time budget: {e}")
+            return knowledge_base_timeout_message
         except Exception as e:
             logger.error(f"Knowledge base retrieval failed: {e}")
-            kb_results = {'retrievalResults': [{"content": {"row": "An error occurred while retrieving from the knowledge base. Please have the user try again."}, "location": {"sqlLocation": {"query": "No query executed"}}}]}
+            return "An error occurred while retrieving from the knowledge base. Please have the user try again."
         
-        # Get the results from the knowledge base
-        results = str(kb_results['retrievalResults'][0]['content']['row'])
-        query_value = kb_results['retrievalResults'][0]['location']['sqlLocation']['query']
-        logger.custom(" Query used: " + query_value)
+        # Collect every result row into a columnar table
+        results = ResultTable.from_retrieval_results(kb_results.get('retrievalResults', []))
+        logger.custom(" Query used: " + str(results.sql or "No query executed"))
 
-        logger.info("Knowledge base retrieval query:", query_value)
+        logger.info("Knowledge base returned %s rows", results.row_count)
         
         return results
         
@@ -409,9 +852,15 @@ def execute_knowledge_base_query(question):
 
 
 def format_results_for_response(question, result):
-    """Format a single question-result pair for final response"""
+    """
+    Format a single question-result pair for final response.
+    Result tables are rendered compactly and capped so the prompt size stays bounded.
+    """
     logger.info("Formatting results for final response")
     try:
+        if isinstance(result, ResultTable):
+            result = "\n" + result.render_for_prompt(result_max_rows, result_max_tokens, result_top_k, result_format)
+
         # Format the single question-result pair
         final_response = f"Question asked was: {question}\nThe answer found was: {result}"
         logger.info("Results formatted successfully")
@@ -420,6 +869,22 @@ def format_results_for_response(question, result):
         logger.error(f"Failed to format results: {e}")
         raise
 
+def get_structured_output(response):
+    """
+    Return the JSON object produced by a non-streaming model call.
+    In tool mode this is the tool call input and needs no parsing; in text
+    mode the JSON object is parsed out of the response text.
+    """
+    content = response["output"]["message"]["content"]
+
+    for block in content:
+        if "toolUse" in block and block["toolUse"]["name"] != schema_lookup_tool["toolSpec"]["name"]:
+            return block["toolUse"]["input"]
+
+    text = "".join(block.get("text", "") for block in content)
+    return loads(extract_json_content(text))
+
+
 def extract_json_content(text):
     """
     Extracts content between the first '{' and last '}' in a string.
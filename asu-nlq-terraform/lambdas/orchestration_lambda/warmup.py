@@ -0,0 +1,153 @@
+import os
+import time
+import logging
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import constants  # This configures logging
+from constants import WARM_ON_INIT
+from chatbot_config import model_routes, get_budget, canonicalizer_enabled
+from canonicalizer import get_canonicalizer
+from orchestration import schema_for_stage
+from schema_store import load_schema
+from deadline import Deadline
+import utilities
+
+logger = logging.getLogger(__name__)
+
+# Budgeted clients a request creates, by service and the stage whose budget sizes them
+BUDGETED_STAGES = [("bedrock-runtime", stage) for stage in model_routes] + [("bedrock-agent-runtime", "knowledge_base")]
+
+
+# Function to recognize warmup pings
+def is_warmup_event(event):
+    """True for {"warmup": true} events and EventBridge scheduled events"""
+    return bool(event.get("warmup")) or event.get("source") == "aws.events"
+
+
+# Function to open a connection to a client's endpoint without making a request
+def connect(client, url=None):
+    """
+    Open one pooled connection (DNS, TCP and TLS) to the client's endpoint so
+    the first real request reuses it. Returns False for clients that are not
+    botocore HTTP clients (e.g. local stand-ins).
+    """
+    session = getattr(getattr(client, "_endpoint", None), "http_session", None)
+    if session is None or not hasattr(session, "_get_connection_manager"):
+        return False
+
+    url = url or client.meta.endpoint_url
+    pool = session._get_connection_manager(url).connection_from_url(url)
+    connection = pool._get_conn()
+    try:
+        connection.connect()
+    finally:
+        pool._put_conn(connection)
+    return True
+
+
+def bucket_url(client, bucket_name):
+    """Virtual-hosted URL S3 requests for the bucket go to"""
+    parts = urlsplit(client.meta.endpoint_url)
+    return f"{parts.scheme}://{bucket_name}.{parts.netloc}"
+
+
+# Function to prime the container for the first request
+def warm_container(connect_endpoints=True):
+    """
+    Do ahead of time what a first request would otherwise pay for: load the
+    schema and build its renderings, index and canonicalizer, create the
+    budgeted client of every stage and (optionally) open a connection to
+    every endpoint in parallel. Returns a summary with timings in ms.
+    """
+    logger.info("Warming container")
+    summary = {}
+    start = time.perf_counter()
+
+    schema = load_schema()
+    summary["schema_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    step = time.perf_counter()
+    for stage in model_routes:
+        schema_for_stage(schema, stage)
+    if canonicalizer_enabled:
+        get_canonicalizer(schema)
+    summary["caches_ms"] = round((time.perf_counter() - step) * 1000, 1)
+
+    step = time.perf_counter()
+    endpoints = [
+        (utilities.gateway, None),
+        (utilities.bedrock, None),
+        (utilities.agent, None),
+        (utilities.get_lambda_client(), None),
+        (utilities.s3_client, bucket_url(utilities.s3_client, constants.DATABASE_DESCRIPTIONS_S3_NAME)
+         if hasattr(utilities.s3_client, "meta") else None),
+    ]
+    # The timeout a stage's first call gets, so requests reuse these clients
+    budgets = {(service, utilities.timeout_bucket(Deadline(get_budget(stage)).remaining())) for service, stage in BUDGETED_STAGES}
+    endpoints += [(utilities.get_budgeted_client(service, budget), None) for service, budget in sorted(budgets)]
+    summary["clients_ms"] = round((time.perf_counter() - step) * 1000, 1)
+
+    if connect_endpoints:
+        step = time.perf_counter()
+        summary["connections"], summary["connection_failures"] = connect_all(endpoints)
+        summary["connect_ms"] = round((time.perf_counter() - step) * 1000, 1)
+
+    summary["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.timer(f"Container warmed in {summary['total_ms']:.0f}ms: {summary}")
+    return summary
+
+
+def connect_all(endpoints):
+    """Connect to every endpoint in parallel; returns (connections opened, failures)"""
+    def attempt(endpoint):
+        client, url = endpoint
+        try:
+            return connect(client, url)
+        except Exception as e:
+            logger.warning(f"Warmup connection to {url or getattr(client.meta, 'endpoint_url', client)} failed: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+        results = list(executor.map(attempt, endpoints))
+    return sum(1 for result in results if result), sum(1 for result in results if result is None)
+
+
+# ============================================================================
+# SNAPSHOTS AND INIT
+# ============================================================================
+
+def prepare_snapshot():
+    """Before a SnapStart snapshot: prime everything except connections, which do not survive a restore"""
+    warm_container(connect_endpoints=False)
+
+
+def refresh_after_restore():
+    """
+    After a SnapStart restore: connections and credentials captured in the
+    snapshot are stale, so the clients are recreated and reconnected.
+    """
+    utilities.gateway, utilities.bedrock, utilities.s3_client, utilities.agent = utilities.get_clients()
+    utilities.get_budgeted_client.cache_clear()
+    utilities.get_lambda_client.cache_clear()
+    warm_container()
+
+
+def init_container():
+    """
+    Called once at import. Registers the SnapStart hooks when the runtime
+    supports them, and warms during init when no user is waiting for it
+    (provisioned concurrency) or when WARM_ON_INIT is "true".
+    """
+    try:
+        from snapshot_restore_py import register_before_snapshot, register_after_restore
+        register_before_snapshot(prepare_snapshot)
+        register_after_restore(refresh_after_restore)
+    except ImportError:
+        pass
+
+    init_type = os.environ.get("AWS_LAMBDA_INITIALIZATION_TYPE", "on-demand")
+    if WARM_ON_INIT == "true" or (WARM_ON_INIT == "auto" and init_type == "provisioned-concurrency"):
+        try:
+            warm_container()
+        except Exception as e:
+            logger.warning(f"Warmup during init failed, requests will initialize lazily: {e}")
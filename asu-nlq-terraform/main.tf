@@ -9,6 +9,12 @@ resource "random_id" "random_suffix" {
   byte_length = 4
 }
 
+# Builds the Python dependency layer shared by the lambdas
+module "layers" {
+  source        = "./modules/layers"
+  random_suffix = random_id.random_suffix.hex
+}
+
 # Creates the backend of the app
 module "backend" {
   source            = "./modules/backend"
@@ -17,6 +23,8 @@ module "backend" {
   database_name     = var.database_name
   random_suffix     = random_id.random_suffix.hex
   knowledge_base_id = var.knowledge_base_id
+  warmup_schedule   = var.warmup_schedule
+  json_codec_layer_arn = module.layers.json_codec_layer_arn
 
 }
 
@@ -35,6 +43,7 @@ module "frontend" {
   aws_region = var.aws_region
   random_suffix = random_id.random_suffix.hex
   frontend_build_zip_path = module.scripts.frontend_build_zip_path
+  json_codec_layer_arn = module.layers.json_codec_layer_arn
 
   depends_on = [ module.scripts ]
 
@@ -31,6 +31,20 @@ resource "aws_s3_object" "asu_nlq_chatbot_database_descriptions_upload" {
   content_type = "application/json"
 }
 
+# Upload the compiled schema artifacts and their pointer (Utilities/schema_manager.py --compile), if any
+resource "aws_s3_object" "asu_nlq_chatbot_compiled_schema_upload" {
+  for_each = fileset("${path.root}/S3", "{compiled/*.json,${var.template_name}.pointer.json}")
+
+  bucket = aws_s3_bucket.asu_nlq_chatbot_database_descriptions_bucket.id
+  key    = each.value
+  source = "${path.root}/S3/${each.value}"
+  etag   = filemd5("${path.root}/S3/${each.value}")
+
+  depends_on = [aws_s3_bucket.asu_nlq_chatbot_database_descriptions_bucket]
+
+  content_type = "application/json"
+}
+
 
 ####################################################################################################
 #This section defines the IAM policies and roles for the lambda functions
@@ -236,6 +250,7 @@ resource "aws_lambda_function" "asu_nlq_chatbot_orchestration_lambda" {
   runtime = "python3.13"
   timeout = 600
   memory_size = 256
+  layers = [var.json_codec_layer_arn]
 
   environment {
     variables = {
@@ -244,10 +259,35 @@ resource "aws_lambda_function" "asu_nlq_chatbot_orchestration_lambda" {
       TEMPLATE_NAME = var.template_name,
       DATABASE_NAME = var.database_name
       KNOWLEDGE_BASE_ID = var.knowledge_base_id,
+      PROFILE_SAMPLE_RATE = "0"  # Share of requests profiled; single requests can opt in with "profile": true
+      PROFILE_SINK = "s3://${aws_s3_bucket.asu_nlq_chatbot_database_descriptions_bucket.id}/profiles"
     }
   }
 }
 
+# Pings the orchestration lambda on a schedule so a primed container is waiting for the first user
+resource "aws_cloudwatch_event_rule" "asu_nlq_chatbot_orchestration_warmup_rule" {
+  count               = var.warmup_schedule == "" ? 0 : 1
+  name                = "asu_nlq_chatbot_orchestration_warmup_${var.random_suffix}"
+  schedule_expression = var.warmup_schedule
+}
+
+resource "aws_cloudwatch_event_target" "asu_nlq_chatbot_orchestration_warmup_target" {
+  count = var.warmup_schedule == "" ? 0 : 1
+  rule  = aws_cloudwatch_event_rule.asu_nlq_chatbot_orchestration_warmup_rule[0].name
+  arn   = aws_lambda_function.asu_nlq_chatbot_orchestration_lambda.arn
+  input = jsonencode({ warmup = true })
+}
+
+resource "aws_lambda_permission" "asu_nlq_chatbot_orchestration_warmup_permission" {
+  count         = var.warmup_schedule == "" ? 0 : 1
+  statement_id  = "AllowEventBridgeWarmup"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.asu_nlq_chatbot_orchestration_lambda.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.asu_nlq_chatbot_orchestration_warmup_rule[0].arn
+}
+
 
 ####################################################################################################
 #This section defines the websocket API gateway
@@ -284,6 +324,14 @@ resource "aws_apigatewayv2_route_response" "asu_nlq_chatbot_default_route_respon
   route_response_key = "$default"
 }
 
+#Defines the cancel route for the websocket API gateway (client stops an in-flight answer)
+resource "aws_apigatewayv2_route" "asu_nlq_chatbot_cancel_route" {
+  api_id    = aws_apigatewayv2_api.asu_nlq_chatbot_websocket_api_gateway.id
+  route_key = "cancel"
+  target    = "integrations/${aws_apigatewayv2_integration.asu_nlq_chatbot_websocket_integration.id}"
+  
+}
+
 #Defines the websocket api stage
 resource "aws_apigatewayv2_stage" "asu_nlq_chatbot_websocket_api_gateway_stage" {
   api_id = aws_apigatewayv2_api.asu_nlq_chatbot_websocket_api_gateway.id
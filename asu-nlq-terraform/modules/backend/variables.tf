@@ -21,4 +21,14 @@ variable "random_suffix" {
 variable "knowledge_base_id" {
   description = "The ID of the knowledge base to be used in the backend."
   type        = string
-}
\ No newline at end of file
+}
+variable "warmup_schedule" {
+  description = "EventBridge schedule expression for warmup pings of the orchestration lambda. Empty disables them."
+  type        = string
+  default     = ""
+}
+
+variable "json_codec_layer_arn" {
+  description = "ARN of the layer providing the fast JSON backend (orjson) for codec.py."
+  type        = string
+}
@@ -148,6 +148,8 @@ resource "aws_iam_role_policy" "asu_nlq_chatbot_lambda_amplify_access" {
           "amplify:ListApps",
           "amplify:ListBranches", 
           "amplify:StartDeployment",
+          "amplify:CreateDeployment",
+          "amplify:GetJob",
           "amplify:DeleteApp",        # Add this
           "amplify:DeleteBranch"      # Add this for completeness
         ]
@@ -175,12 +177,14 @@ resource "aws_lambda_function" "asu_nlq_amplify_deployment_lambda" {
   
   runtime          = "python3.13"
   timeout          = 60  # Set the maximum runtime to 60 seconds
+  layers           = [var.json_codec_layer_arn]
 
   environment {
     variables = {
       FRONTEND_BUCKET_NAME    = aws_s3_bucket.asu_nlq_frontend_store_bucket.id
       FRONTEND_FOLDER_NAME       = "/build/"
       AMPLIFY_APP_NAME        = "ASU_NLQ_Chatbot_App-${var.random_suffix}"
+      AMPLIFY_DEPLOYMENT_MODE = "s3_prefix"  # or "zip_upload" to deploy build.zip directly
     }
   }
 
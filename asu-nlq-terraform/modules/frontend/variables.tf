@@ -11,4 +11,9 @@ variable "random_suffix" {
 variable frontend_build_zip_path {
   description = "The path to the frontend build zip file."
   type        = string
-}
\ No newline at end of file
+}
+
+variable "json_codec_layer_arn" {
+  description = "ARN of the layer providing the fast JSON backend (orjson) for codec.py."
+  type        = string
+}
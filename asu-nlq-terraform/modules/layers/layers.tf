@@ -0,0 +1,47 @@
+####################################################################################################
+# Build the Python dependencies shared by the lambdas into a layer
+####################################################################################################
+
+locals {
+  json_codec_dir          = "${path.module}/../../lambdas/layers/json_codec"
+  json_codec_requirements = "${local.json_codec_dir}/requirements.txt"
+}
+
+# Installs the packages for the Lambda platform (not the machine running Terraform)
+resource "null_resource" "build_json_codec_layer" {
+  # Rebuild only when the requirements change
+  triggers = {
+    requirements = filesha256(local.json_codec_requirements)
+  }
+
+  provisioner "local-exec" {
+    command = <<-EOT
+      set -e
+      rm -rf "${local.json_codec_dir}/build"
+      python3 -m pip install \
+        --requirement "${local.json_codec_requirements}" \
+        --target "${local.json_codec_dir}/build/python" \
+        --platform manylinux2014_x86_64 \
+        --implementation cp \
+        --python-version 3.13 \
+        --only-binary=:all: \
+        --upgrade
+    EOT
+  }
+}
+
+data "archive_file" "json_codec_layer_zip" {
+  type        = "zip"
+  source_dir  = "${local.json_codec_dir}/build"
+  output_path = "${path.module}/../../lambdas/zips/json_codec_layer.zip"
+
+  depends_on = [null_resource.build_json_codec_layer]
+}
+
+# Layer with orjson, attached to both lambdas so codec.py does not fall back to the standard library
+resource "aws_lambda_layer_version" "json_codec_layer" {
+  layer_name          = "asu_nlq_chatbot_json_codec_${var.random_suffix}"
+  filename            = data.archive_file.json_codec_layer_zip.output_path
+  source_code_hash    = data.archive_file.json_codec_layer_zip.output_base64sha256
+  compatible_runtimes = ["python3.13"]
+}
@@ -0,0 +1,4 @@
+output "json_codec_layer_arn" {
+  description = "ARN of the layer version with the fast JSON backend"
+  value       = aws_lambda_layer_version.json_codec_layer.arn
+}
@@ -0,0 +1,4 @@
+variable "random_suffix" {
+  description = "A random suffix to be appended to the layer name."
+  type        = string
+}
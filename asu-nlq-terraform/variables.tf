@@ -21,4 +21,9 @@ variable "database_name" {
 variable "knowledge_base_id" {
   description = "The ID of the knowledge base to be used in the backend."
   type        = string
-}
\ No newline at end of file
+}
+variable "warmup_schedule" {
+  description = "EventBridge schedule expression that pings the orchestration lambda to keep a container warm, e.g. rate(5 minutes). Empty disables it."
+  type        = string
+  default     = ""
+}